@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AboutConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'About'
+
+    def ready(self):
+        # Invalidate the cached About page when its content changes.
+        from Mazlofootwear.cache_tags import track
+        for model in ('Stat', 'Journey', 'GreenPromiseItem', 'CoreValue'):
+            track(self.get_model(model))
@@ -1,5 +1,5 @@
 from django.shortcuts import render
-from django.core.cache import cache
+from Mazlofootwear.stampede import get_or_compute
 from .models import (
     Stat,
     Journey,
@@ -18,8 +18,9 @@ def about(request):
     - CoreValues: List of core values for the company.
 
     To improve performance, this data is cached in Django's cache framework
-    for 15 minutes (900 seconds). Subsequent requests within this timeframe
-    will be served from cache rather than querying the database again.
+    for 24 hours or until the underlying records change. Subsequent requests
+    within this timeframe will be served from cache rather than querying the
+    database again.
 
     Returns:
         HttpResponse: Rendered About page with dynamic context data.
@@ -28,26 +29,21 @@ def about(request):
     # Cache timeout in seconds (24 hours)
     cache_timeout = 60 * 60 * 24
 
-    # Attempt to fetch cached data or query DB if not cached
-    stats = cache.get('about_stats')
-    if stats is None:
-        stats = Stat.objects.all()
-        cache.set('about_stats', stats, cache_timeout)
-
-    journey = cache.get('about_journey')
-    if journey is None:
-        journey = Journey.objects.first()
-        cache.set('about_journey', journey, cache_timeout)
-
-    green_promises = cache.get('about_green_promises')
-    if green_promises is None:
-        green_promises = GreenPromiseItem.objects.all()
-        cache.set('about_green_promises', green_promises, cache_timeout)
-
-    core_values = cache.get('about_core_values')
-    if core_values is None:
-        core_values = CoreValue.objects.all()
-        cache.set('about_core_values', core_values, cache_timeout)
+    # Fetch cached data or query DB if not cached; each entry is dropped as
+    # soon as its model changes (see Mazlofootwear.cache_tags)
+    stats = get_or_compute(
+        'about_stats', lambda: list(Stat.objects.all()), cache_timeout, tags=['Stat:*']
+    )
+    journey = get_or_compute(
+        'about_journey', lambda: Journey.objects.first(), cache_timeout, tags=['Journey:*']
+    )
+    green_promises = get_or_compute(
+        'about_green_promises', lambda: list(GreenPromiseItem.objects.all()), cache_timeout,
+        tags=['GreenPromiseItem:*'],
+    )
+    core_values = get_or_compute(
+        'about_core_values', lambda: list(CoreValue.objects.all()), cache_timeout, tags=['CoreValue:*']
+    )
 
     context = {
         'stats': stats,
@@ -4,4 +4,9 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Accounts'
-   
\ No newline at end of file
+
+    def ready(self):
+        # Invalidate a user's cached profile and addresses when they change.
+        from Mazlofootwear.cache_tags import track
+        track(self.get_model('UserProfile'), lambda profile: [f'User:{profile.user_id}:profile'])
+        track(self.get_model('Address'), lambda address: [f'User:{address.user_id}:addresses'])
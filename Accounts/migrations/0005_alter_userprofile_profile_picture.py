@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-16 22:47
+
+import Media.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Accounts', '0004_address'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='profile_picture',
+            field=models.ImageField(blank=True, null=True, storage=Media.storage.ContentAddressedStorage(), upload_to='profile_pic/'),
+        ),
+    ]
@@ -7,6 +7,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from Media.storage import content_storage
 
 class UserProfile(models.Model):
     """
@@ -15,7 +16,8 @@ class UserProfile(models.Model):
     """
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     profile_picture = models.ImageField(
-        upload_to='profile_pic/',         
+        upload_to='profile_pic/',
+        storage=content_storage,
         null=True, 
         blank=True
     )
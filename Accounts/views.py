@@ -9,7 +9,7 @@ from .forms import UserProfileForm, ProfilePictureForm
 from .models import UserProfile, Address
 from Order.models import Order
 from django.urls import reverse
-from django.core.cache import cache
+from Mazlofootwear.stampede import get_or_compute
 
 
 CACHE_TIMEOUT = 300  # seconds (5 minutes)
@@ -126,7 +126,8 @@ def profile(request):
     Display and edit the authenticated user’s profile.
 
     - Redirects anonymous users to home with ?next=profile.
-    - Caches UserProfile, recent orders, and addresses for CACHE_TIMEOUT seconds.
+    - Caches UserProfile, recent orders, and addresses for CACHE_TIMEOUT seconds
+      or until they change.
     - Handles profile updates via POST and displays success messages.
     """
     if not request.user.is_authenticated:
@@ -134,27 +135,27 @@ def profile(request):
 
     user = request.user
 
-    # Cache user profile
-    profile_cache_key = f"user_profile_{user.id}"
-    profile = cache.get(profile_cache_key)
-    if profile is None:
-        profile, created = UserProfile.objects.get_or_create(user=user)
-        cache.set(profile_cache_key, profile, CACHE_TIMEOUT)
-
-    # Cache recent orders
-    orders_cache_key = f"recent_orders_{user.id}"
-    recent_orders = cache.get(orders_cache_key)
-    if recent_orders is None:
-        recent_orders = list(Order.objects.filter(user=user)
-                             .order_by('-order_date')[:3])
-        cache.set(orders_cache_key, recent_orders, CACHE_TIMEOUT)
-
-    # Cache addresses
-    addresses_cache_key = f"addresses_{user.id}"
-    addresses = cache.get(addresses_cache_key)
-    if addresses is None:
-        addresses = list(Address.objects.filter(user=user))
-        cache.set(addresses_cache_key, addresses, CACHE_TIMEOUT)
+    # Cache user profile, recent orders and addresses; each entry is tagged
+    # with the user's data it shows and dropped as soon as that changes (see
+    # Mazlofootwear.cache_tags and AccountsConfig.ready)
+    profile = get_or_compute(
+        f"user_profile_{user.id}",
+        lambda: UserProfile.objects.get_or_create(user=user)[0],
+        CACHE_TIMEOUT,
+        tags=[f"User:{user.id}:profile"],
+    )
+    recent_orders = get_or_compute(
+        f"recent_orders_{user.id}",
+        lambda: list(Order.objects.filter(user=user).order_by('-order_date')[:3]),
+        CACHE_TIMEOUT,
+        tags=[f"User:{user.id}:orders"],
+    )
+    addresses = get_or_compute(
+        f"addresses_{user.id}",
+        lambda: list(Address.objects.filter(user=user)),
+        CACHE_TIMEOUT,
+        tags=[f"User:{user.id}:addresses"],
+    )
 
     if request.method == 'POST':
         user_form = UserProfileForm(request.POST, instance=user)
@@ -162,12 +163,11 @@ def profile(request):
             request.POST, request.FILES, instance=profile
         )
         if user_form.is_valid() and profile_form.is_valid():
+            # Saving the profile invalidates its cache tag, so updates show
+            # immediately
             user_form.save()
             profile_form.save()
 
-            # Invalidate caches so updates show immediately
-            cache.delete(profile_cache_key)
-
             messages.success(request, "Profile updated successfully!")
             return redirect('profile')
     else:
@@ -198,8 +198,8 @@ def user_logout(request):
 
 def add_address(request):
     """
-    Add a new Address for the authenticated user via POST,
-    then invalidate the address cache.
+    Add a new Address for the authenticated user via POST; the address
+    cache is invalidated by its cache tag.
     """
     if request.method == 'POST' and request.user.is_authenticated:
         address = Address(
@@ -210,24 +210,22 @@ def add_address(request):
             zip_code=request.POST['zip_code'],
             phone_number=request.POST['phone_number']
         )
+        # Saving invalidates the address cache tag, so the new address
+        # appears immediately
         address.save()
 
-        # Invalidate address cache so new address appears immediately
-        cache.delete(f"addresses_{request.user.id}")
-
         messages.success(request, "Address added successfully!")
     return redirect('profile')
 
 
 def delete_address(request, address_id):
     """
-    Delete the specified Address for the authenticated user,
-    then invalidate the address cache.
+    Delete the specified Address for the authenticated user; the address
+    cache is invalidated by its cache tag.
     """
     try:
         address = Address.objects.get(id=address_id, user=request.user)
         address.delete()
-        cache.delete(f"addresses_{request.user.id}")
         messages.success(request, "Address deleted successfully!")
     except Address.DoesNotExist:
         messages.error(request, "Address not found.")
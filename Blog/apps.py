@@ -4,4 +4,9 @@ from django.apps import AppConfig
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Blog'
-    
+
+    def ready(self):
+        # Invalidate the cached blog pages when posts or categories change.
+        from Mazlofootwear.cache_tags import track
+        track(self.get_model('Post'))
+        track(self.get_model('Blog_Category'))
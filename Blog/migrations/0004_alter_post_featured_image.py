@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-16 22:47
+
+import Media.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0003_alter_blog_category_options_alter_post_category_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='featured_image',
+            field=models.ImageField(blank=True, null=True, storage=Media.storage.ContentAddressedStorage(), upload_to='blog_img/'),
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.utils import timezone
 from django.urls import reverse
 from django.contrib.auth.models import User
 from model_utils import FieldTracker
+from Media.storage import content_storage
 
 """
 Module: models.py
@@ -69,7 +70,7 @@ class Post(models.Model):
     category = models.ForeignKey(Blog_Category, on_delete=models.CASCADE, related_name='posts')
     content = models.TextField()
     excerpt = models.TextField(max_length=300)
-    featured_image = models.ImageField(upload_to='blog_img/', null=True, blank=True)
+    featured_image = models.ImageField(upload_to='blog_img/', storage=content_storage, null=True, blank=True)
     publish_date = models.DateTimeField(default=timezone.now)
     is_featured = models.BooleanField(default=False)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -1,12 +1,11 @@
 from constants import *
 from django.shortcuts import render, redirect
-from django.core.cache import cache
 from .models import Post, Blog_Category
 from django.http import JsonResponse
 from .forms import NewsletterForm
 from django.contrib import messages
 from django.db.models import Prefetch
-from django.views.decorators.cache import cache_page
+from Mazlofootwear.stampede import get_or_compute
 
 """
 Module: views.py
@@ -14,7 +13,8 @@ Module: views.py
 This module defines view functions for the blog application, including:
 - A blog listing page with featured posts, latest posts, categories, and newsletter subscription handling.
 - An AJAX endpoint to retrieve detailed data for a specific post, with core-level caching.
-- Optimized caching strategies for better performance.
+- Optimized caching strategies for better performance, with cache stampede
+  protection (see Mazlofootwear.stampede).
 """
 
 # Cache timeout constants
@@ -24,6 +24,11 @@ LONG_CACHE = DAY  # 24 hours
 MEDIUM_CACHE = HOUR * 6  # 6 hours
 SHORT_CACHE = HOUR  # 1 hour
 
+# Cache tags invalidated whenever any post or category changes (see
+# Mazlofootwear.cache_tags and BlogConfig.ready)
+POSTS = 'Post:*'
+CATEGORIES = 'Blog_Category:*'
+
 
 def get_featured_post():
     """
@@ -70,9 +75,9 @@ def blog(request):
     Render the main blog page and handle newsletter subscriptions.
 
     Retrieves and caches:
-    - The featured post (key: 'featured_post').
-    - The latest non-featured posts (key: 'latest_posts').
-    - All blog categories (key: 'categories').
+    - The featured post (key: 'blog:featured_post', tag: any post).
+    - The latest non-featured posts (key: 'blog:latest_posts', tag: any post).
+    - All blog categories (key: 'blog:categories', tag: any category).
 
     Also processes POST requests for newsletter sign-up.
 
@@ -83,13 +88,13 @@ def blog(request):
         HttpResponse: The rendered blog page with context data.
     """
     # Use core caching to store/retrieve data with optimized cache keys
-    featured_post = cache.get_or_set('blog:featured_post', get_featured_post, timeout=MEDIUM_CACHE)
+    featured_post = get_or_compute('blog:featured_post', get_featured_post, MEDIUM_CACHE, tags=[POSTS])
     
     # Cache latest posts with a shorter timeout as they change more frequently
-    latest_posts = cache.get_or_set('blog:latest_posts', get_latest_posts, timeout=SHORT_CACHE)
+    latest_posts = get_or_compute('blog:latest_posts', get_latest_posts, SHORT_CACHE, tags=[POSTS])
     
     # Cache categories with a longer timeout as they rarely change
-    categories = cache.get_or_set('blog:categories', get_categories, timeout=LONG_CACHE)
+    categories = get_or_compute('blog:categories', get_categories, LONG_CACHE, tags=[CATEGORIES])
 
     # Newsletter form handling
     form = NewsletterForm(request.POST or None)
@@ -107,13 +112,12 @@ def blog(request):
     return render(request, 'blog.html', context)
 
 
-# Cache the post data view for better performance, but with a shorter timeout
-@cache_page(HOUR * 2)
 def get_post_data(request, post_id):
     """
     AJAX endpoint to fetch data for a given blog post.
 
-    Checks the cache for the post data under key 'post_{post_id}_data'. If not present,
+    Checks the cache for the post data under key 'blog:post:{post_id}:data', tagged
+    with the post and the categories. If not present,
     retrieves the post, constructs a serializable dictionary, caches it, and returns as JSON.
 
     Args:
@@ -123,25 +127,25 @@ def get_post_data(request, post_id):
     Returns:
         JsonResponse: A JSON response with post details or an error message if not found.
     """
-    cache_key = f'blog:post:{post_id}:data'
-    post_data = cache.get(cache_key)
-
-    if not post_data:
-        try:
-            # Optimize query with select_related
-            post = Post.objects.select_related('category', 'author').get(id=post_id)
-            post_data = {
-                'title': post.title,
-                'content': post.content,
-                'category': post.category.name,
-                'author': post.author.get_full_name() or post.author.username,
-                'date': post.publish_date.strftime("%B %d, %Y"),
-                'image': post.featured_image.url if post.featured_image else None,
-            }
-            # Cache individual post data for a day
-            cache.set(cache_key, post_data, timeout=DAY)
-        except Post.DoesNotExist:
-            return JsonResponse({'error': 'Post not found'}, status=404)
+    def get_post():
+        # Optimize query with select_related
+        post = Post.objects.select_related('category', 'author').get(id=post_id)
+        return {
+            'title': post.title,
+            'content': post.content,
+            'category': post.category.name,
+            'author': post.author.get_full_name() or post.author.username,
+            'date': post.publish_date.strftime("%B %d, %Y"),
+            'image': post.featured_image.url if post.featured_image else None,
+        }
+
+    try:
+        # Cache individual post data for a day; missing posts are not cached
+        post_data = get_or_compute(
+            f'blog:post:{post_id}:data', get_post, DAY, tags=[f'Post:{post_id}', CATEGORIES]
+        )
+    except Post.DoesNotExist:
+        return JsonResponse({'error': 'Post not found'}, status=404)
 
     return JsonResponse(post_data)
 
@@ -161,33 +165,30 @@ def category_posts(request, category_slug):
     page = request.GET.get('page', 1)
     cache_key = f'blog:category:{category_slug}:page:{page}'
     
-    result = cache.get(cache_key)
-    
-    if not result:
-        try:
-            # Get category with efficient query
-            category = Blog_Category.objects.get(slug=category_slug)
-            
-            # Get posts for this category with pagination
-            posts = Post.objects.select_related('category', 'author').filter(
-                category=category
-            ).order_by('-publish_date')
-            
-            # Here you would implement pagination if needed
-            
-            result = {
-                'category': category,
-                'posts': list(posts),
-            }
-            
-            # Cache this category view for a shorter period
-            cache.set(cache_key, result, timeout=SHORT_CACHE)
-            
-        except Blog_Category.DoesNotExist:
-            return JsonResponse({'error': 'Category not found'}, status=404)
+    def get_category_posts():
+        # Get category with efficient query
+        category = Blog_Category.objects.get(slug=category_slug)
+
+        # Get posts for this category with pagination
+        posts = Post.objects.select_related('category', 'author').filter(
+            category=category
+        ).order_by('-publish_date')
+
+        # Here you would implement pagination if needed
+
+        return {
+            'category': category,
+            'posts': list(posts),
+        }
+
+    try:
+        # Cache this category view for a shorter period
+        result = get_or_compute(cache_key, get_category_posts, SHORT_CACHE, tags=[POSTS, CATEGORIES])
+    except Blog_Category.DoesNotExist:
+        return JsonResponse({'error': 'Category not found'}, status=404)
     
     # Always get fresh categories for the sidebar
-    categories = cache.get_or_set('blog:categories', get_categories, timeout=LONG_CACHE)
+    categories = get_or_compute('blog:categories', get_categories, LONG_CACHE, tags=[CATEGORIES])
     
     context = {
         'category': result['category'],
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CareerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Career'
+
+    def ready(self):
+        # Invalidate the cached job listing when jobs change.
+        from Mazlofootwear.cache_tags import track
+        track(self.get_model('Job'))
@@ -1,21 +1,15 @@
 """
 Module: careers/models.py
 
-This module defines the data models for the careers section of the application and
-implements cache invalidation for job listings when jobs are created, updated, or deleted.
+This module defines the data models for the careers section of the application.
+The cached job listing is invalidated through the ``Job:*`` cache tag whenever a
+job is created, updated, or deleted (see CareerConfig.ready).
 
 Models:
     Job: Represents an open position with relevant details.
     Application: Captures candidate applications for specific job openings.
-
-Signal Handlers:
-    invalidate_jobs_cache: Clears the cached list of all jobs on save/delete events.
 """
 from django.db import models
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-from django.core.cache import cache
-from django_redis import get_redis_connection
 
 class Job(models.Model):
     """
@@ -72,17 +66,3 @@ class Application(models.Model):
         Return a string combining the applicant's name and job title.
         """
         return f"{self.full_name} - {self.job.title}"
-
-# @receiver([post_save, post_delete], sender=Job)
-# def invalidate_jobs_cache(sender, instance, **kwargs):
-#     """
-#     Signal handler to clear the cache of all jobs when a Job is saved or deleted.
-
-#     Clears the 'all_jobs' cache key to ensure that job listings remain up-to-date.
-
-#     Args:
-#         sender (Model): The model class sending the signal (Job).
-#         instance (Job): The instance being saved or deleted.
-#         **kwargs: Additional signal keyword arguments.
-#     """
-#     cache.delete('all_jobs')
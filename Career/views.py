@@ -1,6 +1,6 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.core.cache import cache
+from Mazlofootwear.stampede import get_or_compute
 from .models import Job, Application
 
 """
@@ -16,7 +16,8 @@ def careers(request):
     Handle displaying job listings and processing application submissions.
 
     GET requests:
-        - Retrieve cached list of Job objects under 'all_jobs' key (24h expiration).
+        - Retrieve cached list of Job objects under 'all_jobs' key (24h expiration,
+          tagged 'Job:*', with stampede protection, see Mazlofootwear.stampede).
         - Render the 'careers.html' template with the jobs context.
 
     POST requests:
@@ -55,11 +56,13 @@ def careers(request):
             messages.error(request, 'Invalid job selected.')
         return redirect('careers')
     
-    # Cache jobs for 24 hours (86400 seconds)
-    jobs = cache.get_or_set(
+    # Cache jobs for 24 hours (86400 seconds) or until any job changes,
+    # recomputed by one request at a time
+    jobs = get_or_compute(
         'all_jobs',
         lambda: list(Job.objects.all()),
-        60 * 60 * 24
+        60 * 60 * 24,
+        tags=['Job:*'],
     )
 
     return render(request, 'careers.html', {'jobs': jobs})
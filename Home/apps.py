@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class HomeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Home'
+
+    def ready(self):
+        # Rebuild the homepage snapshot when its content changes.
+        from . import signals  # noqa: F401
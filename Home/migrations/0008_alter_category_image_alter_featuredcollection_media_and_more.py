@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-16 22:47
+
+import Media.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Home', '0007_stylejournal'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='image',
+            field=models.ImageField(blank=True, default='default_image.jpg', null=True, storage=Media.storage.ContentAddressedStorage(), upload_to='category/'),
+        ),
+        migrations.AlterField(
+            model_name='featuredcollection',
+            name='media',
+            field=models.FileField(storage=Media.storage.ContentAddressedStorage(), upload_to='collections/'),
+        ),
+        migrations.AlterField(
+            model_name='herobanner',
+            name='image',
+            field=models.ImageField(storage=Media.storage.ContentAddressedStorage(), upload_to='hero_banners/'),
+        ),
+        migrations.AlterField(
+            model_name='newarrivalbanner',
+            name='image',
+            field=models.ImageField(storage=Media.storage.ContentAddressedStorage(), upload_to='new_arrivals/'),
+        ),
+        migrations.AlterField(
+            model_name='stylejournal',
+            name='image',
+            field=models.ImageField(storage=Media.storage.ContentAddressedStorage(), upload_to='journal/'),
+        ),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Home', '0008_alter_category_image_alter_featuredcollection_media_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text="Rendition name -> {'width', 'height', 'webp', 'jpeg'} storage paths"),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='derivatives_source',
+            field=models.CharField(blank=True, editable=False, help_text='Image path the derivatives were rendered from', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='featuredcollection',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text="Rendition name -> {'width', 'height', 'webp', 'jpeg'} storage paths"),
+        ),
+        migrations.AddField(
+            model_name='featuredcollection',
+            name='derivatives_source',
+            field=models.CharField(blank=True, editable=False, help_text='Image path the derivatives were rendered from', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='featuredcollection',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='featuredcollection',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='herobanner',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text="Rendition name -> {'width', 'height', 'webp', 'jpeg'} storage paths"),
+        ),
+        migrations.AddField(
+            model_name='herobanner',
+            name='derivatives_source',
+            field=models.CharField(blank=True, editable=False, help_text='Image path the derivatives were rendered from', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='herobanner',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='herobanner',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='newarrivalbanner',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text="Rendition name -> {'width', 'height', 'webp', 'jpeg'} storage paths"),
+        ),
+        migrations.AddField(
+            model_name='newarrivalbanner',
+            name='derivatives_source',
+            field=models.CharField(blank=True, editable=False, help_text='Image path the derivatives were rendered from', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='newarrivalbanner',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='newarrivalbanner',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='stylejournal',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text="Rendition name -> {'width', 'height', 'webp', 'jpeg'} storage paths"),
+        ),
+        migrations.AddField(
+            model_name='stylejournal',
+            name='derivatives_source',
+            field=models.CharField(blank=True, editable=False, help_text='Image path the derivatives were rendered from', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='stylejournal',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='stylejournal',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,11 +1,50 @@
 from django.db import models
+from Media.storage import content_storage
+from Shop.models import picture_data
 
-class HeroBanner(models.Model):
+
+class RenderedImage(models.Model):
+    """
+    Abstract base of homepage content whose image gets responsive renditions,
+    rendered by the product image derivative pool (Shop.derivatives) and
+    recorded here as on ProductImage.
+    """
+    derivatives_field = 'image'
+    derivatives_dir = 'home/derivatives'
+
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Rendition name -> {'width', 'height', 'webp', 'jpeg'} storage paths"
+    )
+    derivatives_source = models.CharField(
+        max_length=255,
+        blank=True,
+        editable=False,
+        help_text="Image path the derivatives were rendered from"
+    )
+
+    class Meta:
+        abstract = True
+
+    @property
+    def picture(self):
+        """Storage paths and dimensions used by the ``responsive_image`` tag."""
+        file = getattr(self, self.derivatives_field)
+        if self.derivatives_source != file.name:
+            return picture_data(file.name)
+        return picture_data(file.name, self.width, self.height, self.derivatives)
+
+
+class HeroBanner(RenderedImage):
     """
     Model representing a hero banner section for the homepage or landing page.
     Contains an image, optional title, subtitle, and a clickable button with text and link.
     """
-    image = models.ImageField(upload_to='hero_banners/')
+    image = models.ImageField(upload_to='hero_banners/', storage=content_storage)
     title = models.CharField(max_length=255, blank=True, null=True)
     subtitle = models.TextField(blank=True, null=True)
     button_text = models.CharField(max_length=100, blank=True, null=True)
@@ -19,13 +58,13 @@ class HeroBanner(models.Model):
         return self.title or "Hero Banner"
 
 
-class Category(models.Model):
+class Category(RenderedImage):
     """
     Model representing product or content categories.
     Each category has a title, an optional image, a link URL, and an order number for sorting.
     """
     title = models.CharField(max_length=100)
-    image = models.ImageField(upload_to='category/', default='default_image.jpg', null=True, blank=True)
+    image = models.ImageField(upload_to='category/', storage=content_storage, default='default_image.jpg', null=True, blank=True)
     link = models.URLField(default="#")  # Alternatively, can be a CharField for internal links
     order = models.PositiveIntegerField(default=0)
 
@@ -39,14 +78,14 @@ class Category(models.Model):
         return self.title
 
 
-class NewArrivalBanner(models.Model):
+class NewArrivalBanner(RenderedImage):
     """
     Model representing banners for new arrivals or promotions.
     Includes title, subtitle (like price or tagline), image, and an optional button with text and link.
     """
     title = models.CharField(max_length=100)
     subtitle = models.CharField(max_length=100, blank=True, null=True)  # e.g., price or tagline
-    image = models.ImageField(upload_to='new_arrivals/')
+    image = models.ImageField(upload_to='new_arrivals/', storage=content_storage)
     button_text = models.CharField(max_length=20, default='Quick View')
     button_link = models.URLField(blank=True, null=True)
 
@@ -57,15 +96,18 @@ class NewArrivalBanner(models.Model):
         return self.title
 
 
-class FeaturedCollection(models.Model):
+class FeaturedCollection(RenderedImage):
     """
     Model representing featured collections that may include images or videos.
     Each collection has a title, optional description, media file, and category label.
-    Tracks creation date for ordering.
+    Tracks creation date for ordering. Renditions are rendered from images
+    only, never from videos.
     """
+    derivatives_field = 'media'
+
     title = models.CharField(max_length=100)
     description = models.TextField(blank=True)
-    media = models.FileField(upload_to='collections/')
+    media = models.FileField(upload_to='collections/', storage=content_storage)
     is_video = models.BooleanField(default=False)
     category = models.CharField(max_length=50, default='urban')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -77,14 +119,14 @@ class FeaturedCollection(models.Model):
         return self.title        
 
 
-class StyleJournal(models.Model):
+class StyleJournal(RenderedImage):
     """
     Model representing style journal entries or blog posts.
     Contains title, detailed description, associated image, and creation timestamp.
     """
     title = models.CharField(max_length=200)
     description = models.TextField()
-    image = models.ImageField(upload_to='journal/')
+    image = models.ImageField(upload_to='journal/', storage=content_storage)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
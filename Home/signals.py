@@ -0,0 +1,84 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from Shop.derivatives import delete_derivative_files, derivatives_stored, schedule_derivatives
+from .models import Category, FeaturedCollection, HeroBanner, NewArrivalBanner, StyleJournal
+from .snapshot import rebuild_snapshot
+
+"""
+Module: signals.py
+
+This module rebuilds the homepage snapshot (Home.snapshot) when a hero
+banner, category, new arrival banner, featured collection or style journal
+entry is created, updated, or deleted. The rebuild waits for the transaction
+to commit and runs once per transaction, however many entries it changed.
+
+It also has the responsive renditions of their images rendered by the
+derivative pool (Shop.derivatives), rebuilding the snapshot again once they
+are recorded, and deletes the renditions of deleted entries.
+"""
+
+_pending = threading.local()
+
+
+@receiver([post_save, post_delete], sender=HeroBanner)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=NewArrivalBanner)
+@receiver([post_save, post_delete], sender=FeaturedCollection)
+@receiver([post_save, post_delete], sender=StyleJournal)
+def rebuild_snapshot_on_change(sender, instance, **kwargs):
+    """
+    Signal handler to rebuild the homepage snapshot once the change commits.
+    """
+    # Every change queues a callback, so a rolled back transaction cannot
+    # swallow the rebuild; the first one to run rebuilds and clears the
+    # flag, the rest find it cleared.
+    _pending.rebuild = True
+    transaction.on_commit(_rebuild_pending, robust=True)
+
+
+def _rebuild_pending():
+    if getattr(_pending, 'rebuild', False):
+        _pending.rebuild = False
+        rebuild_snapshot()
+
+
+@receiver(post_save, sender=HeroBanner)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=NewArrivalBanner)
+@receiver(post_save, sender=FeaturedCollection)
+@receiver(post_save, sender=StyleJournal)
+def render_image_derivatives(sender, instance, **kwargs):
+    """
+    Signal handler to render the responsive renditions of a newly uploaded
+    or replaced homepage image.
+    """
+    schedule_derivatives(instance)
+
+
+@receiver(post_delete, sender=HeroBanner)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=NewArrivalBanner)
+@receiver(post_delete, sender=FeaturedCollection)
+@receiver(post_delete, sender=StyleJournal)
+def delete_image_derivatives(sender, instance, **kwargs):
+    """
+    Signal handler to remove the rendition files of a deleted homepage entry.
+    """
+    derivatives, source = instance.derivatives, instance.derivatives_source
+    transaction.on_commit(lambda: delete_derivative_files(derivatives, source=source, model=sender))
+
+
+@receiver(derivatives_stored, sender=HeroBanner)
+@receiver(derivatives_stored, sender=Category)
+@receiver(derivatives_stored, sender=NewArrivalBanner)
+@receiver(derivatives_stored, sender=FeaturedCollection)
+@receiver(derivatives_stored, sender=StyleJournal)
+def rebuild_snapshot_on_derivatives(sender, **kwargs):
+    """
+    Signal handler to rebuild the homepage snapshot once renditions of a
+    homepage image are recorded.
+    """
+    rebuild_snapshot_on_change(sender, None)
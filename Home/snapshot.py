@@ -0,0 +1,132 @@
+"""
+Module: snapshot.py
+
+The homepage snapshot.
+
+Everything the homepage shows from the database, the hero banner, the
+category grid, the new arrivals, the featured collections and the style
+journal, is read once into plain records (dicts of strings and numbers, with
+responsive image renditions instead of model instances) and the heavy part of
+the page is rendered from them once, into ``index_body.html``. Both are cached
+together under one key, so a warm homepage runs no query and renders none of
+these sections.
+
+The snapshot is rebuilt as soon as a HeroBanner, Category, NewArrivalBanner,
+FeaturedCollection or StyleJournal change commits (see Home.signals), and is
+otherwise built by the first request that finds it missing, one at a time
+(see Mazlofootwear.stampede).
+
+Homepage images get the same WebP and JPEG renditions as product images,
+rendered by the derivative pool of Shop.derivatives when an image is uploaded
+and recorded on its row (Home.models.RenderedImage). The snapshot only reads
+those records; an image whose renditions are not ready yet is shown as its
+original until they are, and the snapshot is rebuilt then.
+"""
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.template.loader import render_to_string
+
+from Mazlofootwear.stampede import get_or_compute, refresh
+from Shop.models import picture_data
+from Shop.renditions import RENDITION_WIDTHS
+from .models import Category, FeaturedCollection, HeroBanner, NewArrivalBanner, StyleJournal
+
+SNAPSHOT_KEY = 'home:snapshot'
+SNAPSHOT_TIMEOUT = 60 * 60 * 24  # 24 hours
+
+COLLECTION_COUNT = 6
+JOURNAL_COUNT = 3
+
+RENDITION_FIELDS = ('width', 'height', 'derivatives', 'derivatives_source')
+
+
+def get_snapshot():
+    """
+    Return the homepage snapshot: ``records``, the plain data of each
+    section, and ``body``, the rendered HTML of the dynamic sections.
+    """
+    return get_or_compute(SNAPSHOT_KEY, build_snapshot, SNAPSHOT_TIMEOUT)
+
+
+def rebuild_snapshot():
+    """Rebuild and store the snapshot now."""
+    try:
+        return refresh(SNAPSHOT_KEY, build_snapshot, SNAPSHOT_TIMEOUT)
+    except Exception:
+        # Never leave the old snapshot up; the next request builds it.
+        cache.delete(SNAPSHOT_KEY)
+        raise
+
+
+def build_snapshot():
+    """Read the homepage records and render the body from them."""
+    hero = HeroBanner.objects.order_by('pk').values(
+        'title', 'subtitle', 'button_text', 'button_link', 'image', *RENDITION_FIELDS
+    ).first()
+    if hero is not None:
+        hero['image'] = record_picture(hero, 'image')
+        hero['background'] = background_url(hero['image'])
+
+    categories = list(
+        Category.objects.filter(order__gt=0).order_by('order').values('title', 'link', 'image', *RENDITION_FIELDS)
+    )
+    new_arrivals = list(
+        NewArrivalBanner.objects.order_by('pk').values(
+            'title', 'subtitle', 'button_text', 'button_link', 'image', *RENDITION_FIELDS
+        )
+    )
+    for record in categories + new_arrivals:
+        record['image'] = record_picture(record, 'image')
+
+    collections = list(
+        FeaturedCollection.objects.order_by('-created_at').values(
+            'title', 'description', 'media', 'is_video', 'category', *RENDITION_FIELDS
+        )[:COLLECTION_COUNT]
+    )
+    for record in collections:
+        image = record_picture(record, 'media')
+        media = record.pop('media')
+        record['media_url'] = FeaturedCollection._meta.get_field('media').storage.url(media) if media else ''
+        record['image'] = {} if record['is_video'] else image
+
+    journals = list(
+        StyleJournal.objects.order_by('-created_at').values('title', 'description', 'image', *RENDITION_FIELDS)
+        [:JOURNAL_COUNT]
+    )
+    for record in journals:
+        record['image'] = record_picture(record, 'image')
+
+    records = {
+        'hero': hero,
+        'categories': categories,
+        'new_arrivals': new_arrivals,
+        'collections': collections,
+        'journals': journals,
+    }
+    return {
+        'records': records,
+        'body': render_to_string('index_body.html', records),
+    }
+
+
+def record_picture(record, field):
+    """
+    The ``picture_data()`` of a record's image, taking its rendition fields
+    out of the record. Renditions of a previous file are ignored.
+    """
+    name = record[field]
+    width, height, derivatives, source = (record.pop(key) for key in RENDITION_FIELDS)
+    if not name:
+        return {}
+    if source != name:
+        return picture_data(name)
+    return picture_data(name, width, height, derivatives)
+
+
+def background_url(picture):
+    """The URL of the largest JPEG rendition of a picture, for CSS backgrounds."""
+    renditions = picture.get('renditions') or {}
+    for name in reversed(list(RENDITION_WIDTHS)):
+        if renditions.get(name):
+            return default_storage.url(renditions[name]['jpeg'])
+    return HeroBanner._meta.get_field('image').storage.url(picture['src']) if picture else ''
@@ -1,3 +1,46 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import transaction
 from django.test import TestCase
 
-# Create your tests here.
+from .models import Category
+from .snapshot import get_snapshot
+
+
+@mock.patch('Home.signals.schedule_derivatives')
+class SnapshotTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def create(self, title):
+        return Category.objects.create(title=title, image='', order=1)
+
+    def test_rebuilt_once_per_transaction(self, schedule):
+        with mock.patch('Home.signals.rebuild_snapshot') as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                for title in ('Men', 'Women', 'Kids'):
+                    self.create(title)
+        rebuild.assert_called_once_with()
+
+    def test_rebuild_not_lost_to_a_rollback(self, schedule):
+        try:
+            with transaction.atomic():
+                self.create('Men')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        with mock.patch('Home.signals.rebuild_snapshot') as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.create('Women')
+        rebuild.assert_called_once_with()
+
+    def test_snapshot_follows_changes(self, schedule):
+        with self.captureOnCommitCallbacks(execute=True):
+            category = self.create('Men')
+        self.assertIn('Men', get_snapshot()['body'])
+        with self.captureOnCommitCallbacks(execute=True):
+            category.title = 'Gentlemen'
+            category.save()
+        self.assertIn('Gentlemen', get_snapshot()['body'])
@@ -1,12 +1,7 @@
 from django.shortcuts import render
 from django.core.cache import cache
-from .models import (
-    Category, 
-    NewArrivalBanner, 
-    FeaturedCollection, 
-    HeroBanner, 
-    StyleJournal
-)
+from django.utils.safestring import mark_safe
+from .snapshot import get_snapshot
 
 CACHE_TTL = 60 * 60 * 24  # Cache time-to-live in seconds (24 hours)
 
@@ -14,31 +9,11 @@ def index(request):
     """
     Render the homepage with categories, new arrival banners, hero banners,
     featured collections, and style journals.
-    Uses Django's low-level cache API to optimize database queries and rendering.
+    Those sections come pre-rendered from the homepage snapshot (see
+    Home.snapshot), so a warm homepage runs no query for them.
     """
-    # Try to get cached data
-    cached_context = cache.get('index_page_context')
-    
-    if cached_context is None:
-        # Cache miss: fetch from database
-        categories = Category.objects.filter(order__gt=0).order_by('order')
-        newarrivalbanner = NewArrivalBanner.objects.all()
-        herobanner = HeroBanner.objects.all()
-        collections = FeaturedCollection.objects.order_by('-created_at')[:6]
-        journals = StyleJournal.objects.order_by('-created_at')[:3]
-        
-        cached_context = {
-            'categories': categories,
-            'newarrivalbanner': newarrivalbanner,
-            'collections': collections,
-            'herobanner': herobanner,
-            'journals': journals,
-        }
-        
-        # Save context in cache
-        cache.set('index_page_context', cached_context, CACHE_TTL)
-    
-    return render(request, 'index.html', cached_context)
+    snapshot = get_snapshot()
+    return render(request, 'index.html', {'body': mark_safe(snapshot['body'])})
 
 def privacy(request):
     """
@@ -0,0 +1,477 @@
+"""
+Module: cache.py
+
+Two-tier cache client for django-redis.
+
+Redis is the shared cache (L2) used by every worker. Each process also keeps
+a small in-process cache (L1) of the values it read most recently, so hot keys
+such as the catalog generation, cached pages and variant matrices are served
+without a network round trip.
+
+L1 entries live for at most ``L1_TIMEOUT`` seconds and are dropped as soon as
+any process writes or deletes the key: every write publishes the affected
+keys (or the pattern of a ``delete_pattern``) on a Redis pub/sub channel, and
+a listener thread in each process evicts them from its L1. The L1 and the
+listener are shared by every thread of the process (``ProcessTier``) and are
+stopped at exit; a forked child starts its own. While the listener
+is not subscribed, e.g. while Redis is unreachable, L1 is bypassed and
+emptied, so a missed invalidation cannot serve stale data for longer than
+``L1_TIMEOUT``.
+
+Counters (``incr``/``decr``) and ``add`` always go to Redis, so they stay
+atomic across processes. ``read_shared`` reads a key from Redis alone, for
+values that must be current, such as locks, and ``delete_if_equal`` releases
+such a lock only while the caller still holds it, in one Lua script.
+
+Hits, misses, writes, sizes and lookup times are reported per key prefix to
+Mazlofootwear.cache_metrics.
+
+Enable it with::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': 'redis://127.0.0.1:6379/1',
+            'OPTIONS': {
+                'CLIENT_CLASS': 'Mazlofootwear.cache.TwoTierClient',
+                'L1_MAX_ENTRIES': 1000,
+                'L1_TIMEOUT': 5,
+            },
+        },
+    }
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django_redis.client import DefaultClient
+from django_redis.client.default import _main_exceptions
+from django_redis.exceptions import ConnectionInterrupted
+
+from .cache_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+L1_MAX_ENTRIES = 1000
+L1_TIMEOUT = 5
+INVALIDATION_CHANNEL = 'cache:invalidate'
+RECONNECT_DELAY = 1
+LISTEN_POLL = 1
+
+# Invalidation messages: "<origin>\n<op>\n<key or pattern>\n..."
+KEYS, PATTERN, CLEAR = 'k', 'p', 'c'
+
+
+class LocalCache:
+    """
+    A bounded, thread-safe, least-recently-used map of cache keys to the raw
+    values stored in Redis, each kept for at most ``timeout`` seconds. Raw
+    values are decoded on every hit, so callers never share a mutable object.
+    ``on_evict`` is called with each key dropped to make room.
+    """
+
+    def __init__(self, max_entries, timeout, on_evict=None):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, raw = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return raw
+
+    def set(self, key, raw):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, raw)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                if self.on_evict is not None:
+                    self.on_evict(evicted)
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def delete_matching(self, pattern):
+        with self._lock:
+            for key in [key for key in self._entries if fnmatchcase(key, pattern)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _user_key(nkey):
+    """The key as given by the caller, from a ``prefix:version:key`` one."""
+    return str(nkey).split(':', 2)[-1]
+
+
+class ProcessTier:
+    """
+    The L1 cache and invalidation listener of one Redis cache in this
+    process, shared by every client of it: Django builds a client per
+    thread, but there is one L1, one listener thread and one pub/sub
+    connection per process.
+
+    Args:
+        connect (callable): Returns a Redis client to subscribe with.
+        channel (str): Pub/sub channel carrying invalidations.
+    """
+
+    def __init__(self, connect, channel, max_entries, timeout):
+        self.pid = os.getpid()
+        self.origin = uuid.uuid4().hex
+        self.local = LocalCache(max_entries, timeout, on_evict=lambda nkey: metrics.evict(_user_key(nkey)))
+        self.listening = threading.Event()
+        self._connect = connect
+        self._channel = channel
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._listen, name='cache-invalidation', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the listener and close its pub/sub connection."""
+        self._stopped.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join(LISTEN_POLL * 2)
+
+    def _listen(self):
+        while not self._stopped.is_set():
+            pubsub = None
+            try:
+                pubsub = self._connect().pubsub()
+                pubsub.subscribe(self._channel)
+                while not self._stopped.is_set():
+                    # Poll so that stop() is noticed.
+                    message = pubsub.get_message(timeout=LISTEN_POLL)
+                    if message is None:
+                        continue
+                    if message['type'] == 'subscribe':
+                        # Only trust L1 once invalidations can reach it.
+                        self.listening.set()
+                    elif message['type'] == 'message':
+                        self.apply(message['data'])
+            except Exception:
+                logger.warning('Cache invalidation listener disconnected', exc_info=True)
+            finally:
+                self.listening.clear()
+                self.local.clear()
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+            self._stopped.wait(RECONNECT_DELAY)
+
+    def apply(self, data):
+        """Apply an invalidation message published by another process."""
+        if isinstance(data, bytes):
+            data = data.decode()
+        origin, op, *targets = data.split('\n')
+        if origin != self.origin:
+            self.drop(op, targets)
+
+    def drop(self, op, targets):
+        if op == KEYS:
+            self.local.delete(targets)
+        elif op == PATTERN:
+            for pattern in targets:
+                self.local.delete_matching(pattern)
+        else:
+            self.local.clear()
+
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+def process_tier(key, factory):
+    """
+    Return this process's tier for ``key``, creating it with ``factory()``
+    on first use, and again in a forked child.
+    """
+    tier = _tiers.get(key)
+    if tier is not None and tier.pid == os.getpid():
+        return tier
+    with _tiers_lock:
+        tier = _tiers.get(key)
+        if tier is None or tier.pid != os.getpid():
+            tier = _tiers[key] = factory()
+        return tier
+
+
+def shutdown():
+    """Stop every listener of this process."""
+    with _tiers_lock:
+        tiers = list(_tiers.values())
+        _tiers.clear()
+    for tier in tiers:
+        if tier.pid == os.getpid():
+            tier.stop()
+
+
+def _forget_parent_tiers():
+    # The parent's listener threads do not exist in a forked child, and its
+    # pub/sub sockets must not be closed from here: drop them unused.
+    global _tiers_lock
+    _tiers.clear()
+    _tiers_lock = threading.Lock()
+
+
+atexit.register(shutdown)
+os.register_at_fork(after_in_child=_forget_parent_tiers)
+
+
+class TwoTierClient(DefaultClient):
+    """
+    django-redis client adding a per-process L1 cache in front of Redis,
+    with cross-process invalidation over pub/sub.
+
+    Options (in ``CACHES[...]['OPTIONS']``):
+        L1_MAX_ENTRIES: Keys kept in each process (default 1000).
+        L1_TIMEOUT: Seconds an L1 entry may be served (default 5).
+        INVALIDATION_CHANNEL: Pub/sub channel shared by all processes.
+    """
+
+    def __init__(self, server, params, backend):
+        super().__init__(server, params, backend)
+        options = params.get('OPTIONS', {})
+        self._max_entries = options.get('L1_MAX_ENTRIES', L1_MAX_ENTRIES)
+        self._timeout = options.get('L1_TIMEOUT', L1_TIMEOUT)
+        self._channel = options.get('INVALIDATION_CHANNEL', INVALIDATION_CHANNEL)
+        self._tier_key = (tuple(self._server), self._channel)
+        self._encoded = threading.local()
+
+    # ------------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------------
+
+    @property
+    def tier(self):
+        return process_tier(self._tier_key, lambda: ProcessTier(
+            lambda: self.get_client(write=True), self._channel, self._max_entries, self._timeout,
+        ))
+
+    @property
+    def local(self):
+        return self.tier.local
+
+    def _usable_local(self, client):
+        """
+        This process's L1, or ``None`` when it may not be used: for reads
+        through an explicit client, or while the listener is not subscribed.
+        """
+        if client is not None:
+            return None
+        tier = self.tier
+        return tier.local if tier.listening.is_set() else None
+
+    def _invalidate(self, op, targets=(), client=None):
+        """Drop ``targets`` from this process's L1 and tell the others to."""
+        targets = [str(target) for target in targets]
+        tier = self.tier
+        tier.drop(op, targets)
+        if client is None:
+            client = self.get_client(write=True)
+        try:
+            client.publish(self._channel, '\n'.join([tier.origin, op, *targets]))
+        except _main_exceptions as e:
+            raise ConnectionInterrupted(connection=client) from e
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def encode(self, value):
+        encoded = super().encode(value)
+        # Integers are stored as their digits.
+        self._encoded.size = len(encoded) if isinstance(encoded, bytes) else len(str(encoded))
+        return encoded
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def get(self, key, default=None, version=None, client=None):
+        started = time.perf_counter()
+        nkey = str(self.make_key(key, version=version))
+        local = self._usable_local(client)
+        if local is not None:
+            raw = local.get(nkey)
+            if raw is not None:
+                metrics.hit(key, len(raw), time.perf_counter() - started, local=True)
+                return self.decode(raw)
+
+        if client is None:
+            client = self.get_client(write=False)
+        try:
+            raw = client.get(nkey)
+        except _main_exceptions as e:
+            raise ConnectionInterrupted(connection=client) from e
+        if raw is None:
+            metrics.miss(key, time.perf_counter() - started)
+            return default
+        metrics.hit(key, len(raw), time.perf_counter() - started)
+        if local is not None:
+            local.set(nkey, raw)
+        return self.decode(raw)
+
+    def get_many(self, keys, version=None, client=None):
+        found = OrderedDict()
+        if not keys:
+            return found
+        local = self._usable_local(client)
+        nkeys = OrderedDict((str(self.make_key(key, version=version)), key) for key in keys)
+        missing = []
+        for nkey, key in nkeys.items():
+            raw = local.get(nkey) if local is not None else None
+            if raw is None:
+                missing.append(nkey)
+            else:
+                metrics.hit(key, len(raw), 0, local=True)
+                found[key] = self.decode(raw)
+        if not missing:
+            return found
+
+        if client is None:
+            client = self.get_client(write=False)
+        started = time.perf_counter()
+        try:
+            values = client.mget(*missing)
+        except _main_exceptions as e:
+            raise ConnectionInterrupted(connection=client) from e
+        # One round trip for all the keys: share its time between them.
+        seconds = (time.perf_counter() - started) / len(missing)
+        for nkey, raw in zip(missing, values):
+            if raw is None:
+                metrics.miss(nkeys[nkey], seconds)
+                continue
+            metrics.hit(nkeys[nkey], len(raw), seconds)
+            if local is not None:
+                local.set(nkey, raw)
+            found[nkeys[nkey]] = self.decode(raw)
+        return found
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None, nx=False, xx=False):
+        stored = super().set(key, value, timeout, version=version, client=client, nx=nx, xx=xx)
+        # A refused add() changed nothing.
+        if stored or not nx:
+            metrics.set(key, self._encoded.size)
+            self._invalidate(KEYS, [self.make_key(key, version=version)])
+        return stored
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        if client is None:
+            client = self.get_client(write=True)
+        try:
+            pipeline = client.pipeline()
+            for key, value in data.items():
+                DefaultClient.set(self, key, value, timeout, version=version, client=pipeline)
+                metrics.set(key, self._encoded.size)
+            pipeline.execute()
+        except _main_exceptions as e:
+            raise ConnectionInterrupted(connection=client) from e
+        if data:
+            self._invalidate(KEYS, [self.make_key(key, version=version) for key in data], client)
+
+    def _incr(self, key, delta=1, version=None, client=None, ignore_key_check=False):
+        value = super()._incr(key, delta, version=version, client=client, ignore_key_check=ignore_key_check)
+        self._invalidate(KEYS, [self.make_key(key, version=version)])
+        return value
+
+    def delete(self, key, version=None, prefix=None, client=None):
+        deleted = super().delete(key, version=version, prefix=prefix, client=client)
+        metrics.delete(key)
+        self._invalidate(KEYS, [self.make_key(key, version=version, prefix=prefix)])
+        return deleted
+
+    def delete_many(self, keys, version=None, client=None):
+        keys = list(keys)
+        deleted = super().delete_many(keys, version=version, client=client)
+        for key in keys:
+            metrics.delete(key)
+        if keys:
+            self._invalidate(KEYS, [self.make_key(key, version=version) for key in keys])
+        return deleted
+
+    def delete_pattern(self, pattern, version=None, prefix=None, client=None, itersize=None):
+        deleted = super().delete_pattern(pattern, version=version, prefix=prefix, client=client, itersize=itersize)
+        self._invalidate(PATTERN, [self.make_pattern(pattern, version=version, prefix=prefix)])
+        return deleted
+
+    def clear(self, client=None):
+        super().clear(client=client)
+        self._invalidate(CLEAR)
+
+
+def read_shared(key, default=None, cache=None):
+    """
+    Read ``key`` straight from Redis, skipping this process's L1, for values
+    that must not be even ``L1_TIMEOUT`` seconds old, such as locks and
+    state read back right before it is written. Works with any cache
+    backend; those without an L1 are read as usual.
+    """
+    if cache is None:
+        from django.core.cache import cache
+    client = getattr(cache, 'client', None)
+    if isinstance(client, TwoTierClient):
+        return cache.get(key, default, client=client.get_client(write=True))
+    return cache.get(key, default)
+
+
+# Deletes KEYS[1] only while it holds ARGV[1], in one step on the server.
+_DELETE_IF_EQUAL = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def delete_if_equal(key, value, cache=None):
+    """
+    Delete ``key`` only if it still holds ``value``, e.g. to release a lock
+    only while it is still the caller's. On django-redis caches the check and
+    the delete run as one Lua script, so a key that expired and was set by
+    someone else in between is left alone; other backends check and delete
+    in two steps.
+
+    Returns:
+        bool: Whether the key was deleted.
+    """
+    if cache is None:
+        from django.core.cache import cache
+    client = getattr(cache, 'client', None)
+    if not isinstance(client, DefaultClient):
+        return cache.get(key) == value and cache.delete(key)
+    nkey = client.make_key(key)
+    deleted = client.get_client(write=True).eval(_DELETE_IF_EQUAL, 1, nkey, client.encode(value))
+    if deleted and isinstance(client, TwoTierClient):
+        client._invalidate(KEYS, [nkey])
+    return bool(deleted)
+
@@ -0,0 +1,207 @@
+"""
+Module: cache_metrics.py
+
+Per-prefix cache metrics.
+
+The cache client (Mazlofootwear.cache) and ``get_or_compute``
+(Mazlofootwear.stampede) report every operation here, and the counts are
+aggregated in memory, per process, by key prefix: the leading part of the key
+that names what is cached (``blog:featured_post``, ``shopping``,
+``order:fragment``, ``user_profile``) rather than which instance. For each
+prefix they show:
+
+- hits (and how many were served from the in-process L1), misses, sets,
+  deletes and L1 evictions;
+- the serialized size of values written and read;
+- the time lookups took, and how long ``get_or_compute`` took to recompute a
+  missing value.
+
+Recording an operation takes a lock and a few additions, so it is cheap
+enough to leave on. The numbers are shown to staff on the admin page
+``/admin/cache-metrics/`` and as JSON on ``/api/cache-metrics/`` (see
+Mazlofootwear.views), together with the Redis server's own memory and
+eviction counters. They start from zero with each process, or when reset.
+"""
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+
+PREFIX_DEPTH = getattr(settings, 'CACHE_METRICS_PREFIX_DEPTH', 2)
+MAX_PREFIXES = 500
+OTHER = '(other)'
+
+_name_part = re.compile(r'[^\d]*')
+_digest = re.compile(r'[0-9a-f]{16,}')
+
+
+def key_prefix(key, depth=PREFIX_DEPTH):
+    """
+    Return the prefix of a cache key: its first ``depth`` colon-separated
+    parts, cut at the first digest, or where the first digit starts an id,
+    page number or version.
+
+    >>> key_prefix('blog:category:sneakers:page:2')
+    'blog:category'
+    >>> key_prefix('user_profile_15')
+    'user_profile'
+    """
+    parts = []
+    for part in str(key).split(':')[:depth]:
+        if _digest.fullmatch(part):
+            break
+        name = _name_part.match(part).group()
+        if name != part:
+            name = name.rstrip('_-.')
+            if name:
+                parts.append(name)
+            break
+        parts.append(part)
+    return ':'.join(parts) or OTHER
+
+
+class PrefixStats:
+    """Counters of one key prefix."""
+
+    __slots__ = (
+        'hits', 'local_hits', 'misses', 'sets', 'deletes', 'evictions',
+        'bytes_read', 'bytes_written', 'max_size', 'lookup_seconds',
+        'recomputes', 'recompute_seconds', 'max_recompute_seconds',
+    )
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def as_dict(self, prefix):
+        lookups = self.hits + self.misses
+        return {
+            'prefix': prefix,
+            'hits': self.hits,
+            'local_hits': self.local_hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            'sets': self.sets,
+            'deletes': self.deletes,
+            'evictions': self.evictions,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'avg_size': round(self.bytes_written / self.sets) if self.sets else None,
+            'max_size': self.max_size,
+            'avg_lookup_ms': round(self.lookup_seconds / lookups * 1000, 3) if lookups else None,
+            'recomputes': self.recomputes,
+            'avg_recompute_ms': (
+                round(self.recompute_seconds / self.recomputes * 1000, 3) if self.recomputes else None
+            ),
+            'max_recompute_ms': round(self.max_recompute_seconds * 1000, 3),
+        }
+
+
+class CacheMetrics:
+    """
+    Thread-safe in-process aggregate of cache operations by key prefix.
+
+    At most ``MAX_PREFIXES`` prefixes are tracked; keys with further
+    prefixes are counted under ``(other)``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self.started_at = time.time()
+
+    def _stats_for(self, key):
+        prefix = key_prefix(key)
+        stats = self._stats.get(prefix)
+        if stats is None:
+            if len(self._stats) >= MAX_PREFIXES:
+                prefix = OTHER
+            stats = self._stats.setdefault(prefix, PrefixStats())
+        return stats
+
+    def hit(self, key, size, seconds, local=False):
+        with self._lock:
+            stats = self._stats_for(key)
+            stats.hits += 1
+            stats.local_hits += local
+            stats.bytes_read += size
+            stats.lookup_seconds += seconds
+
+    def miss(self, key, seconds):
+        with self._lock:
+            stats = self._stats_for(key)
+            stats.misses += 1
+            stats.lookup_seconds += seconds
+
+    def set(self, key, size):
+        with self._lock:
+            stats = self._stats_for(key)
+            stats.sets += 1
+            stats.bytes_written += size
+            stats.max_size = max(stats.max_size, size)
+
+    def delete(self, key):
+        with self._lock:
+            self._stats_for(key).deletes += 1
+
+    def evict(self, key):
+        with self._lock:
+            self._stats_for(key).evictions += 1
+
+    def recompute(self, key, seconds):
+        with self._lock:
+            stats = self._stats_for(key)
+            stats.recomputes += 1
+            stats.recompute_seconds += seconds
+            stats.max_recompute_seconds = max(stats.max_recompute_seconds, seconds)
+
+    def snapshot(self):
+        """
+        Return the counters of every prefix, busiest first.
+
+        Returns:
+            list: One dict per prefix (see ``PrefixStats.as_dict``).
+        """
+        with self._lock:
+            rows = [stats.as_dict(prefix) for prefix, stats in self._stats.items()]
+        return sorted(rows, key=lambda row: (-(row['hits'] + row['misses'] + row['sets']), row['prefix']))
+
+
+metrics = CacheMetrics()
+
+
+def redis_info():
+    """
+    Return the Redis server's memory and eviction counters, or ``None`` if
+    the cache is not Redis or cannot be reached.
+    """
+    try:
+        from django_redis import get_redis_connection
+
+        info = get_redis_connection('default').info()
+    except Exception:
+        return None
+    return {
+        name: info.get(name)
+        for name in (
+            'used_memory', 'used_memory_peak', 'maxmemory', 'maxmemory_policy',
+            'keyspace_hits', 'keyspace_misses', 'evicted_keys', 'expired_keys',
+        )
+    }
+
+
+def report():
+    """The metrics of this process and of the Redis server, as plain data."""
+    return {
+        'pid': os.getpid(),
+        'since': metrics.started_at,
+        'uptime_seconds': round(time.time() - metrics.started_at, 1),
+        'prefixes': metrics.snapshot(),
+        'redis': redis_info(),
+    }
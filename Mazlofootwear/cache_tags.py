@@ -0,0 +1,142 @@
+"""
+Module: cache_tags.py
+
+Tag-based cache invalidation.
+
+A cached value declares the data it depends on as tags: ``Post:12`` for one
+instance, ``Blog_Category:*`` for any instance of a model, or a scoped tag
+such as ``User:5:orders``. Every tag has a version number in the cache, and
+``tagged_key`` folds the current versions of a value's tags into its cache
+key. Invalidating a tag increments its version, which makes every key built
+with the old version unreachable at once: one ``incr`` per tag, with no key
+scans and no list of dependent keys to maintain. Unreachable entries simply
+age out.
+
+Models opt in with ``track(Model, *scopes)``, usually from their app's
+``ready()``. A single pair of post_save/post_delete receivers then
+invalidates ``Model:<pk>`` and ``Model:*`` for every saved or deleted
+instance, plus the tags returned by the optional ``scopes`` callables (e.g.
+``lambda order: [f'User:{order.user_id}:orders']``), once the transaction
+commits. Changes written with ``update()`` or ``bulk_create()`` send no
+signals and must call ``invalidate_tags`` themselves.
+
+A missing version (first use, or evicted) starts from the current time in
+nanoseconds, so it can never collide with a version an older key was built
+with.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+_scopes = {}
+
+
+def tag_key(tag):
+    return f'tag:{tag}'
+
+
+def model_tag(model, pk='*'):
+    """
+    The tag of one instance of ``model`` (a model class or instance), or of
+    any instance with the default ``pk``.
+    """
+    return f'{model._meta.object_name}:{pk}'
+
+
+def instance_tags(instance):
+    """All tags invalidated when ``instance`` is saved or deleted."""
+    tags = [model_tag(instance, instance.pk), model_tag(instance)]
+    for scope in _scopes.get(type(instance), ()):
+        tags.extend(scope(instance))
+    return tags
+
+
+def tag_versions(tags):
+    """
+    Return the current version of each tag, in one cache round trip when
+    they are all known.
+
+    Returns:
+        dict: Tag -> version.
+    """
+    keys = {tag_key(tag): tag for tag in tags}
+    found = cache.get_many(list(keys))
+    missing = [key for key in keys if key not in found]
+    if missing:
+        start = time.time_ns()
+        for key in missing:
+            # add() so a version started concurrently is kept.
+            cache.add(key, start, None)
+        found.update(cache.get_many(missing))
+    return {tag: found.get(key, 0) for key, tag in keys.items()}
+
+
+def tag_version(tag):
+    return tag_versions([tag])[tag]
+
+
+def tagged_key(key, tags, versions=None):
+    """
+    Return ``key`` qualified by the current versions of ``tags``.
+
+    Args:
+        versions (dict): Tag versions already read with ``tag_versions``,
+            e.g. to build many keys with one lookup.
+    """
+    if not tags:
+        return key
+    if versions is None:
+        versions = tag_versions(tags)
+    digest = hashlib.md5(
+        ','.join(f'{tag}={versions[tag]}' for tag in sorted(tags)).encode()
+    ).hexdigest()
+    return f'{key}:{digest}'
+
+
+def invalidate_tags(tags):
+    """
+    Make every value cached with any of ``tags`` stale once the current
+    transaction commits (immediately outside one).
+    """
+    tags = set(tags)
+    if tags:
+        transaction.on_commit(lambda: _bump(tags))
+
+
+def _bump(tags):
+    for tag in tags:
+        try:
+            cache.incr(tag_key(tag))
+        except ValueError:
+            # Never used or evicted: any new version invalidates it.
+            cache.add(tag_key(tag), time.time_ns(), None)
+
+
+def track(model, *scopes):
+    """
+    Invalidate a model's tags whenever one of its instances is saved or
+    deleted.
+
+    Args:
+        model (Model): The model class.
+        *scopes (callable): Each called with the instance, returning extra
+            tags to invalidate.
+    """
+    _scopes.setdefault(model, [])
+    for scope in scopes:
+        if scope not in _scopes[model]:
+            _scopes[model].append(scope)
+    uid = f'cache_tags:{model._meta.label}'
+    post_save.connect(invalidate_instance_tags, sender=model, dispatch_uid=uid)
+    post_delete.connect(invalidate_instance_tags, sender=model, dispatch_uid=uid)
+
+
+def invalidate_instance_tags(sender, instance, **kwargs):
+    """
+    Signal handler shared by every tracked model: invalidate the changed
+    instance's tags.
+    """
+    invalidate_tags(instance_tags(instance))
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -56,6 +57,7 @@ INSTALLED_APPS = [
     'Career',
     'Shop',
     'Order',
+    'Media',
 
     # third party apps
     'crispy_forms', 
@@ -87,6 +89,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'Order.context_processors.cart',
             ],
         },
     },
@@ -109,6 +112,12 @@ JAZZMIN_SETTINGS = {
     "navigation_expanded": True,
     "hide_apps": [],
     "hide_models": [],
+
+    # Top menu
+    "topmenu_links": [
+        {"name": "Home", "url": "admin:index"},
+        {"name": "Cache metrics", "url": "cache_metrics"},
+    ],
     
     # Icons Configuration
 "icons": {
@@ -238,6 +247,21 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')  # or BASE_DIR / 'media' if you're using pathlib
 
+# Worker processes rendering product and homepage image derivatives (defaults to the CPU count)
+IMAGE_DERIVATIVE_WORKERS = 2
+
+# Where live carts are kept (see Order.cart_store); the cache store needs a
+# cache shared by all workers and `manage.py flush_carts` running periodically
+CART_STORE = 'Order.cart_store.CacheCartStore'
+
+# Queue checkouts for `manage.py process_checkout_intents` instead of placing
+# them in the request (see Order.intents); useful for flash sales
+QUEUED_CHECKOUT = False
+
+# Bearer token the warehouse uses to post stock files to /api/stock-sync/
+# (see Order.stock_sync); the endpoint is disabled while it is empty
+STOCK_SYNC_TOKEN = ''
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -259,13 +283,30 @@ CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 
+# Redis is the cache shared by all workers; each process keeps its hottest
+# keys in a small in-process cache invalidated over pub/sub (see
+# Mazlofootwear.cache)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
         'TIMEOUT': 60 * 60 * 24,  # 24 hours default timeout
         'OPTIONS': {
-            'MAX_ENTRIES': 1000,  # Maximum number of entries in the cache
+            'CLIENT_CLASS': 'Mazlofootwear.cache.TwoTierClient',
+            'L1_MAX_ENTRIES': 1000,  # Keys kept in each process
+            'L1_TIMEOUT': 5,  # Seconds a process may serve a key without asking Redis
         }
     }
 }
+
+# Tests run against an in-memory Redis (fakeredis), so the suite needs no
+# Redis server and never touches a real cache
+if sys.argv[1:2] == ['test']:
+    import fakeredis
+    CACHES['default']['OPTIONS']['CONNECTION_POOL_KWARGS'] = {
+        'connection_class': fakeredis.FakeConnection,
+    }
+
+# Bearer token monitoring uses to read /api/cache-metrics/ (see
+# Mazlofootwear.cache_metrics); staff can always read it when signed in
+CACHE_METRICS_TOKEN = ''
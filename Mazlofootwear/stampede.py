@@ -0,0 +1,152 @@
+"""
+Module: stampede.py
+
+Cache stampede protection for values that are expensive to compute.
+
+``get_or_compute`` replaces ``cache.get_or_set`` and hand-written
+get-then-set blocks. When a popular key expires, only one request in the
+whole site recomputes it:
+
+- Single flight: recomputing requires a lease, taken with an atomic
+  ``cache.add`` and released when done (or after ``lease`` seconds if the
+  holder dies). Requests finding no value and no lease free wait briefly
+  for the holder's result instead of querying the database themselves.
+- Stale-while-revalidate: values are kept ``stale`` seconds past their
+  timeout. A request hitting a stale value serves it at once, and the one
+  that takes the lease refreshes it in a background thread.
+- Probabilistic early refresh (XFetch): each read of a fresh value may start
+  the refresh early, with a probability that grows as expiry approaches and
+  with how long the value took to compute, so hot keys are usually renewed
+  before they ever expire.
+
+Entries are stored as ``(value, compute seconds, expiry timestamp)``, so
+``None`` is cached like any other value. Values declaring cache tags are
+invalidated immediately when a tag is (Mazlofootwear.cache_tags); the next
+read recomputes them under the lease. Recompute times are reported to
+Mazlofootwear.cache_metrics.
+"""
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import connections
+
+from .cache import delete_if_equal
+from .cache_metrics import metrics
+from .cache_tags import tagged_key
+
+logger = logging.getLogger(__name__)
+
+BETA = 1.0
+LEASE_TIMEOUT = 30
+WAIT_TIMEOUT = 5
+WAIT_INTERVAL = 0.05
+
+
+def lease_key(key):
+    # Leading, so leases are counted apart from their values in the metrics.
+    return f'lease:{key}'
+
+
+def get_or_compute(key, compute, timeout, stale=None, beta=BETA, lease=LEASE_TIMEOUT, tags=()):
+    """
+    Return the cached value of ``key``, computing it with ``compute()`` at
+    most once at a time across all workers.
+
+    Args:
+        key (str): Cache key.
+        compute (callable): Builds the value; must return something
+            picklable (evaluate querysets first).
+        timeout (int): Seconds the value is fresh.
+        stale (int): Seconds a value may be served past ``timeout`` while it
+            is refreshed in the background; defaults to ``timeout``.
+        beta (float): XFetch eagerness; above 1 refreshes earlier, 0 never
+            refreshes early.
+        lease (int): Seconds a recomputation may take before another
+            request is allowed to try.
+        tags (iterable): Cache tags the value depends on; invalidating any
+            of them makes the value stale at once (see
+            Mazlofootwear.cache_tags).
+    """
+    if tags:
+        key = tagged_key(key, tags)
+    if stale is None:
+        stale = timeout
+    entry = cache.get(key)
+    if entry is not None:
+        value, delta, expires_at = entry
+        # XFetch: -log(U) is exponentially distributed, so the chance of an
+        # early refresh rises smoothly towards expiry.
+        if time.time() - delta * beta * math.log(1.0 - random.random()) < expires_at:
+            return value
+        token = _take_lease(key, lease)
+        if token:
+            threading.Thread(
+                target=_refresh_in_background,
+                args=(key, compute, timeout, stale, token),
+                name=f'refresh {key}',
+                daemon=True,
+            ).start()
+        return value
+
+    token = _take_lease(key, lease)
+    if not token:
+        # Someone else is computing the value: wait for it rather than
+        # piling onto the database.
+        deadline = time.monotonic() + min(lease, WAIT_TIMEOUT)
+        while time.monotonic() < deadline:
+            time.sleep(WAIT_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+        token = _take_lease(key, lease)
+    try:
+        return _recompute(key, compute, timeout, stale)
+    finally:
+        if token:
+            _release_lease(key, token)
+
+
+def refresh(key, compute, timeout, stale=None):
+    """
+    Recompute the value of ``key`` now and store it for ``get_or_compute``,
+    e.g. right after the data it is built from changed, so readers never find
+    it missing.
+    """
+    if stale is None:
+        stale = timeout
+    return _recompute(key, compute, timeout, stale)
+
+
+def _recompute(key, compute, timeout, stale):
+    started = time.monotonic()
+    value = compute()
+    delta = time.monotonic() - started
+    metrics.recompute(key, delta)
+    cache.set(key, (value, delta, time.time() + timeout), timeout + stale)
+    return value
+
+
+def _refresh_in_background(key, compute, timeout, stale, token):
+    try:
+        _recompute(key, compute, timeout, stale)
+    except Exception:
+        logger.exception('Background refresh of %s failed', key)
+    finally:
+        _release_lease(key, token)
+        # The thread opened its own database connections.
+        connections.close_all()
+
+
+def _take_lease(key, lease):
+    token = uuid.uuid4().hex
+    return token if cache.add(lease_key(key), token, lease) else None
+
+
+def _release_lease(key, token):
+    # Only while it is still ours: it may have expired and been taken since.
+    delete_if_equal(lease_key(key), token)
@@ -0,0 +1,165 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase
+
+from Accounts.models import Address
+
+from .cache import KEYS, ProcessTier, TwoTierClient, delete_if_equal, read_shared
+from .cache_tags import invalidate_tags, tag_key, tag_versions, tagged_key
+from .stampede import get_or_compute, lease_key
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    """
+    Invalidation of the per-process L1 over pub/sub. A second ProcessTier on
+    the same channel plays the part of another process.
+    """
+
+    def setUp(self):
+        self.client = getattr(cache, 'client', None)
+        if not isinstance(self.client, TwoTierClient):
+            self.skipTest('The default cache does not use TwoTierClient')
+        self.assertTrue(wait_for(self.client.tier.listening.is_set))
+        self.other = ProcessTier(
+            lambda: self.client.get_client(write=True), self.client._channel, max_entries=10, timeout=5,
+        )
+        self.addCleanup(self.other.stop)
+        self.assertTrue(wait_for(self.other.listening.is_set))
+
+    def nkey(self, key):
+        return str(self.client.make_key(key))
+
+    def test_read_is_kept_in_l1(self):
+        cache.set('tests:l1', 'value')
+        self.assertEqual(cache.get('tests:l1'), 'value')
+        self.assertIsNotNone(self.client.local.get(self.nkey('tests:l1')))
+
+    def test_write_invalidates_other_processes(self):
+        cache.set('tests:shared', 'old')
+        self.other.local.set(self.nkey('tests:shared'), b'stale')
+        cache.set('tests:shared', 'new')
+        self.assertTrue(wait_for(lambda: self.other.local.get(self.nkey('tests:shared')) is None))
+
+    def test_other_processes_invalidate_this_one(self):
+        cache.set('tests:remote', 'old')
+        self.assertEqual(cache.get('tests:remote'), 'old')
+        redis = self.client.get_client(write=True)
+        # Another process writes the key and announces it.
+        redis.set(self.nkey('tests:remote'), self.client.encode('new'))
+        redis.publish(self.client._channel, '\n'.join([self.other.origin, KEYS, self.nkey('tests:remote')]))
+        self.assertTrue(wait_for(lambda: cache.get('tests:remote') == 'new'))
+
+    def test_read_shared_skips_l1(self):
+        cache.set('tests:fresh', 'old')
+        cache.get('tests:fresh')
+        # Changed in Redis without an invalidation reaching this process yet.
+        self.client.get_client(write=True).set(self.nkey('tests:fresh'), self.client.encode('new'))
+        self.assertEqual(cache.get('tests:fresh'), 'old')
+        self.assertEqual(read_shared('tests:fresh'), 'new')
+
+    def test_delete_if_equal(self):
+        cache.set('tests:lock', 'mine')
+        self.other.local.set(self.nkey('tests:lock'), b'stale')
+        self.assertFalse(delete_if_equal('tests:lock', 'theirs'))
+        self.assertEqual(read_shared('tests:lock'), 'mine')
+        self.assertTrue(delete_if_equal('tests:lock', 'mine'))
+        self.assertIsNone(read_shared('tests:lock'))
+        self.assertTrue(wait_for(lambda: self.other.local.get(self.nkey('tests:lock')) is None))
+
+
+class StampedeTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.compute = mock.Mock(return_value='fresh')
+
+    def test_computes_once(self):
+        self.compute.return_value = None
+        self.assertIsNone(get_or_compute('tests:once', self.compute, 60))
+        self.assertIsNone(get_or_compute('tests:once', self.compute, 60))
+        self.compute.assert_called_once_with()
+        self.assertIsNone(cache.get(lease_key('tests:once')))
+
+    def test_waits_for_the_lease_holder(self):
+        cache.add(lease_key('tests:wait'), 'other', 5)
+        threading.Timer(0.1, cache.set, ['tests:wait', ('theirs', 0, time.time() + 60)]).start()
+        self.assertEqual(get_or_compute('tests:wait', self.compute, 60), 'theirs')
+        self.compute.assert_not_called()
+        self.assertEqual(cache.get(lease_key('tests:wait')), 'other')
+
+    def test_serves_stale_while_refreshing(self):
+        cache.set('tests:stale', ('old', 0, time.time() - 1), 60)
+        self.assertEqual(get_or_compute('tests:stale', self.compute, 60), 'old')
+        self.assertTrue(wait_for(lambda: cache.get('tests:stale')[0] == 'fresh'))
+        self.assertTrue(wait_for(lambda: cache.get(lease_key('tests:stale')) is None))
+
+    def test_refreshes_early_near_expiry(self):
+        # A value that took long to compute and expires in a second.
+        cache.set('tests:early', ('old', 1000, time.time() + 1), 60)
+        with mock.patch('Mazlofootwear.stampede.random.random', return_value=0.5):
+            self.assertEqual(get_or_compute('tests:early', self.compute, 60), 'old')
+        self.assertTrue(wait_for(lambda: cache.get('tests:early')[0] == 'fresh'))
+
+    def test_lease_is_released_when_compute_fails(self):
+        self.compute.side_effect = RuntimeError
+        with self.assertRaises(RuntimeError):
+            get_or_compute('tests:fails', self.compute, 60)
+        self.assertIsNone(cache.get(lease_key('tests:fails')))
+
+
+class CacheTagTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidated_when_the_transaction_commits(self):
+        key = tagged_key('tests:tagged', ['A', 'B'])
+        self.assertEqual(tagged_key('tests:tagged', ['B', 'A']), key)
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_tags(['B'])
+            self.assertEqual(tagged_key('tests:tagged', ['A', 'B']), key)
+        self.assertNotEqual(tagged_key('tests:tagged', ['A', 'B']), key)
+
+    def test_kept_when_the_transaction_rolls_back(self):
+        key = tagged_key('tests:tagged', ['A'])
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    invalidate_tags(['A'])
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(tagged_key('tests:tagged', ['A']), key)
+
+    def test_evicted_version_starts_over_with_a_new_one(self):
+        key = tagged_key('tests:tagged', ['A'])
+        cache.delete(tag_key('A'))
+        self.assertNotEqual(tagged_key('tests:tagged', ['A']), key)
+
+    def test_tracked_model_changes_invalidate_its_tags(self):
+        user = User.objects.create_user('tagged')
+        address = Address.objects.create(
+            user=user, address='1 Main Street', city='Springfield', state='IL', zip_code='62701', phone_number='5550100',
+        )
+        tags = [f'Address:{address.pk}', 'Address:*', f'User:{user.pk}:addresses', 'Address:0']
+        before = tag_versions(tags)
+        with self.captureOnCommitCallbacks(execute=True):
+            address.city = 'Shelbyville'
+            address.save()
+        after = tag_versions(tags)
+        self.assertEqual([before[tag] != after[tag] for tag in tags], [True, True, True, False])
+
@@ -18,6 +18,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from Media.views import serve_media
+from .views import cache_metrics_json, cache_metrics_page
 
 urlpatterns = []
 
@@ -29,6 +31,8 @@ if settings.DEBUG:
 
 
 urlpatterns += [
+    path('admin/cache-metrics/', admin.site.admin_view(cache_metrics_page), name='cache_metrics'),
+    path('api/cache-metrics/', cache_metrics_json, name='cache_metrics_json'),
     path('admin/', admin.site.urls),    
     path('', include('Accounts.urls')),
     path('', include('Home.urls')),
@@ -38,6 +42,6 @@ urlpatterns += [
     path('', include('Contact.urls')),
     path('', include('Shop.urls')),
     path('', include('Order.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)  # Serve media files in development
+] + static(settings.MEDIA_URL, view=serve_media, document_root=settings.MEDIA_ROOT)  # Serve media files in development
 
 
@@ -0,0 +1,54 @@
+"""
+Module: views.py
+
+Site-wide views that belong to no single app: the cache metrics page in the
+admin and its machine-readable twin (see Mazlofootwear.cache_metrics).
+"""
+import hmac
+
+from django.conf import settings
+from django.contrib import admin
+from django.http import JsonResponse
+from django.shortcuts import redirect, render
+from django.views.decorators.cache import never_cache
+
+from .cache_metrics import metrics, report
+
+CACHE_METRICS_TOKEN = getattr(settings, 'CACHE_METRICS_TOKEN', '')
+
+
+def cache_metrics_page(request):
+    """
+    Shows this process's cache metrics per key prefix, with the Redis
+    server's memory and eviction counters. Posting resets the counters.
+
+    Wrapped with ``admin.site.admin_view`` in the URLconf, so only staff get
+    here.
+    """
+    if request.method == 'POST':
+        metrics.reset()
+        return redirect('cache_metrics')
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Cache metrics',
+        'report': report(),
+    }
+    return render(request, 'admin/cache_metrics.html', context)
+
+
+@never_cache
+def cache_metrics_json(request):
+    """
+    Returns the cache metrics of the process serving the request as JSON,
+    for monitoring to scrape.
+
+    - Open to signed-in staff, or to ``Authorization: Bearer
+      <CACHE_METRICS_TOKEN>`` when that setting is not empty.
+    """
+    token = request.META.get('HTTP_AUTHORIZATION', '').removeprefix('Bearer ')
+    authorized = request.user.is_active and request.user.is_staff
+    if not authorized and CACHE_METRICS_TOKEN:
+        authorized = hmac.compare_digest(token.encode(), CACHE_METRICS_TOKEN.encode())
+    if not authorized:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    return JsonResponse(report())
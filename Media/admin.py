@@ -0,0 +1,26 @@
+"""
+Admin configuration for the StoredFile model.
+"""
+
+from django.contrib import admin
+from .models import StoredFile
+
+
+class StoredFileAdmin(admin.ModelAdmin):
+    """
+    Read-only view of the content-addressed media store.
+    - Displays each stored file with its size and reference count.
+    - Rows are maintained by the storage and its signals, never edited by hand.
+    """
+    list_display = ('name', 'size', 'refcount', 'created_at')
+    search_fields = ('name',)
+    ordering = ('-created_at',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(StoredFile, StoredFileAdmin)
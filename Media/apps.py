@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class MediaConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'Media'
+
+    def ready(self):
+        # Reference-count the files of every field using the content-addressed storage.
+        from .signals import track_file_references
+        track_file_references()
@@ -0,0 +1,70 @@
+"""
+Module: dedupe_media.py
+
+Management command moving files uploaded before the content-addressed
+storage was introduced into it. Rows pointing at identical bytes end up
+sharing one file, and the old per-upload copies are deleted.
+"""
+import os
+
+from django.apps import apps
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from Media.signals import content_addressed_fields
+from Media.storage import is_content_addressed
+
+
+class Command(BaseCommand):
+    help = 'Re-store legacy uploads by content hash and delete the duplicate copies.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many files would be moved.',
+        )
+
+    def handle(self, *args, **options):
+        tracked = [(model, field) for model in apps.get_models() for field in content_addressed_fields(model)]
+        moved = missing = 0
+        legacy_names = set()
+
+        for model, field in tracked:
+            rows = model._default_manager.exclude(**{field.attname: ''}) \
+                .exclude(**{f'{field.attname}__isnull': True}).order_by('pk')
+            for instance in rows.iterator():
+                field_file = getattr(instance, field.attname)
+                if is_content_addressed(field_file.name):
+                    continue
+                if not field.storage.exists(field_file.name):
+                    missing += 1
+                    self.stderr.write(f'{model._meta.label}#{instance.pk}: {field_file.name} is missing')
+                    continue
+                moved += 1
+                if options['dry_run']:
+                    continue
+
+                legacy_names.add((field.storage, field_file.name))
+                with field.storage.open(field_file.name, 'rb') as legacy:
+                    # Assigning an unsaved File makes save() upload it, which
+                    # stores it by hash and runs the model's own signals.
+                    setattr(instance, field.attname, File(legacy, name=os.path.basename(field_file.name)))
+                    instance.save(update_fields=[field.name])
+
+        deleted = 0
+        for storage, name in legacy_names:
+            still_used = any(
+                model._default_manager.filter(**{field.attname: name}).exists()
+                for model, field in tracked
+            )
+            if not still_used:
+                storage.delete(name)
+                deleted += 1
+
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {moved} file(s) into content-addressed storage; deleted {deleted} legacy file(s).'
+        ))
+        if missing:
+            self.stderr.write(self.style.WARNING(f'{missing} referenced file(s) were missing and left untouched.'))
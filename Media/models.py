@@ -0,0 +1,24 @@
+"""
+Models for the content-addressed media store.
+"""
+
+from django.db import models
+
+
+class StoredFile(models.Model):
+    """
+    One file in the content-addressed media store, with the number of model
+    fields currently pointing at it. The file is deleted when the last
+    reference goes away.
+    """
+    name = models.CharField(max_length=255, unique=True, help_text="Storage path, derived from the content hash")
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Stored File'
+        verbose_name_plural = 'Stored Files'
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} reference{'s' if self.refcount != 1 else ''})"
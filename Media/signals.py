@@ -0,0 +1,87 @@
+"""
+Module: signals.py
+
+Reference counting for model fields stored in ContentAddressedStorage.
+
+``track_file_references`` connects the handlers below to every model with
+such a field. Uploads take their reference inside the storage; these
+handlers take a reference when an already stored name is assigned (e.g.
+copied from another row) and release the previous name when a field changes
+or its row is deleted. Releases wait for the transaction to commit so a
+rolled back change never deletes a file that is still in use.
+"""
+from django.apps import apps
+from django.db import transaction
+from django.db.models import FileField
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .storage import ContentAddressedStorage, acquire, release
+
+
+def content_addressed_fields(model):
+    """Return the file fields of ``model`` that use ContentAddressedStorage."""
+    return [
+        field for field in model._meta.concrete_fields
+        if isinstance(field, FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+def track_file_references():
+    """
+    Connect the reference counting handlers to every installed model with a
+    content-addressed file field.
+    """
+    for model in apps.get_models():
+        if content_addressed_fields(model):
+            uid = f'media_refs:{model._meta.label}'
+            pre_save.connect(remember_file_names, sender=model, dispatch_uid=uid)
+            post_save.connect(update_file_references, sender=model, dispatch_uid=uid)
+            post_delete.connect(release_file_references, sender=model, dispatch_uid=uid)
+
+
+def remember_file_names(sender, instance, **kwargs):
+    """
+    Signal handler to note, before the row is written, which names its file
+    fields held and whether they are about to receive an upload.
+    """
+    fields = content_addressed_fields(sender)
+    previous = {}
+    if not instance._state.adding and instance.pk is not None:
+        previous = sender._default_manager.filter(pk=instance.pk) \
+            .values(*[field.attname for field in fields]).first() or {}
+    instance._media_previous = {
+        field.attname: (previous.get(field.attname) or '', _is_uploading(getattr(instance, field.attname)))
+        for field in fields
+    }
+
+
+def update_file_references(sender, instance, **kwargs):
+    """
+    Signal handler to move references from the old to the new file names.
+    """
+    for attname, (old, uploaded) in getattr(instance, '_media_previous', {}).items():
+        new = getattr(instance, attname).name or ''
+        if new and new != old and not uploaded:
+            acquire(new)
+        # Re-uploading the current file took a second reference in storage.
+        if old and (new != old or uploaded):
+            _release_on_commit(old)
+    instance._media_previous = {}
+
+
+def release_file_references(sender, instance, **kwargs):
+    """
+    Signal handler to release the files of a deleted row.
+    """
+    for field in content_addressed_fields(sender):
+        name = getattr(instance, field.attname).name
+        if name:
+            _release_on_commit(name)
+
+
+def _is_uploading(field_file):
+    return bool(field_file) and not field_file._committed
+
+
+def _release_on_commit(name):
+    transaction.on_commit(lambda: release(name))
@@ -0,0 +1,185 @@
+"""
+Module: storage.py
+
+Content-addressed file storage for uploaded media.
+
+``ContentAddressedStorage`` stores every upload under the SHA-256 of its
+bytes, keeping the ``upload_to`` directory of the field, e.g.
+``products/3f/3fa9...c2.jpg``. The hash is computed while the upload is
+streamed to a temporary file next to its destination, so the bytes are only
+read once. Uploading bytes that are already stored returns the existing name
+instead of writing a renamed copy.
+
+The staged file is only renamed into place once the transaction that takes
+its reference commits. If that transaction rolls back, the discarded commit
+callback drops the staged file, which deletes it, so no blob is left on disk
+without a StoredFile row.
+
+Each stored file has a StoredFile row counting the model fields that point at
+it. Uploads take a reference here; Media.signals takes references for names
+assigned without an upload and releases them when a field changes or its row
+is deleted. Because a name never changes its contents, the files can be served
+with far-future immutable cache headers (see Media.views).
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+HASH_NAME = re.compile(r'(^|/)([0-9a-f]{2})/\2[0-9a-f]{62}(\.[\w]+)?$')
+CHUNK_SIZE = 64 * 1024
+
+
+@deconstructible(path='Media.storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that names files by their content and reference-counts
+    them.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save(), and identical
+        # content is meant to share a name, so no collision suffixes.
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+
+        staged, digest, size = self._stage(directory, content)
+        final_name = posixpath.join(directory, digest[:2], digest + extension)
+        acquire(final_name, size=size)
+        transaction.on_commit(lambda: self._publish(staged, final_name))
+        return final_name
+
+    def _publish(self, staged, name):
+        """
+        Move a staged file into place once its reference is committed, unless
+        the same content is already stored.
+        """
+        if self.exists(name):
+            staged.discard()
+            return
+        os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+        staged.move_to(self.path(name))
+        if self.file_permissions_mode is not None:
+            os.chmod(self.path(name), self.file_permissions_mode)
+
+    def _stage(self, directory, content):
+        """
+        Hash an upload and get it onto disk with a single read.
+
+        Large uploads already sit in a temporary file, which is hashed and
+        moved next to its destination. Anything else is streamed into a
+        temporary file in the destination directory, hashing each chunk as it
+        is written.
+
+        Returns:
+            tuple: The StagedFile, hex digest and size in bytes.
+        """
+        sha256 = hashlib.sha256()
+        size = 0
+        target_directory = self.path(directory)
+        os.makedirs(target_directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=target_directory, prefix='.upload-')
+        try:
+            if hasattr(content, 'temporary_file_path'):
+                os.close(fd)
+                with open(content.temporary_file_path(), 'rb') as source:
+                    for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                        sha256.update(chunk)
+                        size += len(chunk)
+                file_move_safe(content.temporary_file_path(), path, allow_overwrite=True)
+            else:
+                with os.fdopen(fd, 'wb') as staged:
+                    content.seek(0)
+                    for chunk in content.chunks(CHUNK_SIZE):
+                        if isinstance(chunk, str):
+                            chunk = chunk.encode()
+                        sha256.update(chunk)
+                        staged.write(chunk)
+                        size += len(chunk)
+            os.chmod(path, 0o644)
+        except BaseException:
+            os.remove(path)
+            raise
+        return StagedFile(path), sha256.hexdigest(), size
+
+
+class StagedFile:
+    """
+    An upload waiting to be moved into place. The file is deleted when the
+    object is dropped without being moved, e.g. with the commit callbacks of
+    a rolled back transaction.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def move_to(self, path):
+        os.replace(self.path, path)
+        self.path = None
+
+    def discard(self):
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+    def __del__(self):
+        self.discard()
+
+
+content_storage = ContentAddressedStorage()
+
+
+def is_content_addressed(name):
+    """
+    Return whether ``name`` was produced by ContentAddressedStorage. Files
+    uploaded before it was introduced are not reference-counted.
+    """
+    return bool(name) and HASH_NAME.search(name) is not None
+
+
+def acquire(name, size=None):
+    """
+    Add a reference to a stored file, creating its StoredFile row if needed.
+    """
+    from .models import StoredFile
+
+    if not is_content_addressed(name):
+        return
+    with transaction.atomic():
+        stored, _ = StoredFile.objects.select_for_update().get_or_create(
+            name=name, defaults={'size': size or 0}
+        )
+        StoredFile.objects.filter(pk=stored.pk).update(refcount=F('refcount') + 1)
+
+
+def release(name):
+    """
+    Drop a reference to a stored file, deleting the file with its last
+    reference.
+    """
+    from .models import StoredFile
+
+    if not is_content_addressed(name):
+        return
+    with transaction.atomic():
+        stored = StoredFile.objects.select_for_update().filter(name=name).first()
+        if stored is None:
+            return
+        if stored.refcount > 1:
+            StoredFile.objects.filter(pk=stored.pk).update(refcount=F('refcount') - 1)
+            return
+        stored.delete()
+        content_storage.delete(name)
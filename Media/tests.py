@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from .models import StoredFile
+from .storage import content_storage, is_content_addressed
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Uploads go through UserProfile.profile_picture, which uses the storage."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.first, self.second = (User.objects.create_user(name).userprofile for name in ('first', 'second'))
+
+    def upload(self, profile, data=b'same bytes'):
+        # Assigned and saved with the row, the way the admin uploads.
+        profile.profile_picture = ContentFile(data, name='photo.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        return profile.profile_picture.name
+
+    def files(self):
+        return sorted(
+            os.path.relpath(os.path.join(directory, name), self.media_root)
+            for directory, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def test_identical_uploads_share_a_file(self):
+        name = self.upload(self.first)
+        self.assertTrue(is_content_addressed(name))
+        self.assertEqual(self.upload(self.second), name)
+        self.assertEqual(StoredFile.objects.get(name=name).refcount, 2)
+        self.assertEqual(self.files(), [name])
+        with content_storage.open(name) as stored:
+            self.assertEqual(stored.read(), b'same bytes')
+
+    def test_file_is_deleted_with_its_last_reference(self):
+        name = self.upload(self.first)
+        self.upload(self.second)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first.delete()
+        self.assertEqual(StoredFile.objects.get(name=name).refcount, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.second.delete()
+        self.assertFalse(StoredFile.objects.exists())
+        self.assertEqual(self.files(), [])
+
+    def test_rolled_back_upload_leaves_no_file(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    self.first.profile_picture = ContentFile(b'rolled back', name='photo.jpg')
+                    self.first.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertFalse(StoredFile.objects.exists())
+        self.assertEqual(self.files(), [])
+
+    def test_dedupe_media(self):
+        for profile in (self.first, self.second):
+            legacy = f'profile_pic/{profile.user.username}.jpg'
+            os.makedirs(os.path.join(self.media_root, 'profile_pic'), exist_ok=True)
+            with open(os.path.join(self.media_root, legacy), 'wb') as file:
+                file.write(b'same bytes')
+            type(profile).objects.filter(pk=profile.pk).update(profile_picture=legacy)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('dedupe_media', stdout=StringIO())
+
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        name = self.first.profile_picture.name
+        self.assertTrue(is_content_addressed(name))
+        self.assertEqual(self.second.profile_picture.name, name)
+        self.assertEqual(StoredFile.objects.get(name=name).refcount, 2)
+        self.assertEqual(self.files(), [name])
@@ -0,0 +1,17 @@
+from django.views.static import serve
+
+from .storage import is_content_addressed
+
+# One year, the longest lifetime caches honour.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """
+    Serve an uploaded file, marking content-addressed files as immutable so
+    browsers and CDNs never revalidate them.
+    """
+    response = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if is_content_addressed(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
@@ -18,6 +18,101 @@ class CartAdmin(admin.ModelAdmin):
         return False
 
 
+class StockHoldAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the StockHold model.
+    Displays active and expired cart reservations; holds are only created by the cart.
+    """
+    list_display = ('id', 'user', 'variant', 'quantity', 'expires_at')
+    list_filter = ('expires_at',)
+
+    def has_add_permission(self, request, obj=None):
+        """
+        Disables the ability to add a stock hold manually from the admin interface.
+        """
+        return False
+
+
+class CheckoutKeyAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the CheckoutKey model.
+    Displays checkout idempotency keys and the orders they placed; keys are only created by checkout.
+    """
+    list_display = ('key', 'user', 'order', 'created_at')
+    list_filter = ('created_at',)
+    search_fields = ('key',)
+
+    def has_add_permission(self, request, obj=None):
+        """
+        Disables the ability to add a checkout key manually from the admin interface.
+        """
+        return False
+
+
+class CheckoutIntentAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the CheckoutIntent model.
+    Displays queued checkouts and their outcome; intents are only created by checkout.
+    """
+    list_display = ('id', 'user', 'status', 'order', 'created_at', 'processed_at')
+    list_filter = ('status', 'created_at')
+
+    def has_add_permission(self, request, obj=None):
+        """
+        Disables the ability to add a checkout intent manually from the admin interface.
+        """
+        return False
+
+
+class StockMovementAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the StockMovement model.
+    Displays the inventory ledger read-only; movements are only appended by stock changes.
+    """
+    list_display = ('id', 'variant', 'kind', 'quantity', 'order', 'created_at')
+    list_filter = ('kind', 'created_at')
+    raw_id_fields = ('variant', 'order')
+
+    def has_add_permission(self, request, obj=None):
+        """
+        Disables the ability to add a movement manually; edit the variant's stock instead.
+        """
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        """
+        Keeps the ledger append-only.
+        """
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        """
+        Keeps the ledger append-only; old movements are removed by compaction.
+        """
+        return False
+
+
+class StockSnapshotAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the StockSnapshot model.
+    Displays compacted stock levels read-only; snapshots are only written by compaction.
+    """
+    list_display = ('variant', 'quantity', 'through_id', 'taken_at')
+    raw_id_fields = ('variant',)
+
+    def has_add_permission(self, request, obj=None):
+        """
+        Disables the ability to add a snapshot manually from the admin interface.
+        """
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        """
+        Disables editing snapshots, which would break the ledger replay.
+        """
+        return False
+
+
 class orderAdmin(admin.ModelAdmin):
     """
     Admin configuration for the Order model.
@@ -38,8 +133,9 @@ class orderiteamAdmin(admin.ModelAdmin):
     Admin configuration for the OrderItem model.
     Displays individual order item details and filters by related fields.
     """
-    list_display = ('id', 'order', 'variant', 'quantity', 'price')
+    list_display = ('id', 'order', 'product_name', 'color_name', 'size_label', 'quantity', 'price')
     list_filter = ('id', 'order', 'variant')
+    list_select_related = ('order__user',)
 
     def has_add_permission(self, request, obj=None):
         """
@@ -65,6 +161,11 @@ class ReturnAdmin(admin.ModelAdmin):
 
 # Registering models to the admin interface
 admin.site.register(Cart, CartAdmin)
+admin.site.register(StockHold, StockHoldAdmin)
+admin.site.register(CheckoutKey, CheckoutKeyAdmin)
+admin.site.register(CheckoutIntent, CheckoutIntentAdmin)
+admin.site.register(StockMovement, StockMovementAdmin)
+admin.site.register(StockSnapshot, StockSnapshotAdmin)
 admin.site.register(Order, orderAdmin)
 admin.site.register(OrderItem, orderiteamAdmin)
 admin.site.register(Return, ReturnAdmin)
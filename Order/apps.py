@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class OrderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Order'
+
+    def ready(self):
+        # Register signal handlers that keep stock reservation counters in sync
+        # and merge anonymous carts on login.
+        from . import signals  # noqa: F401
+
+        # Rendered order fragments (Order.history) are tagged with their
+        # order, and a user's cached recent orders (Accounts.views.profile)
+        # with the user.
+        from Mazlofootwear.cache_tags import track
+        from .history import order_tag
+        track(self.get_model('Order'), lambda order: [order_tag(order.pk), f'User:{order.user_id}:orders'])
+        track(self.get_model('OrderItem'), lambda item: [order_tag(item.order_id)])
@@ -0,0 +1,474 @@
+"""
+Module: cart_store.py
+
+Live carts kept in the cache tier.
+
+A cart is a small dict ``{variant_id: {'product': id, 'quantity': n, 'price':
+Decimal, 'stock': n}}`` stored under one cache key per owner: a signed-in user
+(``user:<id>``) or an anonymous visitor (``anon:<token>``, the token being kept
+in their session). Price and stock are a snapshot of the variant taken from
+the product's cached variant matrix (Shop.variant_matrix) whenever the line
+changes, and the cart page is rendered from the same matrices, so adding,
+editing, counting and viewing a cart do not query the database once the
+matrices are warm.
+
+Changes to a cart are serialized by a short lock per owner; a request that
+cannot take it gets ``CartBusy`` rather than changing the cart unlocked. Carts
+and the change log are always read from Redis itself, never from the
+per-process L1 (Mazlofootwear.cache), so a change is never based on an older
+copy of the cart.
+
+Users' carts are written back to the Cart table behind the request: the first
+change after a flush appends the owner to a change log held in the cache, and
+``flush_carts`` (``manage.py flush_carts``) persists the logged carts in
+batches. The write is the stock-checked ``INSERT ... ON CONFLICT DO UPDATE``
+against the (user, variant) unique constraint on Cart, for all of a cart's
+lines at once, so a line only reaches the table while its quantity is in
+stock. Checkout flushes the buyer's cart first, so orders are always placed
+from the stored lines, and refuses lines that could not be stored. A user's cart missing from the cache is loaded from the
+Cart table. Anonymous carts only live in the cache and are merged into the
+user's cart when they sign in.
+
+The storage is selected with the ``CART_STORE`` setting; ``CacheCartStore``
+(the default) needs a cache shared by all workers, such as Redis.
+``WriteThroughCartStore`` persists every change immediately instead.
+"""
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from Mazlofootwear.cache import delete_if_equal, read_shared
+from Shop.models import ProductVariant
+from Shop.variant_matrix import get_variant_matrix
+from .models import Cart
+from .reservations import release, reserve
+
+CART_TIMEOUT = 60 * 60 * 24 * 30
+PENDING_TIMEOUT = 60 * 5
+LOCK_TIMEOUT = 5
+LOCK_WAIT = 5
+LOCK_INTERVAL = 0.01
+FLUSH_BATCH_SIZE = 200
+SESSION_KEY = 'cart_token'
+
+LOG_SEQUENCE_KEY = 'order:cart:log:sequence'
+LOG_FLUSHED_KEY = 'order:cart:log:flushed'
+
+CartAddResult = namedtuple('CartAddResult', 'added created quantity stock')
+
+
+class CartBusy(Exception):
+    """Raised when another request holds the cart's lock for too long; try again."""
+
+
+class CartLine(namedtuple('CartLine', 'id product_id name color size price stock quantity picture')):
+    """
+    A cart line as shown on the cart page. ``id`` is the variant id, which
+    identifies the line in the update, remove and checkout forms.
+    """
+
+    @property
+    def total_price(self):
+        return self.price * self.quantity
+
+
+def cart_key(owner):
+    return f'order:cart:{owner}'
+
+
+def pending_key(owner):
+    return f'order:cart:pending:{owner}'
+
+
+def log_key(sequence):
+    return f'order:cart:log:{sequence}'
+
+
+def variant_product_key(variant_id):
+    return f'order:variant_product:{variant_id}'
+
+
+# ----------------------------------------------------------------------
+# Owners
+# ----------------------------------------------------------------------
+
+def cart_owner(request, create=False):
+    """
+    Return the cart owner of a request: the user, or the anonymous visitor
+    identified by a token in their session. Anonymous visitors without a cart
+    get ``None`` unless ``create`` is set.
+    """
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    token = request.session.get(SESSION_KEY)
+    if token is None:
+        if not create:
+            return None
+        token = request.session[SESSION_KEY] = uuid.uuid4().hex
+    return f'anon:{token}'
+
+
+def owner_user_id(owner):
+    """Return the user id of a user's cart owner, ``None`` for anonymous carts."""
+    kind, _, ident = owner.partition(':')
+    return int(ident) if kind == 'user' else None
+
+
+# ----------------------------------------------------------------------
+# Storage backends
+# ----------------------------------------------------------------------
+
+class CacheCartStore:
+    """
+    Keeps carts in the cache and persists users' carts write-behind.
+
+    Subclasses can change where carts live by overriding ``load``, ``save``
+    and ``delete``; everything else in this module goes through them.
+    """
+
+    def load(self, owner):
+        """Return the owner's cart, loading a user's cart from the database on a miss."""
+        lines = read_shared(cart_key(owner))
+        if lines is None:
+            user_id = owner_user_id(owner)
+            lines = load_persisted(user_id) if user_id is not None else {}
+            # add() so a cart changed concurrently is not overwritten.
+            if not cache.add(cart_key(owner), lines, CART_TIMEOUT):
+                lines = read_shared(cart_key(owner), lines)
+        return lines
+
+    def save(self, owner, lines):
+        cache.set(cart_key(owner), lines, CART_TIMEOUT)
+        if owner_user_id(owner) is not None:
+            self.mark_dirty(owner)
+
+    def delete(self, owner):
+        cache.delete(cart_key(owner))
+
+    def mark_dirty(self, owner):
+        """Log the owner for the next flush, once until it is flushed."""
+        if cache.add(pending_key(owner), True, PENDING_TIMEOUT):
+            cache.add(LOG_SEQUENCE_KEY, 0, None)
+            cache.set(log_key(cache.incr(LOG_SEQUENCE_KEY)), owner, CART_TIMEOUT)
+
+    def flush(self, owner):
+        """
+        Persist the owner's cart to the Cart table now.
+
+        Returns:
+            set: Variant ids of the lines that could not be stored (see
+            ``persist``).
+        """
+        user_id = owner_user_id(owner)
+        if user_id is None:
+            return set()
+        cache.delete(pending_key(owner))
+        lines = read_shared(cart_key(owner))
+        if lines is None:
+            return set()
+        return persist(user_id, lines)
+
+
+class WriteThroughCartStore(CacheCartStore):
+    """Keeps carts in the cache but persists users' carts on every change."""
+
+    def save(self, owner, lines):
+        cache.set(cart_key(owner), lines, CART_TIMEOUT)
+        user_id = owner_user_id(owner)
+        if user_id is not None:
+            persist(user_id, lines)
+
+
+@lru_cache(maxsize=None)
+def get_cart_store():
+    """Return the cart store configured by the ``CART_STORE`` setting."""
+    return import_string(getattr(settings, 'CART_STORE', 'Order.cart_store.CacheCartStore'))()
+
+
+def lock_key(owner):
+    return f'order:cart:lock:{owner}'
+
+
+@contextmanager
+def _locked(owner):
+    """
+    Serialize changes to one cart, e.g. double-clicked add buttons. The lock
+    expires on its own, so a crashed request cannot block the cart for long,
+    and holds a token so that only its holder releases it.
+
+    Raises:
+        CartBusy: The lock could not be taken within ``LOCK_WAIT`` seconds.
+    """
+    key = lock_key(owner)
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(key, token, LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            raise CartBusy(owner)
+        time.sleep(LOCK_INTERVAL)
+    try:
+        yield
+    finally:
+        # Ours unless it expired and someone else took it meanwhile.
+        delete_if_equal(key, token)
+
+
+# ----------------------------------------------------------------------
+# Persistence
+# ----------------------------------------------------------------------
+
+def load_persisted(user_id):
+    """Build a user's cart from their Cart rows."""
+    rows = Cart.objects.filter(user_id=user_id) \
+        .values_list('variant_id', 'variant__product_id', 'quantity', 'variant__price', 'variant__stock')
+    return {
+        variant_id: {'product': product_id, 'quantity': quantity, 'price': price, 'stock': stock}
+        for variant_id, product_id, quantity, price, stock in rows
+    }
+
+
+def _upsert_sql(count):
+    quote = connection.ops.quote_name
+    cart, variant = quote(Cart._meta.db_table), quote(ProductVariant._meta.db_table)
+    values = ', '.join(['(CAST(%s AS integer), CAST(%s AS integer))'] * count)
+    return f"""
+        INSERT INTO {cart} ("user_id", "variant_id", "quantity", "created_at", "updated_at")
+        SELECT %s, {variant}."id", wanted.column2, %s, %s
+        FROM {variant} JOIN (VALUES {values}) AS wanted ON {variant}."id" = wanted.column1
+        WHERE {variant}."stock" >= wanted.column2
+        ON CONFLICT ("user_id", "variant_id") DO UPDATE
+        SET "quantity" = excluded."quantity", "updated_at" = excluded."updated_at"
+        RETURNING "variant_id"
+    """
+
+
+def persist(user_id, lines):
+    """
+    Make a user's Cart rows match their cart: one stock-checked upsert for
+    the lines and one delete for the rows no longer in it. PostgreSQL and
+    SQLite (3.35+) accept the same statement.
+
+    A line whose quantity is no longer in stock is refused and its row keeps
+    the last quantity stored. Lines of deleted variants are dropped.
+
+    Returns:
+        set: Variant ids of the lines not stored: refused, or of deleted
+        variants.
+    """
+    stored = set()
+    with transaction.atomic():
+        if lines:
+            now = connection.ops.adapt_datetimefield_value(timezone.now())
+            params = [user_id, now, now]
+            for variant_id, line in lines.items():
+                params.extend([variant_id, line['quantity']])
+            with connection.cursor() as cursor:
+                cursor.execute(_upsert_sql(len(lines)), params)
+                stored = {variant_id for variant_id, in cursor.fetchall()}
+        Cart.objects.filter(user_id=user_id).exclude(variant_id__in=list(lines)).delete()
+    return set(lines) - stored
+
+
+def flush_carts(batch_size=FLUSH_BATCH_SIZE):
+    """
+    Persist the carts changed since the last flush, in batches of logged changes.
+
+    Returns:
+        int: Number of carts written.
+    """
+    flushed = 0
+    while True:
+        start = read_shared(LOG_FLUSHED_KEY, 0)
+        end = min(read_shared(LOG_SEQUENCE_KEY, 0), start + batch_size)
+        if end <= start:
+            return flushed
+        keys = [log_key(sequence) for sequence in range(start + 1, end + 1)]
+        owners = set(cache.get_many(keys).values())
+        for owner in owners:
+            get_cart_store().flush(owner)
+        cache.delete_many(keys)
+        cache.set(LOG_FLUSHED_KEY, end, None)
+        flushed += len(owners)
+
+
+# ----------------------------------------------------------------------
+# Variant snapshots
+# ----------------------------------------------------------------------
+
+def variant_product(variant_id):
+    """Return the product id of a variant (cached; a variant never moves), or ``None``."""
+    product_id = cache.get(variant_product_key(variant_id))
+    if product_id is None:
+        product_id = ProductVariant.objects.filter(pk=variant_id).values_list('product_id', flat=True).first()
+        if product_id is not None:
+            cache.set(variant_product_key(variant_id), product_id, None)
+    return product_id
+
+
+def variant_snapshot(variant_id, product_id=None):
+    """
+    Return the cached matrix entry of a variant (``color_name``, ``size_name``,
+    ``price`` and ``stock``) with its product's matrix, or ``(None, None)`` if
+    the variant does not exist.
+    """
+    product_id = product_id or variant_product(variant_id)
+    matrix = get_variant_matrix(product_id) if product_id else None
+    variant = matrix['variants'].get(variant_id) if matrix else None
+    if variant is None:
+        return None, None
+    return variant, matrix
+
+
+def _line(product_id, quantity, variant):
+    return {'product': product_id, 'quantity': quantity, 'price': variant['price'], 'stock': variant['stock']}
+
+
+# ----------------------------------------------------------------------
+# Cart operations
+# ----------------------------------------------------------------------
+
+def get_cart(owner):
+    return get_cart_store().load(owner) if owner else {}
+
+
+def cart_count(owner):
+    """Number of units in the owner's cart, for the navbar badge."""
+    return sum(line['quantity'] for line in get_cart(owner).values())
+
+
+def add_item(owner, variant_id, quantity):
+    """
+    Add ``quantity`` units of a variant to the owner's cart, creating the line
+    or increasing it, as long as the resulting quantity is in stock.
+
+    Returns:
+        CartAddResult: ``added`` tells whether the cart changed and
+        ``created`` whether a new line was added. ``quantity`` is the line's
+        quantity afterwards (0 if there is none) and ``stock`` the variant's
+        stock (``None`` if the variant does not exist).
+
+    Raises:
+        CartBusy: If the cart stays locked by another request.
+    """
+    variant, matrix = variant_snapshot(variant_id)
+    with _locked(owner):
+        lines = dict(get_cart_store().load(owner))
+        current = lines[variant_id]['quantity'] if variant_id in lines else 0
+        if variant is None or current + quantity > variant['stock']:
+            return CartAddResult(False, False, current, variant and variant['stock'])
+        lines[variant_id] = _line(matrix['product']['id'], current + quantity, variant)
+        get_cart_store().save(owner, lines)
+    return CartAddResult(True, not current, current + quantity, variant['stock'])
+
+
+def set_quantity(owner, variant_id, quantity):
+    """
+    Set the quantity of a line in the owner's cart.
+
+    Returns:
+        bool: Whether the line exists and the quantity is in stock.
+
+    Raises:
+        CartBusy: If the cart stays locked by another request.
+    """
+    with _locked(owner):
+        lines = dict(get_cart_store().load(owner))
+        if variant_id not in lines:
+            return False
+        variant, _ = variant_snapshot(variant_id, lines[variant_id]['product'])
+        if variant is None or quantity > variant['stock']:
+            return False
+        lines[variant_id] = _line(lines[variant_id]['product'], quantity, variant)
+        get_cart_store().save(owner, lines)
+    return True
+
+
+def remove_items(owner, variant_ids):
+    """
+    Remove lines from the owner's cart.
+
+    Returns:
+        dict: The removed lines by variant id.
+
+    Raises:
+        CartBusy: If the cart stays locked by another request.
+    """
+    with _locked(owner):
+        lines = dict(get_cart_store().load(owner))
+        removed = {variant_id: lines.pop(variant_id) for variant_id in variant_ids if variant_id in lines}
+        if removed:
+            get_cart_store().save(owner, lines)
+    return removed
+
+
+def cart_lines(owner):
+    """
+    Return the owner's cart as CartLine objects for display, with the current
+    names, prices and stock from the products' cached variant matrices. Lines
+    of variants that no longer exist are left out.
+    """
+    lines = get_cart(owner)
+    matrices = {}
+    items = []
+    for variant_id, line in lines.items():
+        product_id = line['product']
+        if product_id not in matrices:
+            matrices[product_id] = get_variant_matrix(product_id)
+        matrix = matrices[product_id]
+        variant = matrix['variants'].get(variant_id) if matrix else None
+        if variant is None:
+            continue
+        items.append(CartLine(
+            id=variant_id,
+            product_id=product_id,
+            name=matrix['product']['name'],
+            color=variant['color_name'],
+            size=variant['size_name'],
+            price=variant['price'],
+            stock=variant['stock'],
+            quantity=line['quantity'],
+            picture=matrix['images'][0]['picture'] if matrix['images'] else None,
+        ))
+    return items
+
+
+def merge_anonymous_cart(request, user):
+    """
+    Move the visitor's anonymous cart into the user's cart after sign-in.
+
+    Each line is reserved for the user (see Order.reservations); lines that
+    cannot be fully reserved are reduced to what is still available.
+    """
+    token = request.session.pop(SESSION_KEY, None)
+    if token is None:
+        return
+    anonymous = f'anon:{token}'
+    lines = get_cart_store().load(anonymous)
+    get_cart_store().delete(anonymous)
+
+    owner = f'user:{user.pk}'
+    for variant_id, line in lines.items():
+        quantity = line['quantity']
+        reserved, available = reserve(user, variant_id, quantity)
+        if not reserved:
+            if not available:
+                continue
+            quantity = available
+            reserved, _ = reserve(user, variant_id, quantity)
+            if not reserved:
+                continue
+        try:
+            added = add_item(owner, variant_id, quantity).added
+        except CartBusy:
+            # Signing in must not fail on a busy cart; the line is dropped.
+            added = False
+        if not added:
+            release(user, variant_id, quantity)
@@ -0,0 +1,207 @@
+"""
+Module: checkout.py
+
+Turns selected cart items into an order.
+
+The whole checkout is a fixed number of statements regardless of how many
+line items are bought: the variant rows are locked in id order (so concurrent
+checkouts cannot deadlock), stock is decremented for all of them in one
+conditional UPDATE that only succeeds if every variant still has enough stock,
+the order items are inserted with one bulk INSERT and the order total is
+summed by the database. The sale is recorded in the inventory ledger
+(Order.ledger) with one more INSERT. The items keep a snapshot of their
+product, color, size and thumbnail, read in one more query.
+
+The buyer's stock holds (Order.reservations) are converted into the sale in
+the same transaction; units bought beyond what they held must first be
+claimed from the available-to-sell counter.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import Case, F, OuterRef, PositiveIntegerField, Q, Subquery, Sum, When
+
+from Shop.models import ProductVariant, Size
+from Shop.signals import products_changed
+from .ledger import SALE, movements, record
+from .models import Cart, Order, OrderItem, StockHold
+from .reservations import claim_all, get_available, give_back_all
+
+
+class CheckoutError(Exception):
+    """Raised when an order cannot be placed; the message is shown to the user."""
+
+
+class OutOfStock(CheckoutError):
+    """
+    Raised when a selected variant no longer has the requested quantity.
+    ``variants`` holds the (variant id, available stock) pairs that fell short.
+    """
+
+    def __init__(self, variants):
+        self.variants = variants
+        super().__init__("Some items in your cart are no longer available in the requested quantity")
+
+
+def place_order(user, variant_ids, shipping):
+    """
+    Create an order from the given cart lines and take their stock.
+
+    The buyer's cart must have been persisted (see Order.cart_store) first.
+
+    Args:
+        user (User): The buyer; only their own cart items are used.
+        variant_ids (iterable): Variants of the selected cart lines.
+        shipping (dict): Shipping fields of ``CheckoutForm.cleaned_data``.
+
+    Returns:
+        Order: The placed order with its final ``total_amount``.
+
+    Raises:
+        CheckoutError: If no valid items are selected.
+        OutOfStock: If any variant lacks stock; nothing is changed then.
+    """
+    claimed = {}
+    try:
+        with transaction.atomic():
+            order, surplus = _place_order(user, variant_ids, shipping, claimed)
+    except Exception:
+        give_back_all(claimed)
+        raise
+
+    give_back_all(surplus)
+    return order
+
+
+def _place_order(user, variant_ids, shipping, claimed):
+    lines = list(
+        Cart.objects.filter(variant_id__in=variant_ids, user=user).values_list('id', 'variant_id', 'quantity')
+    )
+    if not lines:
+        raise CheckoutError("No valid items selected")
+
+    quantities = Counter()
+    for _, variant_id, quantity in lines:
+        quantities[variant_id] += quantity
+
+    # The buyer's holds become the sale. Units bought beyond them must
+    # still be available to sell; units held beyond them go back on sale.
+    holds = list(
+        StockHold.objects.select_for_update()
+        .filter(user=user, variant_id__in=quantities, expires_at__gt=timezone.now())
+        .order_by('pk').values_list('id', 'variant_id', 'quantity')
+    )
+    held = {variant_id: quantity for _, variant_id, quantity in holds}
+    deficit = {variant_id: quantity - held.get(variant_id, 0) for variant_id, quantity in quantities.items()}
+    short = claim_all({variant_id: missing for variant_id, missing in deficit.items() if missing > 0})
+    if short:
+        raise OutOfStock([(variant_id, get_available(variant_id)) for variant_id in short])
+    claimed.update({variant_id: missing for variant_id, missing in deficit.items() if missing > 0})
+
+    variants = {
+        variant['id']: variant
+        for variant in ProductVariant.objects.select_for_update()
+        .filter(id__in=quantities).order_by('id').values('id', 'product_id', 'stock', 'price')
+    }
+    short = [
+        (variant_id, variants[variant_id]['stock'] if variant_id in variants else 0)
+        for variant_id, quantity in quantities.items()
+        if variant_id not in variants or variants[variant_id]['stock'] < quantity
+    ]
+    if short:
+        raise OutOfStock(short)
+
+    take_stock(quantities)
+
+    snapshots = line_snapshots(quantities)
+    order = Order.objects.create(user=user, total_amount=0, **shipping)
+    items = OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order, variant_id=variant_id, quantity=quantity, price=variants[variant_id]['price'],
+            **snapshots[variant_id],
+        )
+        for _, variant_id, quantity in lines
+    ])
+    Order.objects.filter(pk=order.pk).update(
+        total_amount=Subquery(
+            OrderItem.objects.filter(order=OuterRef('pk'))
+            .values('order')
+            .annotate(total=Sum(F('quantity') * F('price')))
+            .values('total')
+        ),
+        summary=order_summary(items),
+    )
+    order.refresh_from_db(fields=['total_amount', 'summary'])
+    record(movements(SALE, {variant_id: -quantity for variant_id, quantity in quantities.items()}, order))
+
+    Cart.objects.filter(id__in=[cart_id for cart_id, _, _ in lines]).delete()
+    StockHold.objects.filter(id__in=[hold_id for hold_id, _, _ in holds]).delete()
+    products_changed(variant['product_id'] for variant in variants.values())
+
+    surplus = {variant_id: -missing for variant_id, missing in deficit.items() if missing < 0}
+    return order, surplus
+
+
+def line_snapshots(variant_ids):
+    """
+    Read what order items keep of their variant, in one query.
+
+    Returns:
+        dict: Variant id -> OrderItem snapshot field values.
+    """
+    rows = ProductVariant.objects.filter(id__in=variant_ids).values_list(
+        'id', 'product__name', 'color__name', 'color__code', 'size__code', 'product__card__picture',
+    )
+    snapshots = {}
+    for variant_id, product_name, color_name, color_code, size_code, picture in rows:
+        picture = picture or {}
+        thumb = (picture.get('renditions') or {}).get('thumb') or {}
+        snapshots[variant_id] = {
+            'product_name': product_name,
+            'color_name': color_name,
+            'color_code': color_code,
+            'size_label': str(Size(code=size_code)),
+            'thumbnail': thumb.get('jpeg') or picture.get('src', ''),
+        }
+    return snapshots
+
+
+def order_summary(items):
+    """The compact ``Order.summary`` of the given order items."""
+    return [
+        {
+            'name': item.product_name,
+            'color': item.color_name,
+            'size': item.size_label,
+            'quantity': item.quantity,
+            'thumbnail': item.thumbnail,
+        }
+        for item in items
+    ]
+
+
+def take_stock(quantities):
+    """
+    Decrement the stock of several variants in one conditional UPDATE.
+
+    Each row only matches while it still holds its requested quantity, so if
+    fewer rows than variants were updated someone else got there first and
+    ``OutOfStock`` is raised; callers run inside a transaction, which is then
+    rolled back. This keeps overselling impossible even on databases without
+    row locks.
+
+    Args:
+        quantities (dict): Variant id -> quantity to take.
+    """
+    enough = Q()
+    for variant_id, quantity in quantities.items():
+        enough |= Q(id=variant_id, stock__gte=quantity)
+
+    updated = ProductVariant.objects.filter(enough).update(stock=Case(
+        *[When(id=variant_id, then=F('stock') - quantity) for variant_id, quantity in quantities.items()],
+        default=F('stock'),
+        output_field=PositiveIntegerField(),
+    ))
+    if updated != len(quantities):
+        raise OutOfStock([(variant_id, None) for variant_id in quantities])
@@ -0,0 +1,16 @@
+"""
+Module: context_processors.py
+
+Template context shared by every page of the site.
+"""
+from django.utils.functional import SimpleLazyObject
+
+from .cart_store import cart_count, cart_owner
+
+
+def cart(request):
+    """
+    Provide ``cart_count`` for the navbar badge. It is only looked up if a
+    template uses it, and then costs a single cache read.
+    """
+    return {'cart_count': SimpleLazyObject(lambda: cart_count(cart_owner(request)))}
@@ -0,0 +1,86 @@
+"""
+Module: history.py
+
+Order history and order detail data.
+
+Orders render from the order tables alone: the history cards from the
+``Order.summary`` snapshot and the detail page from the items' own product,
+color, size and thumbnail snapshots, loaded with one prefetch plan
+(``order_prefetches``). The parts of the pages rendered from an order's items
+are cached per order and only rendered, and prefetched, for the orders whose
+fragment is missing. Fragments are tagged ``Order:<id>``, so they go stale
+whenever the order or one of its items is saved, e.g. when its status changes
+(see Mazlofootwear.cache_tags and Order.signals).
+
+The history is paginated by cursor (the id of the last order shown), so the
+hundredth page costs the same index range scan as the first.
+"""
+from django.core.cache import cache
+from django.db.models import Prefetch, prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from Mazlofootwear.cache_tags import tag_versions, tagged_key
+from .models import Order, OrderItem
+
+PAGE_SIZE = 10
+FRAGMENT_TIMEOUT = 60 * 60 * 24 * 7
+FRAGMENT_VERSION = 2  # Bump when the fragment templates change
+FRAGMENTS = {
+    'card': 'order_card.html',
+    'items': 'order_items.html',
+}
+
+
+def order_tag(order_id):
+    return f'Order:{order_id}'
+
+
+def fragment_key(order_id, name, versions):
+    """The cache key of an order's fragment for the given tag versions."""
+    return tagged_key(f'order:fragment:{FRAGMENT_VERSION}:{name}:{order_id}', [order_tag(order_id)], versions)
+
+
+def order_prefetches():
+    """The prefetch plan for rendering orders with their items."""
+    return [Prefetch('items', queryset=OrderItem.objects.order_by('id'))]
+
+
+def order_page(user, before=None, page_size=PAGE_SIZE):
+    """
+    Return one page of a user's orders, newest first.
+
+    Args:
+        before (int): Cursor from the previous page; only older orders are
+            returned. ``None`` for the first page.
+
+    Returns:
+        tuple: ``(orders, next_cursor)``; ``next_cursor`` is ``None`` on the
+        last page.
+    """
+    orders = Order.objects.filter(user=user)
+    if before is not None:
+        orders = orders.filter(id__lt=before)
+    orders = list(orders.order_by('-id')[:page_size + 1])
+    next_cursor = orders[page_size - 1].id if len(orders) > page_size else None
+    return orders[:page_size], next_cursor
+
+
+def render_fragments(orders, name, prefetch=True):
+    """
+    Return the ``name`` fragment of each order by id, rendering and caching
+    the missing ones, after prefetching their items in one pass unless
+    ``prefetch`` is false (the fragment only uses the order row).
+    """
+    versions = tag_versions([order_tag(order.id) for order in orders])
+    keys = {order.id: fragment_key(order.id, name, versions) for order in orders}
+    fragments = cache.get_many(list(keys.values()))
+    missing = [order for order in orders if keys[order.id] not in fragments]
+    if missing:
+        if prefetch:
+            prefetch_related_objects(missing, *order_prefetches())
+        rendered = {keys[order.id]: render_to_string(FRAGMENTS[name], {'order': order}) for order in missing}
+        cache.set_many(rendered, FRAGMENT_TIMEOUT)
+        fragments.update(rendered)
+    return {order.id: mark_safe(fragments[keys[order.id]]) for order in orders}
+
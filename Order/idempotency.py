@@ -0,0 +1,77 @@
+"""
+Module: idempotency.py
+
+Idempotent checkout submissions.
+
+The checkout form carries a key generated when the cart page is rendered.
+Before any checkout work, the key is claimed by inserting a CheckoutKey row
+on its own, outside the order transaction, so a double-submitted form is
+recognised by the unique constraint straight away: the repeat gets the
+order of the first submission (or is told it is still being placed) without
+reading the cart, locking variants or waiting on the first transaction.
+A failed checkout gives its key back so the customer can retry.
+"""
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import CheckoutKey
+
+KEY_TTL = timedelta(seconds=getattr(settings, 'CHECKOUT_KEY_TTL', 24 * 60 * 60))
+PURGE_BATCH_SIZE = 1000
+
+_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+
+def valid_key(key):
+    return bool(key) and bool(_KEY_PATTERN.match(key))
+
+
+def claim_key(user, key):
+    """
+    Claim a checkout key for a user.
+
+    Returns:
+        tuple: ``(claimed, order_id)``. ``claimed`` is true if this request is
+        the first with the key and should place the order; otherwise
+        ``order_id`` is the order already placed for it, or ``None`` while
+        the first request is still running.
+    """
+    try:
+        with transaction.atomic():
+            CheckoutKey.objects.create(user=user, key=key)
+    except IntegrityError:
+        order_id = CheckoutKey.objects.filter(user=user, key=key).values_list('order_id', flat=True).first()
+        return False, order_id
+    return True, None
+
+
+def complete_key(user, key, order):
+    """Record the order placed for a claimed key."""
+    CheckoutKey.objects.filter(user=user, key=key).update(order=order)
+
+
+def release_key(user, key):
+    """Give back a claimed key whose checkout failed, so it can be retried."""
+    CheckoutKey.objects.filter(user=user, key=key, order__isnull=True).delete()
+
+
+def purge_expired_keys(batch_size=PURGE_BATCH_SIZE):
+    """
+    Delete keys older than ``KEY_TTL`` in batches.
+
+    Returns:
+        int: Number of keys deleted.
+    """
+    cutoff = timezone.now() - KEY_TTL
+    purged = 0
+    while True:
+        ids = list(CheckoutKey.objects.filter(created_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return purged
+        purged += CheckoutKey.objects.filter(id__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            return purged
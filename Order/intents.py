@@ -0,0 +1,305 @@
+"""
+Module: intents.py
+
+Queued checkout for flash sales.
+
+With ``QUEUED_CHECKOUT`` enabled, ``process_checkout`` only records a
+CheckoutIntent (one INSERT, no stock locks) and sends the buyer to a page that
+polls for the result. ``process_intents`` (``manage.py
+process_checkout_intents``) then places the queued orders in batches: every
+variant bought in a batch is locked and decremented once for the whole batch,
+intents are allocated in arrival order against the locked stock, and the
+orders, their items and their ledger movements are inserted with one bulk
+INSERT each. A batch is a fixed number of statements, so throughput grows with
+the batch size instead of being bound by one transaction per checkout queueing
+on the same stock rows.
+
+Stock holds and the available-to-sell counters are handled as in
+Order.checkout: held units become the sale, units bought beyond them must be
+claimed from the counter, and surplus holds go back on sale.
+
+A batch that fails as a whole, e.g. on an intent whose shipping data the
+database refuses, is placed again one intent at a time, each in its own
+savepoint, and the intents that still fail are marked Failed with the error,
+so one bad intent never blocks the queue.
+"""
+import logging
+from collections import Counter, defaultdict
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import OperationalError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from Mazlofootwear.cache_tags import invalidate_tags
+from Shop.models import ProductVariant
+from Shop.signals import products_changed
+from .cart_store import CartBusy, get_cart, remove_items
+from .checkout import CheckoutError, OutOfStock, line_snapshots, order_summary, take_stock
+from .ledger import SALE, movements, record
+from .models import Cart, CheckoutIntent, CheckoutKey, Order, OrderItem, StockHold
+from .reservations import claim_all, give_back_all
+
+logger = logging.getLogger(__name__)
+
+INTENT_BATCH_SIZE = 200
+
+PENDING, PLACED, FAILED = 'Pending', 'Placed', 'Failed'
+
+
+def enqueue_checkout(user, key, variant_ids, shipping):
+    """
+    Queue a checkout of the selected lines of the user's cart.
+
+    Raises:
+        CheckoutError: If none of the selected variants is in the cart.
+    """
+    cart = get_cart(f'user:{user.pk}')
+    lines = [[variant_id, cart[variant_id]['quantity']] for variant_id in variant_ids if variant_id in cart]
+    if not lines:
+        raise CheckoutError("No valid items selected")
+    return CheckoutIntent.objects.create(user=user, key=key, lines=lines, shipping=shipping)
+
+
+def intent_status(user, key):
+    """
+    Return the state of a queued checkout for the polling endpoint, or
+    ``None`` if there is no such checkout.
+    """
+    return CheckoutIntent.objects.filter(user=user, key=key).values('status', 'order_id', 'error').first()
+
+
+def process_intents(batch_size=INTENT_BATCH_SIZE):
+    """
+    Place pending checkout intents, one batch per transaction, until the queue
+    is empty.
+
+    Returns:
+        tuple: Number of intents placed and number rejected.
+    """
+    placed = failed = 0
+    while True:
+        claimed = {}
+        try:
+            with transaction.atomic():
+                result = _process_batch(batch_size, claimed)
+        except OperationalError:
+            # Lost connection, deadlock, lock timeout: try again later.
+            give_back_all(claimed)
+            raise
+        except Exception:
+            give_back_all(claimed)
+            logger.exception('Checkout batch failed; placing its intents one at a time')
+            result = _process_singly(batch_size)
+        if result is None:
+            return placed, failed
+        accepted, rejected, surplus = result
+
+        give_back_all(surplus)
+        for user_id, variant_ids in _bought_by_user(accepted).items():
+            try:
+                remove_items(f'user:{user_id}', variant_ids)
+            except CartBusy:
+                # The orders stand; the bought lines stay in the cart.
+                pass
+        placed += len(accepted)
+        failed += len(rejected)
+        if len(accepted) + len(rejected) < batch_size:
+            return placed, failed
+
+
+def _pending_intents(batch_size):
+    return list(
+        CheckoutIntent.objects.select_for_update(skip_locked=True)
+        .filter(status=PENDING).order_by('id')[:batch_size]
+    )
+
+
+def _process_batch(batch_size, claimed):
+    intents = _pending_intents(batch_size)
+    if not intents:
+        return None
+    return _place_intents(intents, claimed)
+
+
+def _process_singly(batch_size):
+    """
+    Place the next batch one intent at a time, each in a savepoint, marking
+    the intents that fail Failed. Returns what ``_process_batch`` does.
+    """
+    claimed = {}
+    accepted, rejected, surplus = [], [], Counter()
+    try:
+        with transaction.atomic():
+            intents = _pending_intents(batch_size)
+            if not intents:
+                return None
+            for intent in intents:
+                claimed_here = {}
+                try:
+                    with transaction.atomic():
+                        placed, refused, left = _place_intents([intent], claimed_here)
+                except OperationalError:
+                    give_back_all(claimed_here)
+                    raise
+                except Exception:
+                    give_back_all(claimed_here)
+                    logger.exception('Could not place checkout intent %s', intent.pk)
+                    intent.status = FAILED
+                    intent.error = "Your order could not be placed"
+                    intent.processed_at = timezone.now()
+                    intent.save(update_fields=['status', 'error', 'processed_at'])
+                    rejected.append(intent)
+                    continue
+                for variant_id, units in claimed_here.items():
+                    claimed[variant_id] = claimed.get(variant_id, 0) + units
+                accepted += placed
+                rejected += refused
+                surplus += left
+    except Exception:
+        give_back_all(claimed)
+        raise
+    return accepted, rejected, surplus
+
+
+def _place_intents(intents, claimed):
+    wanted = {}
+    for intent in intents:
+        wanted[intent.id] = Counter()
+        for variant_id, quantity in intent.lines:
+            wanted[intent.id][variant_id] += quantity
+    variant_ids = {variant_id for quantities in wanted.values() for variant_id in quantities}
+    users = {intent.user_id for intent in intents}
+
+    holds = list(
+        StockHold.objects.select_for_update()
+        .filter(user_id__in=users, variant_id__in=variant_ids, expires_at__gt=timezone.now())
+        .order_by('pk').values_list('id', 'user_id', 'variant_id', 'quantity')
+    )
+    held = {(user_id, variant_id): (hold_id, quantity) for hold_id, user_id, variant_id, quantity in holds}
+    variants = {
+        variant['id']: variant
+        for variant in ProductVariant.objects.select_for_update()
+        .filter(id__in=variant_ids).order_by('id').values('id', 'product_id', 'stock', 'price')
+    }
+
+    # Allocate the locked stock to the intents in arrival order.
+    remaining = {variant_id: variant['stock'] for variant_id, variant in variants.items()}
+    taken = Counter()
+    accepted, rejected = [], []
+    for intent in intents:
+        quantities = wanted[intent.id]
+        short = [
+            variant_id for variant_id, quantity in quantities.items()
+            if remaining.get(variant_id, 0) < quantity
+        ]
+        deficit = {
+            variant_id: quantity - held.get((intent.user_id, variant_id), (None, 0))[1]
+            for variant_id, quantity in quantities.items()
+        }
+        missing = {variant_id: units for variant_id, units in deficit.items() if units > 0}
+        if short or claim_all(missing):
+            intent.error = str(OutOfStock(short))
+            rejected.append(intent)
+            continue
+        for variant_id, units in missing.items():
+            claimed[variant_id] = claimed.get(variant_id, 0) + units
+        for variant_id, quantity in quantities.items():
+            remaining[variant_id] -= quantity
+            taken[variant_id] += quantity
+            hold = held.get((intent.user_id, variant_id))
+            if hold:
+                # A later intent of the same buyer can only use what is left.
+                held[intent.user_id, variant_id] = (hold[0], max(hold[1] - quantity, 0))
+        accepted.append(intent)
+
+    now = timezone.now()
+    surplus = Counter()
+    if accepted:
+        take_stock(taken)
+        _create_orders(accepted, variants)
+
+        bought = _bought_by_user(accepted)
+        Cart.objects.filter(reduce(or_, [
+            Q(user_id=user_id, variant_id__in=variant_ids) for user_id, variant_ids in bought.items()
+        ])).delete()
+        converted = {
+            (user_id, variant_id): hold for (user_id, variant_id), hold in held.items()
+            if variant_id in bought.get(user_id, ())
+        }
+        StockHold.objects.filter(id__in=[hold_id for hold_id, _ in converted.values()]).delete()
+        # Held units that were not bought go back on sale.
+        for (_, variant_id), (_, units) in converted.items():
+            surplus[variant_id] += units
+        products_changed(variants[variant_id]['product_id'] for variant_id in taken)
+        _settle_keys(accepted)
+
+    for intent in accepted:
+        intent.status = PLACED
+        intent.processed_at = now
+    for intent in rejected:
+        intent.status = FAILED
+        intent.processed_at = now
+    CheckoutIntent.objects.bulk_update(intents, ['status', 'order', 'error', 'processed_at'])
+    return accepted, rejected, surplus
+
+
+def _create_orders(intents, variants):
+    """
+    Insert the orders of accepted intents, their items and their sale
+    movements (Order.ledger), one bulk INSERT each. Bulk inserts send no
+    signals, so the buyers' cached recent orders are invalidated here.
+    """
+    snapshots = line_snapshots({variant_id for intent in intents for variant_id, _ in intent.lines})
+    orders, items = [], []
+    for intent in intents:
+        lines = [
+            OrderItem(
+                variant_id=variant_id, quantity=quantity, price=variants[variant_id]['price'],
+                **snapshots[variant_id],
+            )
+            for variant_id, quantity in intent.lines
+        ]
+        total = sum((item.price * item.quantity for item in lines), Decimal('0'))
+        orders.append(Order(user_id=intent.user_id, total_amount=total, summary=order_summary(lines), **intent.shipping))
+        items.append(lines)
+
+    Order.objects.bulk_create(orders)
+    for intent, order, lines in zip(intents, orders, items):
+        intent.order = order
+        for item in lines:
+            item.order = order
+    OrderItem.objects.bulk_create([item for lines in items for item in lines])
+
+    sales = []
+    for intent in intents:
+        sold = Counter()
+        for variant_id, quantity in intent.lines:
+            sold[variant_id] -= quantity
+        sales.extend(movements(SALE, sold, intent.order))
+    record(sales)
+    invalidate_tags(f'User:{intent.user_id}:orders' for intent in intents)
+
+
+def _settle_keys(intents):
+    """
+    Point the checkout keys of placed intents at their orders (see
+    Order.idempotency). Keys of rejected intents keep no order, so a repeated
+    submission is sent to the failed intent's status page.
+    """
+    orders = {(intent.user_id, intent.key): intent.order for intent in intents}
+    keys = list(CheckoutKey.objects.filter(reduce(or_, [
+        Q(user_id=user_id, key=key) for user_id, key in orders
+    ])))
+    for checkout_key in keys:
+        checkout_key.order = orders[checkout_key.user_id, checkout_key.key]
+    CheckoutKey.objects.bulk_update(keys, ['order'])
+
+
+def _bought_by_user(intents):
+    bought = defaultdict(set)
+    for intent in intents:
+        bought[intent.user_id].update(variant_id for variant_id, _ in intent.lines)
+    return bought
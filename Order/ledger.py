@@ -0,0 +1,187 @@
+"""
+Module: ledger.py
+
+Append-only inventory ledger.
+
+Every change to a variant's stock is recorded as a StockMovement: sales by
+checkout and the queued checkout worker, stock put back by cancellations and
+returns, and restocks and adjustments made by hand (see Order.signals).
+Movements are only ever inserted, with one bulk INSERT per order or checkout
+batch, so recording them never contends with other writers.
+
+``ProductVariant.stock`` is the current-stock projection of the ledger. It is
+updated incrementally in the same transaction as the movements that explain
+it, and stays the single row checkout conditionally decrements so overselling
+remains impossible. ``ledger_drift`` replays the ledger to check it.
+
+Old movements are folded into one StockSnapshot per variant by
+``compact_ledger`` (``manage.py compact_stock_ledger``), which keeps the
+ledger, and the replay, bounded: a variant's stock is always its snapshot plus
+the movements recorded since.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Sum, When
+from django.utils import timezone
+
+from Shop.models import ProductVariant
+from Shop.signals import products_changed
+from .models import OrderItem, StockMovement, StockSnapshot
+from .reservations import give_back_all
+
+SALE, RETURN, CANCELLATION, RESTOCK, ADJUSTMENT = 'sale', 'return', 'cancellation', 'restock', 'adjustment'
+
+MOVEMENT_BATCH_SIZE = 500
+COMPACT_BATCH_SIZE = 5000
+RETENTION = timedelta(days=getattr(settings, 'STOCK_LEDGER_RETENTION_DAYS', 90))
+
+
+def movements(kind, quantities, order=None):
+    """
+    Build the movements of one stock change.
+
+    Args:
+        kind (str): One of the ``StockMovement.Kind`` values.
+        quantities (dict): Variant id -> signed change in units; zero
+            changes are skipped.
+        order (Order): The order that caused the change, if any.
+
+    Returns:
+        list: Unsaved StockMovement instances, for ``record``.
+    """
+    return [
+        StockMovement(variant_id=variant_id, kind=kind, quantity=quantity, order=order)
+        for variant_id, quantity in quantities.items()
+        if quantity
+    ]
+
+
+def record(entries):
+    """Append movements to the ledger in batched INSERTs."""
+    StockMovement.objects.bulk_create(entries, batch_size=MOVEMENT_BATCH_SIZE)
+
+
+def put_back(order, kind):
+    """
+    Return the stock of a cancelled or returned order and record the
+    compensating movements.
+
+    Must run in the transaction that changes the order's status, with the
+    order row locked, so an order is never put back twice. Items whose
+    variant was deleted since are skipped.
+
+    Args:
+        order (Order): The order whose items go back into stock.
+        kind (str): ``CANCELLATION`` or ``RETURN``.
+    """
+    quantities = dict(
+        OrderItem.objects.filter(order=order, variant__isnull=False)
+        .values('variant_id').annotate(total=Sum('quantity')).values_list('variant_id', 'total')
+    )
+    if not quantities:
+        return
+
+    ProductVariant.objects.filter(id__in=quantities).update(stock=Case(
+        *[When(id=variant_id, then=F('stock') + quantity) for variant_id, quantity in quantities.items()],
+        default=F('stock'),
+        output_field=PositiveIntegerField(),
+    ))
+    record(movements(kind, quantities, order))
+    products_changed(
+        ProductVariant.objects.filter(id__in=quantities).values_list('product_id', flat=True)
+    )
+    # The units are available to sell again once the transaction commits.
+    transaction.on_commit(lambda: give_back_all(quantities))
+
+
+def projected_stock(variant_ids):
+    """
+    Replay the ledger: each variant's snapshot plus the movements recorded
+    since it was taken.
+
+    Returns:
+        dict: Variant id -> stock according to the ledger.
+    """
+    projected = dict.fromkeys(variant_ids, 0)
+    projected.update(
+        StockSnapshot.objects.filter(variant_id__in=variant_ids).values_list('variant_id', 'quantity')
+    )
+    for variant_id, total in (
+        StockMovement.objects.filter(variant_id__in=variant_ids)
+        .values('variant_id').annotate(total=Sum('quantity')).values_list('variant_id', 'total')
+    ):
+        projected[variant_id] += total
+    return projected
+
+
+def ledger_drift(variant_ids=None):
+    """
+    Compare the stock of variants with the ledger.
+
+    Args:
+        variant_ids (iterable): Variants to check; ``None`` for all.
+
+    Returns:
+        dict: Variant id -> ``(stock, projected)`` for the variants that
+        disagree.
+    """
+    variants = ProductVariant.objects.all()
+    if variant_ids is not None:
+        variants = variants.filter(id__in=variant_ids)
+    stock = dict(variants.values_list('id', 'stock'))
+    projected = projected_stock(list(stock))
+    return {
+        variant_id: (units, projected[variant_id])
+        for variant_id, units in stock.items()
+        if units != projected[variant_id]
+    }
+
+
+def compact_ledger(before=None, batch_size=COMPACT_BATCH_SIZE):
+    """
+    Fold movements older than ``before`` into the variants' snapshots, one
+    batch of movements per transaction, and delete them.
+
+    Args:
+        before (datetime): Movements recorded before this are folded;
+            defaults to ``STOCK_LEDGER_RETENTION_DAYS`` ago.
+
+    Returns:
+        int: Number of movements folded.
+    """
+    if before is None:
+        before = timezone.now() - RETENTION
+    folded = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                StockMovement.objects.filter(created_at__lt=before)
+                .order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return folded
+            through = ids[-1]
+            totals = dict(
+                StockMovement.objects.filter(id__lte=through)
+                .values('variant_id').annotate(total=Sum('quantity')).values_list('variant_id', 'total')
+            )
+
+            now = timezone.now()
+            snapshots = StockSnapshot.objects.select_for_update().in_bulk(list(totals))
+            for variant_id, snapshot in snapshots.items():
+                snapshot.quantity += totals[variant_id]
+                snapshot.through_id = through
+                snapshot.taken_at = now
+            StockSnapshot.objects.bulk_update(snapshots.values(), ['quantity', 'through_id', 'taken_at'])
+            StockSnapshot.objects.bulk_create([
+                StockSnapshot(variant_id=variant_id, quantity=total, through_id=through)
+                for variant_id, total in totals.items()
+                if variant_id not in snapshots
+            ])
+            deleted, _ = StockMovement.objects.filter(id__lte=through).delete()
+
+        folded += deleted
+        if len(ids) < batch_size:
+            return folded
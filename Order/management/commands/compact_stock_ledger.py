@@ -0,0 +1,39 @@
+"""
+Module: compact_stock_ledger.py
+
+Management command folding old inventory ledger movements into per-variant
+snapshots. Run it from cron, e.g. nightly, or keep it running with ``--every``.
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from Order.ledger import COMPACT_BATCH_SIZE, RETENTION, compact_ledger, ledger_drift
+
+
+class Command(BaseCommand):
+    help = 'Fold stock movements older than STOCK_LEDGER_RETENTION_DAYS into snapshots.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=RETENTION.days,
+                            help='Keep movements of the last DAYS days.')
+        parser.add_argument('--batch-size', type=int, default=COMPACT_BATCH_SIZE,
+                            help='Movements folded per transaction.')
+        parser.add_argument('--every', type=int, default=0, metavar='SECONDS',
+                            help='Keep running and compact every SECONDS seconds.')
+        parser.add_argument('--check', action='store_true',
+                            help='Also report variants whose stock disagrees with the ledger.')
+
+    def handle(self, *args, **options):
+        while True:
+            folded = compact_ledger(timezone.now() - timedelta(days=options['days']), options['batch_size'])
+            if folded or not options['every']:
+                self.stdout.write(f'Folded {folded} stock movement(s) into snapshots.')
+            if options['check']:
+                for variant_id, (stock, projected) in ledger_drift().items():
+                    self.stdout.write(f'Variant {variant_id}: stock {stock}, ledger {projected}.')
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,30 @@
+"""
+Module: flush_carts.py
+
+Management command writing carts changed in the cache back to the Cart table.
+Run it from cron every minute, or keep it running with ``--every``.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from Order.cart_store import FLUSH_BATCH_SIZE, flush_carts
+
+
+class Command(BaseCommand):
+    help = 'Persist carts changed since the last flush to the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=FLUSH_BATCH_SIZE,
+                            help='Logged cart changes read per batch.')
+        parser.add_argument('--every', type=int, default=0, metavar='SECONDS',
+                            help='Keep running and flush every SECONDS seconds.')
+
+    def handle(self, *args, **options):
+        while True:
+            flushed = flush_carts(options['batch_size'])
+            if flushed or not options['every']:
+                self.stdout.write(f'Flushed {flushed} cart(s).')
+            if not options['every']:
+                return
+            time.sleep(options['every'])
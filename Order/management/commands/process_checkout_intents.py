@@ -0,0 +1,31 @@
+"""
+Module: process_checkout_intents.py
+
+Management command placing queued checkouts (``QUEUED_CHECKOUT``). Keep it
+running with ``--every``; several instances can run side by side, each batch
+is claimed with SKIP LOCKED.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from Order.intents import INTENT_BATCH_SIZE, process_intents
+
+
+class Command(BaseCommand):
+    help = 'Place queued checkouts in batches grouped by variant.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=INTENT_BATCH_SIZE,
+                            help='Checkouts placed per transaction.')
+        parser.add_argument('--every', type=float, default=0, metavar='SECONDS',
+                            help='Keep running and drain the queue every SECONDS seconds.')
+
+    def handle(self, *args, **options):
+        while True:
+            placed, failed = process_intents(options['batch_size'])
+            if placed or failed or not options['every']:
+                self.stdout.write(f'Placed {placed} order(s); {failed} checkout(s) could not be placed.')
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,30 @@
+"""
+Module: purge_checkout_keys.py
+
+Management command deleting expired checkout idempotency keys. Run it from
+cron, e.g. hourly, or keep it running with ``--every``.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from Order.idempotency import PURGE_BATCH_SIZE, purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete checkout idempotency keys older than CHECKOUT_KEY_TTL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE,
+                            help='Keys deleted per statement.')
+        parser.add_argument('--every', type=int, default=0, metavar='SECONDS',
+                            help='Keep running and purge every SECONDS seconds.')
+
+    def handle(self, *args, **options):
+        while True:
+            purged = purge_expired_keys(options['batch_size'])
+            if purged or not options['every']:
+                self.stdout.write(f'Purged {purged} expired checkout key(s).')
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,34 @@
+"""
+Module: sweep_stock_holds.py
+
+Management command releasing expired stock holds. Run it from cron every
+minute, or keep it running with ``--every``.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from Order.reservations import SWEEP_BATCH_SIZE, reconcile_available, release_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'Release expired stock holds in batches and return their units to sale.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE,
+                            help='Holds deleted per transaction.')
+        parser.add_argument('--every', type=int, default=0, metavar='SECONDS',
+                            help='Keep running and sweep every SECONDS seconds.')
+        parser.add_argument('--reconcile', action='store_true',
+                            help='Also rebuild the cached counters of held variants from the database.')
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired_holds(options['batch_size'])
+            if options['reconcile']:
+                reconcile_available()
+            if released or not options['every']:
+                self.stdout.write(f'Released {released} expired hold(s).')
+            if not options['every']:
+                return
+            time.sleep(options['every'])
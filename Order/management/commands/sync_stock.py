@@ -0,0 +1,63 @@
+"""
+Module: sync_stock.py
+
+Management command applying a warehouse stock and price file to the product
+variants (see Order.stock_sync), e.g. from the nightly import job.
+"""
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Order.stock_sync import READERS, SYNC_BATCH_SIZE, SyncAborted, sync_stock
+
+
+class Command(BaseCommand):
+    help = 'Stream stock and price updates keyed by product, color code and size code from a CSV or JSONL file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to read, or '-' for standard input.")
+        parser.add_argument('--format', choices=sorted(READERS),
+                            help='Input format; guessed from the file extension by default.')
+        parser.add_argument('--batch-size', type=int, default=SYNC_BATCH_SIZE,
+                            help='Variants written per transaction.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would change.')
+        parser.add_argument('--diff', metavar='PATH',
+                            help='Write every change as CSV to PATH.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        try:
+            source = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as error:
+            raise CommandError(error)
+
+        diff = on_change = None
+        if options['diff']:
+            diff = open(options['diff'], 'w', newline='', encoding='utf-8')
+            writer = csv.writer(diff)
+            writer.writerow(['variant', 'stock_before', 'stock_after', 'price_before', 'price_after'])
+
+            def on_change(variant_id, before, after):
+                writer.writerow([variant_id, before[0], after[0], before[1], after[1]])
+
+        try:
+            report = sync_stock(
+                READERS[fmt](source), options['batch_size'], dry_run=options['dry_run'], on_change=on_change,
+            )
+        except SyncAborted as aborted:
+            self.stdout.write(json.dumps(aborted.report.as_dict()))
+            raise CommandError(f"Line {aborted.report.stopped[0]}: {aborted}")
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if diff is not None:
+                diff.close()
+
+        result = report.as_dict()
+        for error in result.pop('errors'):
+            self.stderr.write(f"Line {error['line']}: {error['message']}")
+        self.stdout.write(json.dumps(result))
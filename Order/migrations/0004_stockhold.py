@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-16 22:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Order', '0003_alter_cart_created_at_alter_cart_quantity_and_more'),
+        ('Shop', '0008_alter_productimage_image'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(help_text='Number of units reserved.')),
+                ('expires_at', models.DateTimeField(db_index=True, help_text='When the hold lapses unless renewed.')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Timestamp when the hold was first placed.')),
+                ('user', models.ForeignKey(help_text='The user holding the stock.', on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('variant', models.ForeignKey(help_text='The reserved product variant.', on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='Shop.productvariant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'variant'), name='unique_stock_hold_per_user_variant')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.7 on 2026-10-16 22:52
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    """
+    Fold duplicate (user, variant) cart rows into the oldest one, adding up
+    their quantities, so the unique constraint can be created.
+    """
+    Cart = apps.get_model('Order', 'Cart')
+    duplicates = Cart.objects.values('user', 'variant') \
+        .annotate(rows=Count('id'), keep=Min('id'), total=Sum('quantity')) \
+        .filter(rows__gt=1)
+    for group in duplicates:
+        Cart.objects.filter(pk=group['keep']).update(quantity=group['total'])
+        Cart.objects.filter(user=group['user'], variant=group['variant']).exclude(pk=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Order', '0004_stockhold'),
+        ('Shop', '0008_alter_productimage_image'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user', 'variant'), name='unique_cart_item_per_user_variant'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_snapshots(apps, schema_editor):
+    """
+    Copy the current catalog data into existing order items and build the
+    order summaries.
+    """
+    Order = apps.get_model('Order', 'Order')
+    OrderItem = apps.get_model('Order', 'OrderItem')
+    Size = apps.get_model('Shop', 'Size')
+    size_labels = dict(Size._meta.get_field('code').choices)
+
+    items = list(
+        OrderItem.objects.filter(variant__isnull=False)
+        .select_related('variant__product__card', 'variant__color', 'variant__size')
+        .order_by('id')
+    )
+    for item in items:
+        variant = item.variant
+        card = getattr(variant.product, 'card', None)
+        picture = (card.picture if card else None) or {}
+        thumb = (picture.get('renditions') or {}).get('thumb') or {}
+        item.product_name = variant.product.name
+        item.color_name = variant.color.name
+        item.color_code = variant.color.code
+        item.size_label = f"Size {size_labels.get(variant.size.code, variant.size.code)}"
+        item.thumbnail = thumb.get('jpeg') or picture.get('src', '')
+    OrderItem.objects.bulk_update(
+        items, ['product_name', 'color_name', 'color_code', 'size_label', 'thumbnail'], batch_size=500
+    )
+
+    summaries = {}
+    for item in items:
+        summaries.setdefault(item.order_id, []).append({
+            'name': item.product_name,
+            'color': item.color_name,
+            'size': item.size_label,
+            'quantity': item.quantity,
+            'thumbnail': item.thumbnail,
+        })
+    orders = list(Order.objects.filter(id__in=summaries))
+    for order in orders:
+        order.summary = summaries[order.id]
+    Order.objects.bulk_update(orders, ['summary'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Order', '0006_order_user_recent_idx'),
+        ('Shop', '0008_alter_productimage_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='summary',
+            field=models.JSONField(blank=True, default=list, editable=False, help_text="Snapshot of the order's lines for list views: [{'name', 'color', 'size', 'quantity', 'thumbnail'}]."),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='color_code',
+            field=models.CharField(blank=True, editable=False, help_text='Color code at the time of ordering.', max_length=7),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='color_name',
+            field=models.CharField(blank=True, editable=False, help_text='Color name at the time of ordering.', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, editable=False, help_text='Product name at the time of ordering.', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='size_label',
+            field=models.CharField(blank=True, editable=False, help_text='Size label at the time of ordering.', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='thumbnail',
+            field=models.CharField(blank=True, editable=False, help_text='Storage path of the product thumbnail at the time of ordering.', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='variant',
+            field=models.ForeignKey(blank=True, help_text='The product variant ordered; cleared if the variant is deleted.', null=True, on_delete=django.db.models.deletion.SET_NULL, to='Shop.productvariant'),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Order', '0007_order_item_snapshots'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckoutKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Idempotency key sent with the checkout form.', max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, help_text='Timestamp when the key was first submitted.')),
+                ('order', models.ForeignKey(blank=True, help_text='The order placed for this key, once it is placed.', null=True, on_delete=django.db.models.deletion.CASCADE, to='Order.order')),
+                ('user', models.ForeignKey(help_text='The user who submitted the checkout.', on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'key'), name='unique_checkout_key_per_user')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Order', '0008_checkoutkey'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckoutIntent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Idempotency key of the checkout submission.', max_length=64)),
+                ('lines', models.JSONField(help_text='Selected cart lines: [[variant id, quantity], ...].')),
+                ('shipping', models.JSONField(help_text='Shipping fields of the checkout form.')),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Placed', 'Placed'), ('Failed', 'Failed')], default='Pending', help_text='Processing state of the intent.', max_length=10)),
+                ('error', models.CharField(blank=True, help_text='Why the order could not be placed.', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Timestamp when the checkout was queued.')),
+                ('processed_at', models.DateTimeField(blank=True, help_text='Timestamp when the worker placed or rejected it.', null=True)),
+                ('order', models.ForeignKey(blank=True, help_text='The order placed for this intent.', null=True, on_delete=django.db.models.deletion.SET_NULL, to='Order.order')),
+                ('user', models.ForeignKey(help_text='The buyer.', on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='checkout_intent_queue_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'key'), name='unique_checkout_intent_per_user_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def seed_snapshots(apps, schema_editor):
+    """
+    Start the ledger of every existing variant from its current stock.
+    """
+    ProductVariant = apps.get_model('Shop', 'ProductVariant')
+    StockSnapshot = apps.get_model('Order', 'StockSnapshot')
+    StockSnapshot.objects.bulk_create(
+        [
+            StockSnapshot(variant_id=variant_id, quantity=stock)
+            for variant_id, stock in ProductVariant.objects.values_list('id', 'stock').iterator()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Order', '0009_checkoutintent'),
+        ('Shop', '0008_alter_productimage_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('variant', models.OneToOneField(help_text='The variant.', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock_snapshot', serialize=False, to='Shop.productvariant')),
+                ('quantity', models.IntegerField(help_text='Stock after the folded movements.')),
+                ('through_id', models.BigIntegerField(default=0, help_text='Id of the last movement folded into the snapshot.')),
+                ('taken_at', models.DateTimeField(auto_now=True, help_text='Timestamp of the last compaction.')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('sale', 'Sale'), ('return', 'Return'), ('cancellation', 'Cancellation'), ('restock', 'Restock'), ('adjustment', 'Adjustment')], help_text='What caused the change.', max_length=12)),
+                ('quantity', models.IntegerField(help_text='Units added (positive) or removed (negative).')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, help_text='Timestamp when the change was recorded.')),
+                ('order', models.ForeignKey(blank=True, help_text='The order that caused the change, if any.', null=True, on_delete=django.db.models.deletion.SET_NULL, to='Order.order')),
+                ('variant', models.ForeignKey(help_text='The variant whose stock changed.', on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='Shop.productvariant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['variant', 'id'], name='stock_movement_variant_idx')],
+            },
+        ),
+        migrations.RunPython(seed_snapshots, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from Shop.models import (
     Product,
+    ProductImage,
     ProductVariant
 )
 from django.contrib.auth.models import User
@@ -17,6 +18,11 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, help_text="Timestamp when the cart item was created.")
     updated_at = models.DateTimeField(auto_now=True, help_text="Timestamp when the cart item was last updated.")
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'variant'], name='unique_cart_item_per_user_variant'),
+        ]
+
     @property
     def total_price(self):
         """
@@ -28,6 +34,27 @@ class Cart(models.Model):
         return f"{self.quantity}x {self.variant} ({self.user})"
 
 
+class StockHold(models.Model):
+    """
+    Temporarily reserves units of a product variant for a user's cart so that
+    checkout does not fail late during high-demand drops. Holds expire and
+    are released in batches by the sweeper in Order.reservations.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, help_text="The user holding the stock.")
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='holds', help_text="The reserved product variant.")
+    quantity = models.PositiveIntegerField(help_text="Number of units reserved.")
+    expires_at = models.DateTimeField(db_index=True, help_text="When the hold lapses unless renewed.")
+    created_at = models.DateTimeField(auto_now_add=True, help_text="Timestamp when the hold was first placed.")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'variant'], name='unique_stock_hold_per_user_variant'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity}x {self.variant} held for {self.user} until {self.expires_at}"
+
+
 class Order(models.Model):
     """
     Stores details of an order placed by a user.
@@ -59,19 +86,41 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=50, default='COD', help_text="Payment method used (e.g., COD, Card).")
     payment_status = models.CharField(max_length=20, choices=PaymentStatus, default='Pending', help_text="Status of the payment.")
     order_status = models.CharField(max_length=20, choices=OrderStatus, default='Processing', help_text="Current status of the order.")
+    summary = models.JSONField(default=list, blank=True, editable=False, help_text="Snapshot of the order's lines for list views: [{'name', 'color', 'size', 'quantity', 'thumbnail'}].")
+
+    class Meta:
+        indexes = [
+            # Order history is paginated by id per user (see Order.history).
+            models.Index(fields=['user', '-id'], name='order_user_recent_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} - {self.user.username}"
 
+    def summary_lines(self):
+        """
+        The summary lines with their thumbnail URLs, for rendering.
+        """
+        return [dict(line, thumbnail_url=_image_url(line['thumbnail'])) for line in self.summary]
+
 
 class OrderItem(models.Model):
     """
     Represents an individual item in an order.
+
+    The product, color, size and thumbnail are copied from the catalog when
+    the order is placed, so order pages render from the order tables alone
+    and keep showing what was bought after the catalog changes.
     """
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE, help_text="The order to which this item belongs.")
-    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, default=1, help_text="The product variant ordered.")
+    variant = models.ForeignKey(ProductVariant, on_delete=models.SET_NULL, null=True, blank=True, help_text="The product variant ordered; cleared if the variant is deleted.")
     quantity = models.PositiveIntegerField(help_text="Quantity of the product variant.")
     price = models.DecimalField(max_digits=8, decimal_places=2, help_text="Price of the product at the time of ordering.")
+    product_name = models.CharField(max_length=255, blank=True, editable=False, help_text="Product name at the time of ordering.")
+    color_name = models.CharField(max_length=50, blank=True, editable=False, help_text="Color name at the time of ordering.")
+    color_code = models.CharField(max_length=7, blank=True, editable=False, help_text="Color code at the time of ordering.")
+    size_label = models.CharField(max_length=20, blank=True, editable=False, help_text="Size label at the time of ordering.")
+    thumbnail = models.CharField(max_length=255, blank=True, editable=False, help_text="Storage path of the product thumbnail at the time of ordering.")
 
     @property
     def total_price(self):
@@ -80,8 +129,117 @@ class OrderItem(models.Model):
         """
         return self.quantity * self.price
 
+    @property
+    def thumbnail_url(self):
+        return _image_url(self.thumbnail)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_name}"
+
+
+class CheckoutKey(models.Model):
+    """
+    Idempotency key of a checkout submission. The cart page renders a fresh
+    key into the checkout form; a repeated POST with the same key is answered
+    with the order the first one placed instead of placing another. Keys are
+    purged after ``CHECKOUT_KEY_TTL`` (see Order.idempotency).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, help_text="The user who submitted the checkout.")
+    key = models.CharField(max_length=64, help_text="Idempotency key sent with the checkout form.")
+    order = models.ForeignKey('Order', on_delete=models.CASCADE, null=True, blank=True, help_text="The order placed for this key, once it is placed.")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, help_text="Timestamp when the key was first submitted.")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_checkout_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f"Checkout {self.key} by {self.user}"
+
+
+class CheckoutIntent(models.Model):
+    """
+    A checkout waiting to be placed by the queued checkout worker
+    (Order.intents), used when ``QUEUED_CHECKOUT`` is enabled.
+    """
+    Status = (
+        ('Pending', 'Pending'),
+        ('Placed', 'Placed'),
+        ('Failed', 'Failed'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, help_text="The buyer.")
+    key = models.CharField(max_length=64, help_text="Idempotency key of the checkout submission.")
+    lines = models.JSONField(help_text="Selected cart lines: [[variant id, quantity], ...].")
+    shipping = models.JSONField(help_text="Shipping fields of the checkout form.")
+    status = models.CharField(max_length=10, choices=Status, default='Pending', help_text="Processing state of the intent.")
+    order = models.ForeignKey('Order', on_delete=models.SET_NULL, null=True, blank=True, help_text="The order placed for this intent.")
+    error = models.CharField(max_length=255, blank=True, help_text="Why the order could not be placed.")
+    created_at = models.DateTimeField(auto_now_add=True, help_text="Timestamp when the checkout was queued.")
+    processed_at = models.DateTimeField(null=True, blank=True, help_text="Timestamp when the worker placed or rejected it.")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_checkout_intent_per_user_key'),
+        ]
+        indexes = [
+            # The worker drains pending intents in id order.
+            models.Index(fields=['status', 'id'], name='checkout_intent_queue_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.quantity} x {self.variant.product.name}"
+        return f"Checkout {self.key} by {self.user} ({self.status})"
+
+
+class StockMovement(models.Model):
+    """
+    One entry of the append-only inventory ledger (Order.ledger): a signed
+    change to a variant's stock and why it happened.
+    """
+    Kind = (
+        ('sale', 'Sale'),
+        ('return', 'Return'),
+        ('cancellation', 'Cancellation'),
+        ('restock', 'Restock'),
+        ('adjustment', 'Adjustment'),
+    )
+
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='stock_movements', help_text="The variant whose stock changed.")
+    kind = models.CharField(max_length=12, choices=Kind, help_text="What caused the change.")
+    quantity = models.IntegerField(help_text="Units added (positive) or removed (negative).")
+    order = models.ForeignKey('Order', on_delete=models.SET_NULL, null=True, blank=True, help_text="The order that caused the change, if any.")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, help_text="Timestamp when the change was recorded.")
+
+    class Meta:
+        indexes = [
+            # Projection and compaction read a variant's movements in id order.
+            models.Index(fields=['variant', 'id'], name='stock_movement_variant_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+d} of {self.variant_id}"
+
+
+class StockSnapshot(models.Model):
+    """
+    A variant's stock as of the last compacted ledger movement; the movements
+    it folds in are deleted (Order.ledger).
+    """
+    variant = models.OneToOneField(ProductVariant, on_delete=models.CASCADE, primary_key=True, related_name='stock_snapshot', help_text="The variant.")
+    quantity = models.IntegerField(help_text="Stock after the folded movements.")
+    through_id = models.BigIntegerField(default=0, help_text="Id of the last movement folded into the snapshot.")
+    taken_at = models.DateTimeField(auto_now=True, help_text="Timestamp of the last compaction.")
+
+    def __str__(self):
+        return f"{self.variant_id}: {self.quantity} through #{self.through_id}"
+
+
+def _image_url(path):
+    """Resolve a snapshotted product image path to a URL."""
+    if not path:
+        return ''
+    return ProductImage._meta.get_field('image').storage.url(path)
 
 
 class Return(models.Model):
@@ -0,0 +1,263 @@
+"""
+Module: reservations.py
+
+Soft inventory holds for carts.
+
+Adding a variant to the cart reserves the units as a StockHold that expires
+after ``HOLD_TTL`` unless renewed. Whether a hold can be granted is decided by
+an available-to-sell counter per variant kept in the cache
+(``stock - active holds``): granting a hold is one atomic cache decrement plus
+a write to the user's own hold row, so a drop with hundreds of buyers on the
+same variant never queues on the variant row itself.
+
+The counter is seeded from the database on first use, dropped whenever the
+variant's stock is changed outside checkout, and can be rebuilt from the
+database at any time with ``reconcile_available``. Expired holds are released
+in batches by ``release_expired_holds`` (``manage.py sweep_stock_holds``), and
+checkout turns the buyer's holds into the sale (see Order.checkout).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from Shop.models import ProductVariant
+from .models import StockHold
+
+HOLD_TTL = timedelta(seconds=getattr(settings, 'STOCK_HOLD_TTL', 15 * 60))
+COUNTER_TIMEOUT = 60 * 60 * 24
+SWEEP_BATCH_SIZE = 500
+
+
+def available_key(variant_id):
+    return f'order:available:{variant_id}'
+
+
+# ----------------------------------------------------------------------
+# Available-to-sell counters
+# ----------------------------------------------------------------------
+
+def compute_available(variant_ids):
+    """
+    Compute ``stock - active holds`` for several variants in one query.
+
+    Returns:
+        dict: Variant id -> units available to sell (never negative).
+    """
+    active_holds = StockHold.objects.filter(variant=OuterRef('pk'), expires_at__gt=timezone.now()) \
+        .values('variant').annotate(total=Sum('quantity')).values('total')
+    rows = ProductVariant.objects.filter(id__in=variant_ids) \
+        .annotate(held=Coalesce(Subquery(active_holds), 0)) \
+        .values_list('id', 'stock', 'held')
+    return {variant_id: max(stock - held, 0) for variant_id, stock, held in rows}
+
+
+def get_available(variant_id):
+    """
+    Return the units of a variant that can still be reserved, seeding the
+    counter from the database if it is not cached.
+    """
+    available = cache.get(available_key(variant_id))
+    if available is None:
+        available = compute_available([variant_id]).get(variant_id, 0)
+        # add() so a counter seeded concurrently (and maybe already
+        # decremented) is not overwritten.
+        if not cache.add(available_key(variant_id), available, COUNTER_TIMEOUT):
+            available = cache.get(available_key(variant_id), available)
+    return available
+
+
+def claim(variant_id, quantity):
+    """
+    Atomically take ``quantity`` units from a variant's counter.
+
+    Returns:
+        bool: Whether the units were available; nothing is taken otherwise.
+    """
+    get_available(variant_id)
+    try:
+        remaining = cache.decr(available_key(variant_id), quantity)
+    except ValueError:
+        # The counter was evicted between seeding and decrementing.
+        return False
+    if remaining < 0:
+        give_back(variant_id, quantity)
+        return False
+    return True
+
+
+def claim_all(quantities):
+    """
+    Claim several variants at once, all or nothing.
+
+    Returns:
+        list: Ids of the variants that could not be claimed (empty on success).
+    """
+    claimed = {}
+    for variant_id, quantity in quantities.items():
+        if quantity <= 0:
+            continue
+        if not claim(variant_id, quantity):
+            give_back_all(claimed)
+            return [variant_id]
+        claimed[variant_id] = quantity
+    return []
+
+
+def give_back(variant_id, quantity):
+    """
+    Return units to a variant's counter. A missing counter is left missing;
+    it is re-seeded from the database, which already reflects the change.
+    """
+    if quantity <= 0:
+        return
+    try:
+        cache.incr(available_key(variant_id), quantity)
+    except ValueError:
+        pass
+
+
+def give_back_all(quantities):
+    for variant_id, quantity in quantities.items():
+        give_back(variant_id, quantity)
+
+
+def forget_available(variant_ids):
+    """
+    Drop cached counters so they are re-seeded from the database, e.g. after
+    stock was changed by hand or by a bulk import.
+    """
+    cache.delete_many([available_key(variant_id) for variant_id in variant_ids])
+
+
+def reconcile_available(variant_ids=None):
+    """
+    Overwrite cached counters with the values computed from the database.
+    Corrects any drift left by crashed requests or evicted cache entries.
+
+    Args:
+        variant_ids (iterable): Variants to reconcile; ``None`` for all that
+            currently have an active hold.
+    """
+    if variant_ids is None:
+        variant_ids = StockHold.objects.filter(expires_at__gt=timezone.now()) \
+            .values_list('variant_id', flat=True).distinct()
+    available = compute_available(list(variant_ids))
+    cache.set_many({available_key(variant_id): value for variant_id, value in available.items()}, COUNTER_TIMEOUT)
+    return available
+
+
+# ----------------------------------------------------------------------
+# Holds
+# ----------------------------------------------------------------------
+
+def reserve(user, variant_id, quantity):
+    """
+    Reserve ``quantity`` more units of a variant for a user, or renew the
+    user's existing hold by that amount.
+
+    Returns:
+        tuple: ``(reserved, available)``; ``available`` is the number of units
+        that could still be reserved when the request was refused.
+    """
+    if not claim(variant_id, quantity):
+        return False, get_available(variant_id)
+    try:
+        _add_to_hold(user, variant_id, quantity)
+    except Exception:
+        give_back(variant_id, quantity)
+        raise
+    return True, None
+
+
+def _add_to_hold(user, variant_id, quantity):
+    now = timezone.now()
+    expires_at = now + HOLD_TTL
+    holds = StockHold.objects.filter(user=user, variant_id=variant_id)
+    if holds.filter(expires_at__gt=now).update(quantity=F('quantity') + quantity, expires_at=expires_at):
+        return
+
+    # An expired hold that was not swept yet still counts against the
+    # counter; release it here before starting a new one.
+    for hold_id, held in holds.values_list('id', 'quantity'):
+        if StockHold.objects.filter(id=hold_id, expires_at__lte=now).delete()[0]:
+            give_back(variant_id, held)
+    try:
+        with transaction.atomic():
+            StockHold.objects.create(user=user, variant_id=variant_id, quantity=quantity, expires_at=expires_at)
+    except IntegrityError:
+        # A concurrent request created the hold first.
+        holds.update(quantity=F('quantity') + quantity, expires_at=expires_at)
+
+
+def release(user, variant_id, quantity=None):
+    """
+    Give back ``quantity`` units of a user's hold on a variant, or the whole
+    hold if ``quantity`` is ``None`` or covers it.
+    """
+    now = timezone.now()
+    hold = StockHold.objects.filter(user=user, variant_id=variant_id, expires_at__gt=now).first()
+    if hold is None:
+        return
+    if quantity is None or quantity >= hold.quantity:
+        if StockHold.objects.filter(id=hold.id, quantity=hold.quantity).delete()[0]:
+            give_back(variant_id, hold.quantity)
+    elif StockHold.objects.filter(id=hold.id, quantity__gt=quantity).update(quantity=F('quantity') - quantity):
+        give_back(variant_id, quantity)
+
+
+def set_reserved(user, variant_id, quantity):
+    """
+    Make a user's hold on a variant cover exactly ``quantity`` units, e.g.
+    when the cart quantity is edited.
+
+    Returns:
+        tuple: Same as ``reserve``.
+    """
+    held = StockHold.objects.filter(user=user, variant_id=variant_id, expires_at__gt=timezone.now()) \
+        .values_list('quantity', flat=True).first() or 0
+    if quantity > held:
+        return reserve(user, variant_id, quantity - held)
+    release(user, variant_id, held - quantity)
+    return True, None
+
+
+def release_expired_holds(batch_size=SWEEP_BATCH_SIZE):
+    """
+    Delete expired holds in batches and return their units to the counters.
+
+    Each batch is claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` where the
+    database supports it, so several sweepers, and checkouts converting the
+    same holds, never release a hold twice.
+
+    Returns:
+        int: Number of holds released.
+    """
+    released = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                StockHold.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=timezone.now())
+                .order_by('expires_at')
+                .values_list('id', 'variant_id', 'quantity')[:batch_size]
+            )
+            if not batch:
+                return released
+            deleted, _ = StockHold.objects.filter(id__in=[hold_id for hold_id, _, _ in batch]).delete()
+
+        totals = {}
+        for _, variant_id, quantity in batch:
+            totals[variant_id] = totals.get(variant_id, 0) + quantity
+        if deleted == len(batch):
+            give_back_all(totals)
+        else:
+            # Someone else removed part of the batch; recount from the database.
+            reconcile_available(totals)
+        released += deleted
+        if len(batch) < batch_size:
+            return released
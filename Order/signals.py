@@ -0,0 +1,68 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from Shop.models import ProductVariant
+from .cart_store import merge_anonymous_cart
+from .ledger import ADJUSTMENT, RESTOCK, movements, record
+from .reservations import forget_available
+
+"""
+Module: signals.py
+
+This module keeps the cached available-to-sell counters of Order.reservations
+consistent when a variant's stock is edited outside checkout, e.g. in the
+admin, by re-seeding them from the database, and moves a visitor's anonymous
+cart (Order.cart_store) into their own when they sign in. It also records
+stock edited outside checkout as restock or adjustment movements in the
+inventory ledger (Order.ledger).
+"""
+
+
+@receiver([post_save, post_delete], sender=ProductVariant)
+def reseed_available_on_stock_change(sender, instance, **kwargs):
+    """
+    Signal handler to drop a variant's cached counter once the change commits.
+    """
+    variant_id = instance.pk
+    transaction.on_commit(lambda: forget_available([variant_id]))
+
+
+@receiver(pre_save, sender=ProductVariant)
+def remember_stock_before_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Signal handler to read a variant's stored stock before it is overwritten,
+    so the change can be recorded in the ledger.
+    """
+    instance._stock_before = None
+    if raw or instance.pk is None or (update_fields is not None and 'stock' not in update_fields):
+        return
+    variants = ProductVariant.objects.filter(pk=instance.pk)
+    if transaction.get_connection().in_atomic_block:
+        variants = variants.select_for_update()
+    instance._stock_before = variants.values_list('stock', flat=True).first()
+
+
+@receiver(post_save, sender=ProductVariant)
+def record_stock_edit(sender, instance, created, raw=False, **kwargs):
+    """
+    Signal handler to record a hand-edited stock level as a restock (more
+    units) or an adjustment (fewer units).
+    """
+    if raw:
+        return
+    before = 0 if created else getattr(instance, '_stock_before', None)
+    if before is None:
+        return
+    change = instance.stock - before
+    record(movements(RESTOCK if change > 0 else ADJUSTMENT, {instance.pk: change}))
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    """
+    Signal handler to merge the anonymous cart of the signing-in visitor.
+    """
+    if request is not None and hasattr(request, 'session'):
+        merge_anonymous_cart(request, user)
+
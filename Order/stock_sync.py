@@ -0,0 +1,300 @@
+"""
+Module: stock_sync.py
+
+Bulk stock and price sync from warehouse files.
+
+Rows are read one at a time from a CSV or JSON Lines stream, each keyed by
+product id, color code and size code and carrying a new ``stock``, a new
+``price`` or both. Keys are resolved to variant ids through lookup maps
+loaded once per sync, and pending updates are applied in bounded batches:
+each batch locks its variants, writes the changed rows with one
+``bulk_update`` and records the stock changes in the inventory ledger
+(Order.ledger). Memory stays flat however long the file is, and the catalog
+caches are invalidated once at the end instead of once per variant: stock
+changes refresh the affected cards and matrices, and only price changes start
+a new catalog generation.
+
+``sync_stock`` returns a ``SyncReport`` with the row counts and the first
+problems found; every change can also be streamed to ``on_change``, e.g. to
+write a diff file. A sync that stops part way, on a file that is not valid
+text or a batch that cannot be written, keeps the batches already committed,
+invalidates the caches for them all the same and raises ``SyncAborted``,
+whose report tells how many variants were applied and where it stopped.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from Shop.catalog import bump_catalog_generation
+from Shop.models import ProductVariant
+from Shop.signals import products_changed
+from .ledger import ADJUSTMENT, RESTOCK, movements, record
+from .reservations import forget_available
+
+SYNC_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+PRICE_STEP = Decimal('0.01')
+MAX_PRICE = Decimal(10) ** (
+    ProductVariant._meta.get_field('price').max_digits - ProductVariant._meta.get_field('price').decimal_places
+)
+
+
+class SyncError(ValueError):
+    """Raised for a row that cannot be applied; the message is reported."""
+
+
+class SyncReport:
+    """
+    Counts of a sync run. ``errors`` keeps the first ``MAX_REPORTED_ERRORS``
+    problems as ``(line, message)`` pairs. ``applied`` counts the changed
+    variants whose batch committed, and ``stopped`` is the ``(line,
+    message)`` where an aborted sync stopped, ``None`` if it ran through.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.changed = 0
+        self.applied = 0
+        self.repriced = 0
+        self.unchanged = 0
+        self.unknown = 0
+        self.invalid = 0
+        self.errors = []
+        self.stopped = None
+
+    def error(self, line, message):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'changed': self.changed,
+            'applied': self.applied,
+            'repriced': self.repriced,
+            'unchanged': self.unchanged,
+            'unknown': self.unknown,
+            'invalid': self.invalid,
+            'errors': [{'line': line, 'message': message} for line, message in self.errors],
+            'stopped': self.stopped and {'line': self.stopped[0], 'message': self.stopped[1]},
+        }
+
+
+class SyncAborted(Exception):
+    """
+    Raised when a sync stops part way; ``report`` holds what was done up to
+    then, the batches before the failing one staying applied.
+    """
+
+    def __init__(self, report):
+        super().__init__(report.stopped[1])
+        self.report = report
+
+
+def read_csv(lines):
+    """
+    Yield ``(line number, row)`` from CSV text lines with a header row
+    naming the ``product``, ``color``, ``size``, ``stock`` and ``price``
+    columns.
+    """
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(lines):
+    """
+    Yield ``(line number, row)`` from JSON Lines text, one object per line;
+    blank lines are skipped and malformed ones yield ``None``.
+    """
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+def variant_lookup():
+    """
+    Map every ``(product id, color code, size code)`` to its variant id, in
+    one query. Color codes are compared lower-cased.
+    """
+    return {
+        (product_id, color_code.lower(), size_code): variant_id
+        for variant_id, product_id, color_code, size_code in ProductVariant.objects.values_list(
+            'id', 'product_id', 'color__code', 'size__code'
+        ).iterator(chunk_size=5000)
+    }
+
+
+def parse_row(row):
+    """
+    Validate one row.
+
+    Returns:
+        tuple: ``(key, changes)``; ``changes`` holds the new ``stock`` and/or
+        ``price``.
+
+    Raises:
+        SyncError: If the row is malformed.
+    """
+    if row is None:
+        raise SyncError("Malformed row")
+    try:
+        product_id = int(row['product'])
+        color = str(row['color']).strip().lower()
+        size = int(row['size'])
+    except (KeyError, TypeError, ValueError):
+        raise SyncError("Missing or invalid product, color or size")
+    if color and not color.startswith('#'):
+        color = f'#{color}'
+
+    changes = {}
+    if row.get('stock') not in (None, ''):
+        try:
+            changes['stock'] = int(row['stock'])
+        except (TypeError, ValueError):
+            raise SyncError(f"Invalid stock {row['stock']!r}")
+        if changes['stock'] < 0:
+            raise SyncError("Stock cannot be negative")
+    if row.get('price') not in (None, ''):
+        try:
+            price = Decimal(str(row['price']))
+        except InvalidOperation:
+            price = None
+        if price is None or not price.is_finite():
+            raise SyncError(f"Invalid price {row['price']!r}")
+        if not 0 <= price < MAX_PRICE:
+            raise SyncError(f"Price {price} out of range")
+        changes['price'] = price.quantize(PRICE_STEP)
+    if not changes:
+        raise SyncError("Row has neither stock nor price")
+    return (product_id, color, size), changes
+
+
+def sync_stock(rows, batch_size=SYNC_BATCH_SIZE, dry_run=False, on_change=None):
+    """
+    Apply stock and price updates to the matching variants.
+
+    Args:
+        rows (iterable): ``(line number, row)`` pairs, e.g. from
+            ``read_csv`` or ``read_jsonl``. A variant listed more than once
+            in a batch takes its last row.
+        batch_size (int): Variants written per transaction.
+        dry_run (bool): Only report what would change.
+        on_change (callable): Called as ``on_change(variant_id, before,
+            after)`` for every changed variant, with ``(stock, price)``
+            tuples.
+
+    Returns:
+        SyncReport
+
+    Raises:
+        SyncAborted: If reading the rows or writing a batch failed; the
+            report's ``stopped`` names the line read last before a read
+            error, or the first line of the failing batch.
+    """
+    report = SyncReport()
+    lookup = variant_lookup()
+    pending = {}
+    touched_products = set()
+    line = batch_line = 0
+    applying = False
+
+    try:
+        for line, row in rows:
+            report.rows += 1
+            try:
+                key, changes = parse_row(row)
+            except SyncError as error:
+                report.invalid += 1
+                report.error(line, str(error))
+                continue
+            variant_id = lookup.get(key)
+            if variant_id is None:
+                report.unknown += 1
+                report.error(line, "No variant for product {}, color {}, size {}".format(*key))
+                continue
+            if not pending:
+                batch_line = line
+            pending.setdefault(variant_id, {}).update(changes)
+            if len(pending) >= batch_size:
+                applying = True
+                _apply_batch(pending, report, touched_products, dry_run, on_change)
+                applying, pending = False, {}
+
+        if pending:
+            applying = True
+            _apply_batch(pending, report, touched_products, dry_run, on_change)
+    except Exception as error:
+        if applying:
+            report.stopped = (batch_line, f"Batch from this line could not be applied: {error}")
+        elif isinstance(error, UnicodeDecodeError):
+            report.stopped = (line, f"Text after this line cannot be decoded: {error.reason}")
+        else:
+            report.stopped = (line, f"Rows after this line cannot be read: {error}")
+        raise SyncAborted(report) from error
+    finally:
+        # Whatever happened, the batches written so far are committed.
+        if report.applied:
+            products_changed(touched_products)
+            if report.repriced:
+                bump_catalog_generation()
+    return report
+
+
+def _apply_batch(pending, report, touched_products, dry_run, on_change):
+    """
+    Write one batch in its own transaction. ``report.applied`` and
+    ``touched_products`` only take the batch in once it committed.
+    """
+    batch_products, repriced = set(), 0
+    with transaction.atomic():
+        variants = list(
+            ProductVariant.objects.select_for_update()
+            .filter(id__in=pending).order_by('id').only('id', 'product_id', 'stock', 'price')
+        )
+        changed, stock_changes = [], {}
+        for variant in variants:
+            before = (variant.stock, variant.price)
+            variant.stock = pending[variant.id].get('stock', variant.stock)
+            variant.price = pending[variant.id].get('price', variant.price)
+            after = (variant.stock, variant.price)
+            if after == before:
+                report.unchanged += 1
+                continue
+            report.changed += 1
+            changed.append(variant)
+            if variant.stock != before[0]:
+                stock_changes[variant.id] = variant.stock - before[0]
+            if variant.price != before[1]:
+                repriced += 1
+            batch_products.add(variant.product_id)
+            if on_change is not None:
+                on_change(variant.id, before, after)
+        # Variants deleted since the lookup maps were loaded.
+        report.unknown += len(pending) - len(variants)
+
+        if dry_run or not changed:
+            report.repriced += repriced
+            return
+        ProductVariant.objects.bulk_update(changed, ['stock', 'price'])
+        record(
+            movements(RESTOCK, {variant_id: change for variant_id, change in stock_changes.items() if change > 0})
+            + movements(ADJUSTMENT, {variant_id: change for variant_id, change in stock_changes.items() if change < 0})
+        )
+        transaction.on_commit(lambda: forget_available(list(stock_changes)))
+    report.applied += len(changed)
+    report.repriced += repriced
+    touched_products.update(batch_products)
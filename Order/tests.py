@@ -1,3 +1,380 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.contrib.messages import get_messages
 from django.test import TestCase
+from django.urls import reverse
+
+from Shop.catalog import get_catalog_generation
+from Shop.models import Color, Product, ProductVariant, Size
+from . import cart_store
+from .cart_store import CartBusy, add_item, flush_carts, get_cart, lock_key, persist
+from .checkout import OutOfStock, place_order, take_stock
+from .idempotency import claim_key, complete_key, release_key
+from .intents import FAILED, PLACED, process_intents
+from .ledger import compact_ledger, ledger_drift, projected_stock
+from .models import Cart, CheckoutIntent, Order, StockHold, StockMovement
+from .stock_sync import SyncAborted, SyncError, parse_row, read_csv, sync_stock
+from .reservations import claim, get_available, give_back, release, reserve
+
+SHIPPING = {
+    'shipping_address': '1 Main Street',
+    'city': 'Springfield',
+    'state': 'IL',
+    'zip_code': '62701',
+    'phone_number': '5550100',
+}
+
+
+class StockTestCase(TestCase):
+    """Creates two variants of one product and starts from an empty cache."""
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Runner', price=80, category='MEN', product_type='SNEAKERS')
+        black = Color.objects.create(code='#000000', name='Black')
+        self.variant = ProductVariant.objects.create(
+            product=self.product, color=black, size=Size.objects.create(code=9), stock=3, price=79,
+        )
+        self.other = ProductVariant.objects.create(
+            product=self.product, color=black, size=Size.objects.create(code=10), stock=3, price=85,
+        )
+        self.user = User.objects.create_user('buyer')
+
+    def stock(self, variant):
+        variant.refresh_from_db(fields=['stock'])
+        return variant.stock
+
+
+class TakeStockTests(StockTestCase):
+
+    def test_takes_stock(self):
+        take_stock({self.variant.id: 2})
+        self.assertEqual(self.stock(self.variant), 1)
+
+    def test_refuses_to_oversell(self):
+        with self.assertRaises(OutOfStock):
+            take_stock({self.variant.id: 4})
+        self.assertEqual(self.stock(self.variant), 3)
+
+    def test_all_or_nothing_inside_a_transaction(self):
+        with self.assertRaises(OutOfStock), transaction.atomic():
+            take_stock({self.variant.id: 1, self.other.id: 4})
+        self.assertEqual(self.stock(self.variant), 3)
+        self.assertEqual(self.stock(self.other), 3)
+
+    def test_second_buyer_of_the_last_units_is_refused(self):
+        rival = User.objects.create_user('rival')
+        for user in (self.user, rival):
+            Cart.objects.create(user=user, variant=self.variant, quantity=2)
+        place_order(self.user, [self.variant.id], SHIPPING)
+        with self.assertRaises(OutOfStock):
+            place_order(rival, [self.variant.id], SHIPPING)
+        self.assertEqual(self.stock(self.variant), 1)
+        self.assertTrue(Cart.objects.filter(user=rival).exists())
+
+
+class HoldTests(StockTestCase):
+
+    def test_claim_and_give_back(self):
+        self.assertTrue(claim(self.variant.id, 2))
+        self.assertFalse(claim(self.variant.id, 2))
+        self.assertEqual(get_available(self.variant.id), 1)
+        give_back(self.variant.id, 2)
+        self.assertEqual(get_available(self.variant.id), 3)
+
+    def test_reserve_and_release(self):
+        self.assertEqual(reserve(self.user, self.variant.id, 2), (True, None))
+        self.assertEqual(reserve(User.objects.create_user('rival'), self.variant.id, 2), (False, 1))
+        release(self.user, self.variant.id, 1)
+        self.assertEqual(StockHold.objects.get(user=self.user).quantity, 1)
+        self.assertEqual(get_available(self.variant.id), 2)
+        release(self.user, self.variant.id)
+        self.assertFalse(StockHold.objects.exists())
+        self.assertEqual(get_available(self.variant.id), 3)
+
+    def test_checkout_converts_the_hold(self):
+        reserve(self.user, self.variant.id, 2)
+        Cart.objects.create(user=self.user, variant=self.variant, quantity=2)
+        place_order(self.user, [self.variant.id], SHIPPING)
+        self.assertFalse(StockHold.objects.exists())
+        self.assertEqual(self.stock(self.variant), 1)
+        self.assertEqual(get_available(self.variant.id), 1)
+
+
+class PersistTests(StockTestCase):
+
+    def line(self, variant, quantity):
+        return {'product': self.product.pk, 'quantity': quantity, 'price': variant.price, 'stock': variant.stock}
+
+    def rows(self):
+        return dict(Cart.objects.filter(user=self.user).values_list('variant_id', 'quantity'))
+
+    def test_rows_follow_the_cart(self):
+        self.assertEqual(persist(self.user.pk, {self.variant.id: self.line(self.variant, 1)}), set())
+        persist(self.user.pk, {self.variant.id: self.line(self.variant, 2), self.other.id: self.line(self.other, 1)})
+        self.assertEqual(self.rows(), {self.variant.id: 2, self.other.id: 1})
+        persist(self.user.pk, {self.other.id: self.line(self.other, 3)})
+        self.assertEqual(self.rows(), {self.other.id: 3})
+        persist(self.user.pk, {})
+        self.assertEqual(self.rows(), {})
+
+    def test_refuses_lines_beyond_stock(self):
+        persist(self.user.pk, {self.variant.id: self.line(self.variant, 2)})
+        refused = persist(self.user.pk, {
+            self.variant.id: self.line(self.variant, 4), self.other.id: self.line(self.other, 1),
+        })
+        self.assertEqual(refused, {self.variant.id})
+        self.assertEqual(self.rows(), {self.variant.id: 2, self.other.id: 1})
+
+
+class CartViewTests(StockTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.owner = f'user:{self.user.pk}'
+
+    def messages(self, response):
+        return [str(message) for message in get_messages(response.wsgi_request)]
+
+    def test_add_rejects_a_bad_quantity(self):
+        for quantity in ('', 'two', '0'):
+            with self.subTest(quantity=quantity):
+                response = self.client.post(reverse('add_to_cart'), {'variant_id': self.variant.id, 'quantity': quantity})
+                self.assertEqual(response.status_code, 302)
+                self.assertEqual(self.messages(response)[-1], 'Invalid quantity')
+        self.assertEqual(get_cart(self.owner), {})
+
+    def test_update_rejects_a_bad_quantity(self):
+        add_item(self.owner, self.variant.id, 1)
+        response = self.client.post(reverse('update_cart', args=[self.variant.id]), {'quantity': '1.5'})
+        self.assertRedirects(response, reverse('cart'), fetch_redirect_response=False)
+        self.assertEqual(self.messages(response), ['Invalid quantity'])
+        self.assertEqual(get_cart(self.owner)[self.variant.id]['quantity'], 1)
+
+
+class CartStoreTests(StockTestCase):
+
+    def test_busy_cart_is_not_changed(self):
+        owner = f'user:{self.user.pk}'
+        cache.set(lock_key(owner), 'someone else', 5)
+        wait, cart_store.LOCK_WAIT = cart_store.LOCK_WAIT, 0.05
+        try:
+            with self.assertRaises(CartBusy):
+                add_item(owner, self.variant.id, 1)
+        finally:
+            cart_store.LOCK_WAIT = wait
+        self.assertEqual(get_cart(owner), {})
+        # The lock of the other request is left alone.
+        self.assertEqual(cache.get(lock_key(owner)), 'someone else')
+
+    def test_lock_is_released(self):
+        owner = f'user:{self.user.pk}'
+        self.assertTrue(add_item(owner, self.variant.id, 1).added)
+        self.assertIsNone(cache.get(lock_key(owner)))
+        self.assertTrue(add_item(owner, self.variant.id, 1).added)
+        self.assertEqual(get_cart(owner)[self.variant.id]['quantity'], 2)
+
+    def test_lock_taken_over_after_expiry_is_kept(self):
+        owner = f'user:{self.user.pk}'
+        with cart_store._locked(owner):
+            # Ours expired and another request took the lock.
+            cache.set(lock_key(owner), 'someone else', 5)
+        self.assertEqual(cache.get(lock_key(owner)), 'someone else')
+
+    def test_flush_persists_changed_carts(self):
+        owner = f'user:{self.user.pk}'
+        add_item(owner, self.variant.id, 2)
+        add_item(owner, self.other.id, 1)
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(flush_carts(), 1)
+        self.assertEqual(
+            dict(Cart.objects.filter(user=self.user).values_list('variant_id', 'quantity')),
+            {self.variant.id: 2, self.other.id: 1},
+        )
+        self.assertEqual(flush_carts(), 0)
+
+    def test_stock_limits_the_cart(self):
+        owner = f'user:{self.user.pk}'
+        result = add_item(owner, self.variant.id, 4)
+        self.assertFalse(result.added)
+        self.assertEqual(result.stock, 3)
+
+
+class IdempotencyTests(StockTestCase):
+
+    def test_replayed_key_gets_the_first_order(self):
+        key = 'a' * 32
+        self.assertEqual(claim_key(self.user, key), (True, None))
+        self.assertEqual(claim_key(self.user, key), (False, None))
+        Cart.objects.create(user=self.user, variant=self.variant, quantity=1)
+        order = place_order(self.user, [self.variant.id], SHIPPING)
+        complete_key(self.user, key, order)
+        self.assertEqual(claim_key(self.user, key), (False, order.id))
+
+    def test_released_key_can_be_retried(self):
+        key = 'b' * 32
+        claim_key(self.user, key)
+        release_key(self.user, key)
+        self.assertEqual(claim_key(self.user, key), (True, None))
+
+
+class IntentTests(StockTestCase):
+
+    def queue(self, user, quantity, key, shipping=SHIPPING):
+        return CheckoutIntent.objects.create(
+            user=user, key=key, lines=[[self.variant.id, quantity]], shipping=shipping,
+        )
+
+    def test_allocates_in_arrival_order(self):
+        first = self.queue(User.objects.create_user('first'), 2, 'k1')
+        second = self.queue(User.objects.create_user('second'), 2, 'k2')
+        third = self.queue(User.objects.create_user('third'), 1, 'k3')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_intents(), (2, 1))
+        statuses = dict(CheckoutIntent.objects.values_list('id', 'status'))
+        self.assertEqual(statuses, {first.id: PLACED, second.id: FAILED, third.id: PLACED})
+        self.assertEqual(self.stock(self.variant), 0)
+
+    def test_bad_intent_fails_alone(self):
+        self.queue(User.objects.create_user('first'), 1, 'k1')
+        bad = self.queue(User.objects.create_user('second'), 1, 'k2', dict(SHIPPING, unknown='field'))
+        self.queue(User.objects.create_user('third'), 1, 'k3')
+        with self.assertLogs('Order.intents', 'ERROR'):
+            self.assertEqual(process_intents(), (2, 1))
+        bad.refresh_from_db()
+        self.assertEqual(bad.status, FAILED)
+        self.assertEqual(self.stock(self.variant), 1)
+        self.assertFalse(CheckoutIntent.objects.filter(status='Pending').exists())
+
+
+class LedgerTests(StockTestCase):
+
+    def buy(self, quantity=2):
+        Cart.objects.create(user=self.user, variant=self.variant, quantity=quantity)
+        return place_order(self.user, [self.variant.id], SHIPPING)
+
+    def test_ledger_explains_the_stock(self):
+        self.buy()
+        self.assertEqual(self.stock(self.variant), 1)
+        self.assertEqual(ledger_drift(), {})
+
+    def test_reports_drift(self):
+        ProductVariant.objects.filter(pk=self.variant.pk).update(stock=1)
+        self.assertEqual(ledger_drift(), {self.variant.id: (1, 3)})
+
+    def test_compaction_keeps_the_projection(self):
+        self.buy()
+        folded = compact_ledger(before=timezone.now() + timedelta(seconds=1), batch_size=2)
+        self.assertEqual(folded, 3)  # Two restocks and the sale
+        self.assertFalse(StockMovement.objects.exists())
+        self.assertEqual(projected_stock([self.variant.id, self.other.id]), {self.variant.id: 1, self.other.id: 3})
+        # Movements recorded after the snapshot add to it.
+        variant = ProductVariant.objects.get(pk=self.variant.pk)
+        variant.stock = 5
+        variant.save()
+        self.assertEqual(ledger_drift(), {})
+
+
+class OrderActionTests(StockTestCase):
+
+    def setUp(self):
+        super().setUp()
+        Cart.objects.create(user=self.user, variant=self.variant, quantity=2)
+        self.order = place_order(self.user, [self.variant.id], SHIPPING)
+        self.client.force_login(self.user)
+
+    def status(self):
+        self.order.refresh_from_db(fields=['order_status'])
+        return self.order.order_status
+
+    def test_cancel_puts_the_stock_back_once(self):
+        for _ in range(2):
+            response = self.client.post(reverse('cancel_order', args=[self.order.id]))
+            self.assertRedirects(response, reverse('my_orders'), fetch_redirect_response=False)
+        self.assertEqual(self.status(), 'Cancelled')
+        self.assertEqual(self.stock(self.variant), 3)
+        self.assertEqual(ledger_drift(), {})
+
+    def test_return(self):
+        Order.objects.filter(pk=self.order.pk).update(order_status='Delivered')
+        self.client.post(reverse('return_order', args=[self.order.id]))
+        self.assertEqual(self.status(), 'Returned')
+        self.assertEqual(self.stock(self.variant), 3)
+
+    def test_only_the_buyer_can_cancel_with_a_post(self):
+        self.assertEqual(self.client.get(reverse('cancel_order', args=[self.order.id])).status_code, 405)
+        self.client.force_login(User.objects.create_user('rival'))
+        self.assertEqual(self.client.post(reverse('cancel_order', args=[self.order.id])).status_code, 404)
+        self.client.logout()
+        response = self.client.post(reverse('return_order', args=[self.order.id]))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith(reverse('login')))
+        self.assertEqual(self.status(), 'Processing')
+
+
+class StockSyncTests(StockTestCase):
+
+    def csv(self, *rows):
+        return read_csv(['product,color,size,stock,price\n', *(row + '\n' for row in rows)])
+
+    def test_parse_row(self):
+        key, changes = parse_row({'product': '7', 'color': 'ABCDEF ', 'size': '9', 'stock': '4', 'price': '19.999'})
+        self.assertEqual(key, (7, '#abcdef', 9))
+        self.assertEqual(changes, {'stock': 4, 'price': Decimal('20.00')})
+        for row in (None, {'product': 'x', 'color': '#000000', 'size': 9, 'stock': 1},
+                    {'product': 7, 'color': '#000000', 'size': 9, 'stock': -1},
+                    {'product': 7, 'color': '#000000', 'size': 9, 'price': 'NaN'},
+                    {'product': 7, 'color': '#000000', 'size': 9, 'stock': '', 'price': ''}):
+            with self.subTest(row=row), self.assertRaises(SyncError):
+                parse_row(row)
+
+    def test_applies_rows_in_batches(self):
+        pid = self.product.pk
+        changes = []
+        with self.captureOnCommitCallbacks(execute=True):
+            report = sync_stock(self.csv(
+                f'{pid},000000,9,2,',
+                f'{pid},#000000,10,,90',
+                f'{pid},#000000,11,1,',
+                f'{pid},#000000,9,-1,',
+                f'{pid},#000000,9,5,',
+            ), batch_size=1, on_change=lambda *change: changes.append(change))
+        self.assertEqual((report.rows, report.changed, report.applied, report.unknown, report.invalid), (5, 3, 3, 1, 1))
+        self.assertEqual([line for line, _ in report.errors], [4, 5])
+        self.assertEqual(self.stock(self.variant), 5)
+        self.assertEqual(changes[0], (self.variant.id, (3, Decimal('79.00')), (2, Decimal('79.00'))))
+        self.other.refresh_from_db()
+        self.assertEqual((self.other.stock, self.other.price), (3, Decimal('90.00')))
+        self.assertEqual(ledger_drift(), {})
+
+    def test_only_repricing_starts_a_catalog_generation(self):
+        generation = get_catalog_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            sync_stock(self.csv(f'{self.product.pk},#000000,9,1,'))
+        self.assertEqual(get_catalog_generation(), generation)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(sync_stock(self.csv(f'{self.product.pk},#000000,9,,70')).repriced, 1)
+        self.assertNotEqual(get_catalog_generation(), generation)
+
+    def test_dry_run_changes_nothing(self):
+        report = sync_stock(self.csv(f'{self.product.pk},#000000,9,0,'), dry_run=True)
+        self.assertEqual((report.changed, report.applied), (1, 0))
+        self.assertEqual(self.stock(self.variant), 3)
+
+    def test_unreadable_text_keeps_committed_batches(self):
+        def rows():
+            yield from self.csv(f'{self.product.pk},#000000,9,1,')
+            raise UnicodeDecodeError('utf-8', b'\xff', 0, 1, 'invalid start byte')
+
+        with self.assertRaises(SyncAborted) as aborted:
+            sync_stock(rows(), batch_size=1)
+        self.assertEqual(aborted.exception.report.applied, 1)
+        self.assertEqual(aborted.exception.report.stopped[0], 2)
+        self.assertEqual(self.stock(self.variant), 1)
 
-# Create your tests here.
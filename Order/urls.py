@@ -17,6 +17,12 @@ urlpatterns = [
     # Process the checkout of selected cart items
     path('checkout/', views.process_checkout, name='process_checkout'),
 
+    # Wait for a queued checkout to be placed
+    path('checkout/processing/<str:key>/', views.checkout_processing, name='checkout_processing'),
+
+    # Poll the state of a queued checkout (JSON)
+    path('checkout/status/<str:key>/', views.checkout_status, name='checkout_status'),
+
     # View details of a specific order
     path('orders/<int:order_id>/', views.order_detail, name='order_detail'),
 
@@ -29,6 +35,9 @@ urlpatterns = [
     # Mark an order as returned (simplified logic)
     path('return-order/<int:pk>/', views.return_order, name='return_order'),
 
+    # Bulk stock and price sync for the warehouse (token authenticated)
+    path('api/stock-sync/', views.stock_sync, name='stock_sync'),
+
     # List all orders made by the user
     path('my-orders/', views.my_orders, name='my_orders'),
 ]
@@ -1,106 +1,154 @@
+import codecs
+import hmac
+import uuid
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
-from django.db import transaction
 from django.db.models import Sum, F
 from django.contrib import messages
+from django.contrib.auth.decorators import login_required
 from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.core.cache import cache
+from django.db import transaction
 
-from Shop.models import ProductVariant
-from .models import Cart, Order, OrderItem
+from .models import Order, OrderItem
 from .forms import CheckoutForm, ReturnForm
+from .checkout import place_order, CheckoutError
+from .history import order_page, render_fragments
+from .idempotency import claim_key, complete_key, release_key, valid_key
+from .intents import enqueue_checkout, intent_status
+from .ledger import CANCELLATION, RETURN, put_back
+from .stock_sync import READERS, SyncAborted, sync_stock
+from .reservations import get_available, reserve, release, set_reserved
+from .cart_store import (
+    CartBusy, add_item, cart_lines, cart_owner, get_cart, get_cart_store, remove_items, set_quantity, variant_product,
+)
+
+QUEUED_CHECKOUT = getattr(settings, 'QUEUED_CHECKOUT', False)
+STOCK_SYNC_TOKEN = getattr(settings, 'STOCK_SYNC_TOKEN', '')
+
 
-@transaction.atomic
 def add_to_cart(request):
     """
-    Adds a product variant to the user's cart.
+    Adds a product variant to the visitor's cart.
 
-    - Ensures the user is authenticated.
-    - Validates quantity and stock availability.
-    - If the item exists, updates the quantity; else creates a new cart item.
+    - Validates quantity; signed-in users also reserve the stock with a
+      time-limited hold, anonymous carts are reserved when they sign in.
+    - Creates the cart line or increases its quantity in the cart store,
+      re-checking stock (see Order.cart_store).
     """
-    if not request.user.is_authenticated:
-        return redirect(f"{reverse('home')}?next=add-to-cart")
-
     if request.method == 'POST':
-        variant_id = request.POST.get('variant_id')
-        quantity = int(request.POST.get('quantity', 1))
-
         try:
-            variant = ProductVariant.objects.get(id=variant_id)
-
-            if quantity <= 0:
-                messages.error(request, "Invalid quantity")
-                return redirect(request.META.get('HTTP_REFERER', '/'))
-
-            if quantity > variant.stock:
-                messages.error(request, f"Only {variant.stock} items available in stock")
-                return redirect(request.META.get('HTTP_REFERER', '/'))
-
-            cart_item, created = Cart.objects.get_or_create(
-                user=request.user,
-                variant=variant,
-                defaults={'quantity': quantity}
-            )
-
-            if not created:
-                new_quantity = cart_item.quantity + quantity
-                if new_quantity > variant.stock:
-                    messages.error(request, f"Total quantity exceeds available stock ({variant.stock})")
-                    return redirect(request.META.get('HTTP_REFERER', '/'))
-
-                cart_item.quantity = new_quantity
-                cart_item.save()
-                messages.success(request, "Cart quantity updated successfully")
-            else:
-                messages.success(request, "Item added to cart successfully")
+            variant_id = int(request.POST.get('variant_id'))
+        except (TypeError, ValueError):
+            messages.error(request, "Product variant not found")
+            return redirect('home')
+        try:
+            quantity = int(request.POST.get('quantity', 1))
+        except (TypeError, ValueError):
+            quantity = 0
 
-            return redirect('cart')
+        if quantity <= 0:
+            messages.error(request, "Invalid quantity")
+            return redirect(request.META.get('HTTP_REFERER', '/'))
 
-        except ProductVariant.DoesNotExist:
+        if variant_product(variant_id) is None:
             messages.error(request, "Product variant not found")
             return redirect('home')
 
+        if request.user.is_authenticated:
+            reserved, available = reserve(request.user, variant_id, quantity)
+        else:
+            available = get_available(variant_id)
+            reserved = available >= quantity
+        if not reserved:
+            messages.error(request, f"Only {available} items available in stock")
+            return redirect(request.META.get('HTTP_REFERER', '/'))
+
+        try:
+            result = add_item(cart_owner(request, create=True), variant_id, quantity)
+        except CartBusy:
+            if request.user.is_authenticated:
+                release(request.user, variant_id, quantity)
+            messages.error(request, "Your cart is busy, please try again")
+            return redirect(request.META.get('HTTP_REFERER', '/'))
+        if not result.added:
+            if request.user.is_authenticated:
+                release(request.user, variant_id, quantity)
+            if result.stock is None:
+                messages.error(request, "Product variant not found")
+                return redirect('home')
+            if result.quantity:
+                messages.error(request, f"Total quantity exceeds available stock ({result.stock})")
+            else:
+                messages.error(request, f"Only {result.stock} items available in stock")
+            return redirect(request.META.get('HTTP_REFERER', '/'))
+
+        if result.created:
+            messages.success(request, "Item added to cart successfully")
+        else:
+            messages.success(request, "Cart quantity updated successfully")
+        return redirect('cart')
+
     return redirect('home')
 
 
 @never_cache
 def cart(request):
     """
-    Displays the user's cart with all added items and total cost.
+    Displays the visitor's cart with all added items and total cost,
+    rendered from the cart store without querying the database.
     """
-    if not request.user.is_authenticated:
-        return redirect(f"{reverse('home')}?next=cart")
-
-    cart_items = Cart.objects.filter(user=request.user)\
-        .select_related('variant__product', 'variant__color', 'variant__size')\
-        .prefetch_related('variant__product__images')
-
+    cart_items = cart_lines(cart_owner(request))
     total = sum(item.total_price for item in cart_items)
 
     context = {
         'cart_items': cart_items,
-        'total': total
+        'total': total,
+        'checkout_key': uuid.uuid4().hex,
     }
     return render(request, 'cart.html', context)
 
 
 def update_cart(request, item_id):
     """
-    Updates the quantity of a cart item.
+    Updates the quantity of a cart line (``item_id`` is its variant id).
 
-    - Checks against stock availability.
+    - Resizes the stock hold to the new quantity.
     - Updates cart if within allowed limits.
     """
     if request.method == 'POST':
-        cart_item = get_object_or_404(Cart, id=item_id, user=request.user)
-        new_quantity = int(request.POST.get('quantity', 1))
+        owner = cart_owner(request)
+        lines = get_cart(owner)
+        if owner is None or item_id not in lines:
+            raise Http404("Cart item not found")
+        try:
+            new_quantity = int(request.POST.get('quantity', 1))
+        except (TypeError, ValueError):
+            new_quantity = 0
+
+        if new_quantity <= 0:
+            messages.error(request, "Invalid quantity")
+            return redirect('cart')
 
-        if new_quantity > cart_item.variant.stock:
+        if request.user.is_authenticated:
+            reserved, _ = set_reserved(request.user, item_id, new_quantity)
+        else:
+            reserved = True
+        try:
+            updated = reserved and set_quantity(owner, item_id, new_quantity)
+        except CartBusy:
+            if request.user.is_authenticated:
+                set_reserved(request.user, item_id, lines[item_id]['quantity'])
+            messages.error(request, "Your cart is busy, please try again")
+            return redirect('cart')
+        if not updated:
             messages.error(request, "Exceeds available stock")
         else:
-            cart_item.quantity = new_quantity
-            cart_item.save()
             messages.success(request, "Cart updated successfully")
 
         return redirect('cart')
@@ -109,23 +157,35 @@ def update_cart(request, item_id):
 
 def remove_from_cart(request, item_id):
     """
-    Removes an item from the user's cart.
+    Removes a line (``item_id`` is its variant id) from the visitor's cart.
     """
     if request.method == 'GET':
-        cart_item = get_object_or_404(Cart, id=item_id, user=request.user)
-        cart_item.delete()
+        owner = cart_owner(request)
+        try:
+            removed = owner is not None and remove_items(owner, [item_id])
+        except CartBusy:
+            messages.error(request, "Your cart is busy, please try again")
+            return redirect('cart')
+        if not removed:
+            raise Http404("Cart item not found")
+        if request.user.is_authenticated:
+            release(request.user, item_id)
         messages.success(request, "Item removed from cart")
     return redirect('cart')
 
 
-@transaction.atomic
 def process_checkout(request):
     """
     Processes the checkout operation:
 
-    - Creates an order from selected cart items.
-    - Deducts product stock accordingly.
-    - Saves order and order items.
+    - Answers a repeated submission of the same form with the order the
+      first one placed (see Order.idempotency).
+    - With ``QUEUED_CHECKOUT``, only queues the checkout for the worker and
+      shows a page polling for the result (see Order.intents).
+    - Persists the cart and creates an order from the selected lines.
+    - Deducts product stock accordingly, failing the whole order if any
+      item is no longer available (see Order.checkout).
+    - Saves order and order items, and removes the lines from the cart.
     """
     if not request.user.is_authenticated:
         return redirect('login')
@@ -137,47 +197,99 @@ def process_checkout(request):
             messages.error(request, "Invalid selection")
             return redirect('cart')
 
-        cart_items = Cart.objects.filter(
-            id__in=selected_ids,
-            user=request.user
-        ).select_related('variant__product', 'variant')
-
-        if not cart_items.exists():
-            messages.error(request, "No valid items selected")
-            return redirect('cart')
-
+        owner = cart_owner(request)
+        key = request.POST.get('idempotency_key', '')
         form = CheckoutForm(request.POST)
         if form.is_valid():
-            order = Order.objects.create(
-                user=request.user,
-                total_amount=sum(item.total_price for item in cart_items),
-                **form.cleaned_data
-            )
-
-            for item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    variant=item.variant,
-                    quantity=item.quantity,
-                    price=item.variant.price
-                )
-
-                item.variant.stock -= item.quantity
-                item.variant.save()
-
-            cart_items.delete()
+            if not valid_key(key):
+                messages.error(request, "Your checkout session expired, please try again")
+                return redirect('cart')
+            claimed, order_id = claim_key(request.user, key)
+            if not claimed:
+                if order_id is not None:
+                    return redirect('order_detail', order_id=order_id)
+                if QUEUED_CHECKOUT:
+                    return redirect('checkout_processing', key=key)
+                messages.info(request, "Your order is being placed")
+                return redirect('my_orders')
+
+            if QUEUED_CHECKOUT:
+                try:
+                    enqueue_checkout(request.user, key, selected_ids, form.cleaned_data)
+                except CheckoutError as error:
+                    release_key(request.user, key)
+                    messages.error(request, str(error))
+                    return redirect('cart')
+                return redirect('checkout_processing', key=key)
+
+            if get_cart_store().flush(owner) & set(selected_ids):
+                release_key(request.user, key)
+                messages.error(request, "Some items in your cart are no longer in stock, please update them")
+                return redirect('cart')
+            try:
+                order = place_order(request.user, selected_ids, form.cleaned_data)
+            except CheckoutError as error:
+                release_key(request.user, key)
+                messages.error(request, str(error))
+                return redirect('cart')
+            except Exception:
+                release_key(request.user, key)
+                raise
+            complete_key(request.user, key, order)
+            try:
+                remove_items(owner, selected_ids)
+            except CartBusy:
+                # The order stands; the bought lines stay in the cart.
+                pass
+
             messages.success(request, "Order placed successfully!")
             return redirect('order_detail', order_id=order.id)
 
         messages.error(request, "Please correct the errors below")
         return render(request, 'cart.html', {
             'form': form,
-            'cart_items': Cart.objects.filter(user=request.user)
+            'cart_items': cart_lines(owner),
+            'checkout_key': key if valid_key(key) else uuid.uuid4().hex,
         })
 
     return redirect('cart')
 
 
+@never_cache
+def checkout_processing(request, key):
+    """
+    Shown while a queued checkout waits for the worker; polls
+    ``checkout_status`` and moves on to the order once it is placed.
+    """
+    if not request.user.is_authenticated:
+        return redirect('login')
+
+    status = intent_status(request.user, key)
+    if status is None:
+        raise Http404("Checkout not found")
+    if status['order_id']:
+        return redirect('order_detail', order_id=status['order_id'])
+    return render(request, 'checkout_processing.html', {'key': key, 'status': status})
+
+
+@never_cache
+def checkout_status(request, key):
+    """
+    Polling endpoint reporting the state of a queued checkout as JSON.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    status = intent_status(request.user, key)
+    if status is None:
+        return JsonResponse({'error': 'Checkout not found'}, status=404)
+    return JsonResponse({
+        'status': status['status'],
+        'order_url': reverse('order_detail', args=[status['order_id']]) if status['order_id'] else None,
+        'error': status['error'],
+    })
+
+
 def order_detail(request, order_id):
     """
     Displays details for a specific order.
@@ -186,28 +298,43 @@ def order_detail(request, order_id):
         return redirect(f"{reverse('home')}?next=cart")
 
     order = get_object_or_404(Order, id=order_id, user=request.user)
-    return render(request, 'order_detail.html', {'order': order})
+    items = render_fragments([order], 'items')[order.id]
+    return render(request, 'order_detail.html', {'order': order, 'items': items})
 
 
 def my_orders(request):
     """
-    Lists all orders placed by the currently logged-in user.
+    Lists the orders placed by the currently logged-in user, newest first,
+    one page at a time (``?before=<cursor>``).
     """
     if not request.user.is_authenticated:
         return redirect(f"{reverse('home')}?next=cart")
 
-    orders = Order.objects.filter(user=request.user)
-    return render(request, 'orders.html', {'orders': orders})
+    try:
+        before = int(request.GET['before'])
+    except (KeyError, ValueError):
+        before = None
 
+    orders, next_cursor = order_page(request.user, before)
+    cards = render_fragments(orders, 'card', prefetch=False)
+    for order in orders:
+        order.card = cards[order.id]
+    return render(request, 'orders.html', {'orders': orders, 'next_cursor': next_cursor})
 
+
+@login_required(login_url='login')
+@require_POST
 def cancel_order(request, pk):
     """
-    Cancels an order if it's in 'Processing' status.
+    Cancels one of the user's orders if it's in 'Processing' status and puts
+    its items back into stock (see Order.ledger).
     """
-    order = Order.objects.get(pk=pk, user=request.user)
-    if order.order_status == 'Processing':
-        order.order_status = 'Cancelled'
-        order.save()
+    with transaction.atomic():
+        order = get_object_or_404(Order.objects.select_for_update(), pk=pk, user=request.user)
+        if order.order_status == 'Processing':
+            order.order_status = 'Cancelled'
+            order.save()
+            put_back(order, CANCELLATION)
     return redirect('my_orders')
 
 
@@ -217,7 +344,8 @@ def initiate_return(request, pk):
 
     - Validates delivery status.
     - Accepts return form submission.
-    - Changes order status to 'Returned'.
+    - Changes order status to 'Returned' and puts the items back into
+      stock (see Order.ledger).
     """
     order = get_object_or_404(Order, pk=pk, user=request.user)
 
@@ -228,13 +356,22 @@ def initiate_return(request, pk):
     if request.method == 'POST':
         form = ReturnForm(request.POST)
         if form.is_valid():
-            return_request = form.save(commit=False)
-            return_request.order = order
-            return_request.user = request.user
-            return_request.save()
-
-            order.order_status = 'Returned'
-            order.save()
+            with transaction.atomic():
+                # Re-read the status under a lock so a double submission
+                # cannot put the stock back twice.
+                order = Order.objects.select_for_update().get(pk=order.pk)
+                if order.order_status != 'Delivered':
+                    messages.error(request, "Only delivered orders can be returned.")
+                    return redirect('my_orders')
+
+                return_request = form.save(commit=False)
+                return_request.order = order
+                return_request.user = request.user
+                return_request.save()
+
+                order.order_status = 'Returned'
+                order.save()
+                put_back(order, RETURN)
 
             messages.success(request, f"Return request for Order #{order.id} has been submitted successfully.")
             return redirect('my_orders')
@@ -247,12 +384,47 @@ def initiate_return(request, pk):
     })
 
 
+@login_required(login_url='login')
+@require_POST
 def return_order(request, pk):
     """
-    Marks a delivered order as returned.
+    Marks one of the user's delivered orders as returned and puts its items
+    back into stock.
     """
-    order = Order.objects.get(pk=pk, user=request.user)
-    if order.order_status == 'Delivered':
-        order.order_status = 'Returned'
-        order.save()
+    with transaction.atomic():
+        order = get_object_or_404(Order.objects.select_for_update(), pk=pk, user=request.user)
+        if order.order_status == 'Delivered':
+            order.order_status = 'Returned'
+            order.save()
+            put_back(order, RETURN)
     return redirect('my_orders')
+
+
+@csrf_exempt
+@require_POST
+def stock_sync(request):
+    """
+    Applies a warehouse stock and price file posted as the request body
+    (see Order.stock_sync) and answers with the sync report as JSON.
+
+    - Requires ``Authorization: Bearer <STOCK_SYNC_TOKEN>``; the endpoint
+      is disabled while the setting is empty.
+    - Reads JSON Lines if the content type says so, CSV otherwise; the body
+      is streamed, never loaded whole.
+    - ``?dry_run=1`` only reports what would change.
+    - A sync that stops part way answers 400 (body not valid text) or 500
+      with the report: ``applied`` variants stay written and ``stopped``
+      gives the line and reason.
+    """
+    token = request.META.get('HTTP_AUTHORIZATION', '').removeprefix('Bearer ')
+    if not STOCK_SYNC_TOKEN or not hmac.compare_digest(token.encode(), STOCK_SYNC_TOKEN.encode()):
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    fmt = 'jsonl' if request.content_type in ('application/jsonl', 'application/x-ndjson') else 'csv'
+    lines = codecs.iterdecode(request, request.encoding or 'utf-8')
+    try:
+        report = sync_stock(READERS[fmt](lines), dry_run=request.GET.get('dry_run') == '1')
+    except SyncAborted as aborted:
+        status = 400 if isinstance(aborted.__cause__, UnicodeDecodeError) else 500
+        return JsonResponse({'error': str(aborted), **aborted.report.as_dict()}, status=status)
+    return JsonResponse(report.as_dict())
@@ -1,6 +1,8 @@
 from django.contrib import admin
 from .models import *
 from django.utils.html import format_html
+from django.core.files.storage import default_storage
+from .search import filter_products
 
 # Register your models here.
 
@@ -48,11 +50,12 @@ class ProductImageAdmin(admin.ModelAdmin):
     def image_preview(self, obj):
         """
         Provides a thumbnail preview of the product image in the admin panel.
-        Displays a small version of the image for better visual identification.
+        Uses the small rendition once it has been rendered.
         """
+        thumb = obj.derivatives.get('thumb', {}).get('jpeg')
         return format_html(
             '<img src="{}" style="width: 50px; height: 50px;" />',
-            obj.image.url
+            default_storage.url(thumb) if thumb else obj.image.url
         )
     image_preview.short_description = 'Image Preview'
 
@@ -62,13 +65,21 @@ class ProductAdmin(admin.ModelAdmin):
     Admin configuration for the Product model.
     - Displays essential product details such as ID, name, description, price, and category.
     - Enables filtering by category and product type.
-    - Provides search functionality for quick product lookup.
+    - Provides full-text search for quick product lookup.
     """
     list_display = ('id', 'name', 'description', 'price', 'category', 'product_type', 'created_at')
     list_filter = ('category', 'product_type',)
     search_fields = ('name', 'description')
     ordering = ('name',)
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Uses the full-text index instead of ILIKE scans over name and description.
+        """
+        if not search_term:
+            return queryset, False
+        return filter_products(queryset, search_term), False
+
 
 class ProductVariantAdmin(admin.ModelAdmin):
     """
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class ShopConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Shop'
-    
\ No newline at end of file
+
+    def ready(self):
+        # Register signal handlers that keep catalog indexes in sync.
+        from . import signals  # noqa: F401
@@ -0,0 +1,78 @@
+"""
+Module: availability.py
+
+Size and color availability filters for the shopping listing.
+
+A product matches when at least one of its variants is in stock in one of the
+selected sizes and one of the selected colors. The match is a single
+``EXISTS`` subquery per product, served by the partial in-stock indexes on
+ProductVariant (and the product/color/size unique index for the correlated
+lookup), instead of joining all variants and de-duplicating. The resulting id
+set is cached per catalog generation and intersected with the facet index.
+It also carries the ``Stock`` cache tag (Mazlofootwear.cache_tags), which
+orders and stock syncs invalidate without starting a new catalog generation
+(see Shop.signals.products_changed).
+"""
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+
+from Mazlofootwear.cache_tags import tagged_key
+from .catalog import STOCK_TAG, catalog_cache_key, get_catalog_generation
+from .models import Color, Product, ProductVariant, Size
+
+CACHE_TIMEOUT = 60 * 60  # 1 hour; keys change with the catalog generation anyway
+
+
+def get_variant_options():
+    """
+    Return the sizes and colors offered by the filter sidebar, cached for the
+    current catalog generation.
+
+    Returns:
+        dict: ``sizes`` as ``[(code, label)]``, ``colors`` as
+        ``[(slug, name, hex code)]``, and ``size_ids`` / ``color_ids`` lookup
+        maps from the URL values to primary keys.
+    """
+    key = f'shop:variant_options:{get_catalog_generation()}'
+    options = cache.get(key)
+    if options is None:
+        sizes = list(Size.objects.values_list('id', 'code'))
+        colors = list(Color.objects.values_list('id', 'name', 'code'))
+        options = {
+            'sizes': [(code, str(code)) for _, code in sizes],
+            'colors': [(name.lower(), name, code) for _, name, code in colors],
+            'size_ids': {str(code): pk for pk, code in sizes},
+            'color_ids': {name.lower(): pk for pk, name, _ in colors},
+        }
+        cache.set(key, options, CACHE_TIMEOUT)
+    return options
+
+
+def available_product_ids(sizes=(), colors=()):
+    """
+    Return the ids of products with an in-stock variant in one of ``sizes``
+    and one of ``colors``, or ``None`` when neither filter is active.
+
+    Args:
+        sizes (iterable): Size codes from the query string (e.g. ``'9'``).
+        colors (iterable): Lower-cased color names from the query string.
+    """
+    sizes = sorted(set(sizes))
+    colors = sorted(set(colors))
+    if not sizes and not colors:
+        return None
+
+    key = tagged_key(catalog_cache_key('shop:available', {'size': sizes, 'color': colors}), [STOCK_TAG])
+    product_ids = cache.get(key)
+    if product_ids is None:
+        options = get_variant_options()
+        variants = ProductVariant.objects.filter(product=OuterRef('pk'), stock__gt=0)
+        if sizes:
+            variants = variants.filter(size_id__in=[options['size_ids'][s] for s in sizes if s in options['size_ids']])
+        if colors:
+            variants = variants.filter(color_id__in=[options['color_ids'][c] for c in colors if c in options['color_ids']])
+        product_ids = frozenset(
+            Product.objects.filter(Exists(variants)).values_list('id', flat=True)
+        )
+        cache.set(key, product_ids, CACHE_TIMEOUT)
+    return product_ids
@@ -0,0 +1,98 @@
+"""
+Module: cards.py
+
+Maintenance of the ProductCard read model.
+
+Every change to a product, its images or its variants schedules a refresh of
+that product's card. Refreshes are deferred until the surrounding transaction
+commits and collapsed per product, so saving a product with a dozen inline
+images and variants in the admin rebuilds its card once.
+"""
+import threading
+
+from django.db import transaction
+from django.db.models import Max, Min, Sum
+
+from .models import Product, ProductCard, ProductVariant, picture_data
+
+_pending = threading.local()
+
+
+def schedule_card_refresh(product_id):
+    """
+    Refresh the card of ``product_id`` once the current transaction commits.
+    """
+    pending = getattr(_pending, 'ids', None)
+    if pending is None:
+        pending = _pending.ids = set()
+    pending.add(product_id)
+    # Every call queues a callback, so a refresh is never lost to a rolled
+    # back transaction or savepoint; the first one to run does the work and
+    # clears the id, the rest find it gone.
+    transaction.on_commit(lambda: _refresh_pending(pending, product_id))
+
+
+def _refresh_pending(pending, product_id):
+    if product_id in pending:
+        pending.discard(product_id)
+        refresh_product_card(product_id)
+
+
+def refresh_product_card(product_id):
+    """
+    Rebuild the ProductCard row for one product from its images and variants.
+    Removes the card if the product no longer exists.
+    """
+    product = Product.objects.filter(pk=product_id).first()
+    if product is None:
+        ProductCard.objects.filter(pk=product_id).delete()
+        return None
+
+    card = build_product_card(product)
+    card.save()
+    return card
+
+
+def refresh_all_product_cards():
+    """
+    Rebuild every ProductCard. Used after bulk changes that bypass signals.
+    """
+    for product in Product.objects.iterator():
+        build_product_card(product).save()
+    ProductCard.objects.exclude(product__in=Product.objects.all()).delete()
+
+
+def build_product_card(product):
+    """
+    Return an unsaved ProductCard with the current data of ``product``.
+    """
+    image, width, height, derivatives = product.images.order_by('order', 'id') \
+        .values_list('image', 'width', 'height', 'derivatives').first() or ('', None, None, {})
+    thumbnail = derivatives.get('card', {}).get('jpeg') or image
+
+    variants = ProductVariant.objects.filter(product=product)
+    prices = variants.aggregate(min_price=Min('price'), max_price=Max('price'))
+    in_stock = variants.filter(stock__gt=0)
+    total_stock = in_stock.aggregate(total=Sum('stock'))['total'] or 0
+    sizes = sorted(set(in_stock.values_list('size__code', flat=True)))
+    colors = [
+        {'code': code, 'name': name}
+        for code, name in in_stock.values_list('color__code', 'color__name').distinct().order_by('color__name')
+    ]
+
+    return ProductCard(
+        product=product,
+        name=product.name,
+        price=product.price,
+        category=product.category,
+        product_type=product.product_type,
+        created_at=product.created_at,
+        primary_image=image,
+        thumbnail=thumbnail,
+        picture=picture_data(image, width, height, derivatives),
+        min_price=prices['min_price'],
+        max_price=prices['max_price'],
+        total_stock=total_stock,
+        sizes=sizes,
+        colors=colors,
+    )
@@ -0,0 +1,83 @@
+"""
+Module: catalog.py
+
+Shared cache keys for catalog pages.
+
+Every cached catalog response and listing page is namespaced by a catalog
+generation number: the version of the ``Catalog`` cache tag
+(Mazlofootwear.cache_tags). Signals in Shop.signals bump the generation after
+any Product, ProductImage, ProductVariant, Color or Size change commits, which
+makes every older entry unreachable at once without scanning or deleting keys.
+Cached responses and listing pages also show stock (size and color filters,
+card stock), so their keys carry the version of the ``Stock`` tag as well,
+which orders and stock syncs invalidate without starting a new generation.
+
+Keys are derived from an MD5 digest of the canonicalized query parameters
+rather than Python's ``hash()``, which is randomized per process, so all
+workers sharing the cache compute the same key for the same listing.
+"""
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.views.decorators.cache import cache_page
+
+from Mazlofootwear.cache_tags import invalidate_tags, tag_version, tag_versions
+
+CATALOG_TAG = 'Catalog'
+STOCK_TAG = 'Stock'
+
+
+def get_catalog_generation():
+    """
+    Return the current catalog generation number.
+    """
+    return tag_version(CATALOG_TAG)
+
+
+def bump_catalog_generation():
+    """
+    Start a new catalog generation once the current transaction commits.
+    """
+    invalidate_tags([CATALOG_TAG])
+
+
+def params_digest(params):
+    """
+    Return a stable digest of query parameters.
+
+    Args:
+        params (dict): Parameter name -> value or list of values. Order of
+            names and of list values does not affect the result; empty values
+            are ignored.
+    """
+    canonical = []
+    for name in sorted(params):
+        value = params[name]
+        values = sorted(value) if isinstance(value, (list, tuple)) else [value]
+        canonical.extend((name, v) for v in values if v not in (None, ''))
+    return hashlib.md5(urlencode(canonical).encode()).hexdigest()
+
+
+def catalog_cache_key(prefix, params):
+    """
+    Build a cache key for catalog data that depends on ``params``, scoped to
+    the current catalog generation.
+    """
+    return f'{prefix}:{get_catalog_generation()}:{params_digest(params)}'
+
+
+def catalog_cache_page(timeout):
+    """
+    Like ``cache_page``, but the cached responses are keyed on the catalog
+    generation and the stock version so they go stale as soon as the catalog
+    or any stock changes.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+            versions = tag_versions([CATALOG_TAG, STOCK_TAG])
+            key_prefix = f'catalog:{versions[CATALOG_TAG]}:{versions[STOCK_TAG]}'
+            return cache_page(timeout, key_prefix=key_prefix)(view_func)(request, *args, **kwargs)
+        return wrapped_view
+    return decorator
@@ -0,0 +1,284 @@
+"""
+Module: derivatives.py
+
+Responsive image derivatives for ProductImage and other models with images.
+
+When a product image is saved with a new file, the file is handed to a pool of
+worker processes (Shop.renditions) that render it as WebP and JPEG at the
+widths in ``RENDITION_WIDTHS``. The renditions are written next to the
+originals under ``products/derivatives/`` and their paths and dimensions are
+recorded on the ProductImage row, from where the ``responsive_image`` template
+tag builds ``srcset`` attributes. Until a row has been processed the tag falls
+back to the original file.
+
+Any model with the same ``width``, ``height``, ``derivatives`` and
+``derivatives_source`` fields goes through the same pool, e.g. the homepage
+content of Home.models. It names the file field to render in
+``derivatives_field`` (default ``image``) and where to write the renditions in
+``derivatives_dir``. Once renditions are recorded ``derivatives_stored`` is
+sent, so the pages showing them can be refreshed.
+
+Existing images can be processed in bulk with
+``python manage.py build_image_derivatives``.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.apps import apps
+from django.db import close_old_connections, transaction
+from django.dispatch import Signal
+
+from .models import ProductImage
+from .renditions import FORMATS, RENDITION_WIDTHS, render_renditions
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIR = 'products/derivatives'
+
+# Sent by store_derivatives() with the model as sender and the ``pks`` of the
+# rows given new renditions. update() sends no model signals.
+derivatives_stored = Signal()
+
+_pool = None
+_writer = None
+_pool_lock = threading.Lock()
+
+
+def _storage():
+    # Renditions are named after their source, which is content-addressed
+    # itself, so they go to plain storage rather than being hashed again.
+    return default_storage
+
+
+def _worker_count():
+    return getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', None) or os.cpu_count() or 1
+
+
+def _get_pool():
+    """
+    Return the process pool that renders images, starting it on first use.
+
+    Workers are spawned rather than forked so they do not inherit the web
+    server's threads, connections and locks.
+    """
+    global _pool, _writer
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=_worker_count(), mp_context=multiprocessing.get_context('spawn'))
+        if _writer is None:
+            # Results are stored from a separate thread with its own database
+            # connection, never from the request thread that queued the work.
+            _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-derivatives')
+        return _pool
+
+
+def _discard_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def source_field(model):
+    """Name of the file field whose renditions ``model`` records."""
+    return getattr(model, 'derivatives_field', 'image')
+
+
+def derivatives_dir(model):
+    return getattr(model, 'derivatives_dir', DERIVATIVES_DIR)
+
+
+def rendered_models():
+    """Every installed model that records renditions."""
+    return [
+        model for model in apps.get_models()
+        if any(field.name == 'derivatives_source' for field in model._meta.concrete_fields)
+    ]
+
+
+def derivative_path(source_name, rendition, extension, directory=DERIVATIVES_DIR):
+    """
+    Return the storage path of one rendition of a source image, e.g.
+    ``products/derivatives/IMG-123-card.webp`` for ``products/IMG-123.jpg``.
+    """
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    return f'{directory}/{stem}-{rendition}.{extension}'
+
+
+def source_file(image):
+    """The file to render for ``image``, or ``None`` if it has none or is a video."""
+    file = getattr(image, source_field(type(image)))
+    return file if file and not getattr(image, 'is_video', False) else None
+
+
+def needs_derivatives(image):
+    """
+    Return whether ``image`` has a file whose renditions are missing or were
+    rendered from a different file.
+    """
+    file = source_file(image)
+    return file is not None and image.derivatives_source != file.name
+
+
+def schedule_derivatives(image):
+    """
+    Render the renditions of a saved ProductImage (or other image row) in the
+    background once the current transaction commits. Does nothing if they are
+    already current.
+    """
+    if not needs_derivatives(image):
+        return
+    model = type(image)
+    image_id, source_name = image.pk, source_file(image).name
+
+    # Identical uploads share one stored file; reuse its renditions.
+    rendered = model._default_manager.filter(derivatives_source=source_name).exclude(pk=image_id) \
+        .values('width', 'height', 'derivatives').first()
+    if rendered:
+        model._default_manager.filter(pk=image_id).update(derivatives_source=source_name, **rendered)
+        for field, value in rendered.items():
+            setattr(image, field, value)
+        image.derivatives_source = source_name
+        return
+    transaction.on_commit(lambda: _submit(model, image_id, source_name))
+
+
+def _submit(model, image_id, source_name):
+    try:
+        with model._meta.get_field(source_field(model)).storage.open(source_name, 'rb') as source:
+            data = source.read()
+    except OSError:
+        logger.exception('Could not read image %s', source_name)
+        return
+    try:
+        future = _get_pool().submit(render_renditions, data, RENDITION_WIDTHS)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool.
+        _discard_pool()
+        future = _get_pool().submit(render_renditions, data, RENDITION_WIDTHS)
+    future.add_done_callback(lambda done: _writer.submit(_store_future, model, image_id, source_name, done))
+
+
+def _store_future(model, image_id, source_name, future):
+    try:
+        store_derivatives(image_id, source_name, future.result(), model=model)
+    except Exception:
+        logger.exception('Could not build derivatives of image %s', source_name)
+    finally:
+        close_old_connections()
+
+
+def store_derivatives(image_id, source_name, result, model=ProductImage):
+    """
+    Write rendered renditions to storage and record them on the image row.
+
+    Every ``model`` row pointing at ``source_name`` is updated. If the row
+    was given a different file while rendering, the new upload has its own
+    job queued and the files written here are removed again unless another
+    image still uses them.
+
+    Returns:
+        bool: Whether the row was updated.
+    """
+    storage = _storage()
+    derivatives = {}
+    for rendition, rendered in result['renditions'].items():
+        entry = {'width': rendered['width'], 'height': rendered['height']}
+        for extension in FORMATS:
+            path = derivative_path(source_name, rendition, extension, directory=derivatives_dir(model))
+            if storage.exists(path):
+                storage.delete(path)
+            entry[extension] = storage.save(path, ContentFile(rendered[extension]))
+        derivatives[rendition] = entry
+
+    field = source_field(model)
+    image = model._default_manager.filter(pk=image_id, **{field: source_name}).first()
+    if image is None:
+        delete_derivative_files(derivatives, source=source_name, model=model)
+        return False
+
+    previous, previous_source = image.derivatives, image.derivatives_source
+    # Other images with the same file share these renditions too.
+    sharing = model._default_manager.filter(**{field: source_name})
+    pks = list(sharing.values_list('pk', flat=True))
+    sharing.update(
+        width=result['width'],
+        height=result['height'],
+        derivatives=derivatives,
+        derivatives_source=source_name,
+    )
+    if previous_source != source_name:
+        delete_derivative_files(previous, source=previous_source, model=model)
+
+    derivatives_stored.send(sender=model, pks=pks)
+    return True
+
+
+def delete_derivative_files(derivatives, source=None, model=ProductImage):
+    """
+    Delete the rendition files recorded in ``derivatives``, unless another
+    ``model`` row rendered from the same ``source`` file still uses them.
+    """
+    if source and model._default_manager.filter(derivatives_source=source).exists():
+        return
+    storage = _storage()
+    for entry in (derivatives or {}).values():
+        for path in _rendition_paths(entry):
+            storage.delete(path)
+
+
+def _rendition_paths(entry):
+    return [entry[extension] for extension in FORMATS if entry.get(extension)]
+
+
+def build_derivatives(images, force=False):
+    """
+    Render and store the renditions of many images in parallel, waiting for
+    all of them. Used by the ``build_image_derivatives`` command.
+
+    Only a couple of images per worker are read into memory at a time.
+
+    Args:
+        images (iterable): ProductImage instances, or rows of another model
+            recording renditions.
+        force (bool): Re-render images whose renditions are already current.
+
+    Returns:
+        tuple: Number of images processed and number that failed.
+    """
+    pool = _get_pool()
+    window = _worker_count() * 2
+    pending = deque()
+    processed = failed = 0
+
+    def finish_oldest():
+        nonlocal processed, failed
+        model, image_id, source_name, future = pending.popleft()
+        try:
+            store_derivatives(image_id, source_name, future.result(), model=model)
+            processed += 1
+        except Exception:
+            logger.exception('Could not build derivatives of image %s', source_name)
+            failed += 1
+
+    for image in images:
+        file = source_file(image)
+        if file is None or not (force or needs_derivatives(image)):
+            continue
+        with file.open('rb') as source:
+            data = source.read()
+        pending.append((type(image), image.pk, file.name, pool.submit(render_renditions, data, RENDITION_WIDTHS)))
+        if len(pending) >= window:
+            finish_oldest()
+    while pending:
+        finish_oldest()
+    return processed, failed
@@ -0,0 +1,385 @@
+"""
+Module: facets.py
+
+In-process facet index for the shopping listing.
+
+Every product gets a slot number; each category, product type and price bucket
+keeps an integer bitset of the slots that belong to it, and each sort option
+keeps a sorted list of product ids. Any combination of filters, and the counts
+shown next to every filter option, is then answered with a few integer ANDs and
+popcounts instead of a database query.
+
+The index is updated incrementally by the signals in Shop.signals, once the
+change commits, so no process ever indexes data that may still be rolled back.
+Other worker processes notice the change through a version number kept in the
+shared cache. Every version also records the id of the product it changed, so
+on the next request they re-read just those products; only a process that has
+missed changes no longer in the cache (or too many of them) rebuilds its copy
+from the database.
+"""
+import base64
+import binascii
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Product
+
+FACET_VERSION_KEY = 'shop:facet_index:version'
+FACET_CHANGES_TIMEOUT = 60 * 60  # 1 hour; processes further behind rebuild
+MAX_CHANGES = 500  # Beyond this many missed versions a rebuild is cheaper
+
+# Price buckets offered by the filter sidebar. Bounds are inclusive, matching
+# the previous ``price__range`` lookups; ``None`` means no upper bound.
+PRICE_RANGES = {
+    '0-50': (0, 50),
+    '50-100': (50, 100),
+    '100+': (100, None),
+}
+
+# Sort options exposed by the listing: the row field to sort on and whether the
+# order is descending. The product id is always the tiebreaker (in the same
+# direction) so the order is total and can be paginated with a keyset cursor.
+SORT_FIELDS = {
+    'newest': ('created_at', True),
+    'price-asc': ('price', False),
+    'price-desc': ('price', True),
+}
+DEFAULT_SORT = 'newest'
+
+FacetRow = namedtuple('FacetRow', 'id category product_type price created_at')
+FacetResult = namedtuple(
+    'FacetResult', 'ids total next_cursor category_counts type_counts price_counts'
+)
+
+
+class FacetIndex:
+    """
+    Bitset index over ``Product.category``, ``Product.product_type`` and the
+    price buckets in ``PRICE_RANGES``.
+
+    All public methods are thread-safe; a single lock guards the structures
+    since both lookups and updates only take microseconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self._clear()
+
+    def _clear(self):
+        self._rows = {}            # product id -> FacetRow
+        self._slots = {}           # product id -> slot number
+        self._free_slots = []
+        self._next_slot = 0
+        self._live = 0             # bitset of occupied slots
+        self._categories = {value: 0 for value, _ in Product.CATEGORY_CHOICES}
+        self._types = {value: 0 for value, _ in Product.TYPE_CHOICES}
+        self._prices = {bucket: 0 for bucket in PRICE_RANGES}
+        self._orders = {sort: [] for sort in SORT_FIELDS}
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def rebuild(self, version=None):
+        """
+        Load every product from the database, replacing the current contents.
+        """
+        rows = Product.objects.values_list('id', 'category', 'product_type', 'price', 'created_at')
+        with self._lock:
+            self._clear()
+            for row in rows:
+                self._add(FacetRow(*row))
+            self.version = version
+
+    def refresh(self, product_ids, version=None):
+        """
+        Re-read the given products from the database, re-indexing those that
+        still exist and dropping the others.
+        """
+        rows = Product.objects.filter(id__in=product_ids).values_list(
+            'id', 'category', 'product_type', 'price', 'created_at',
+        )
+        with self._lock:
+            for product_id in product_ids:
+                self._remove(product_id)
+            for row in rows:
+                self._add(FacetRow(*row))
+            self.version = version
+
+    def upsert(self, product):
+        """
+        Add a product to the index, or re-index it if it is already present.
+        """
+        row = FacetRow(product.id, product.category, product.product_type, product.price, product.created_at)
+        with self._lock:
+            self._remove(row.id)
+            self._add(row)
+
+    def discard(self, product_id):
+        """
+        Remove a product from the index. Unknown ids are ignored.
+        """
+        with self._lock:
+            self._remove(product_id)
+
+    def _add(self, row):
+        slot = self._free_slots.pop() if self._free_slots else self._allocate_slot()
+        bit = 1 << slot
+        self._rows[row.id] = row
+        self._slots[row.id] = slot
+        self._live |= bit
+        if row.category in self._categories:
+            self._categories[row.category] |= bit
+        if row.product_type in self._types:
+            self._types[row.product_type] |= bit
+        for bucket in price_buckets(row.price):
+            self._prices[bucket] |= bit
+        for sort in SORT_FIELDS:
+            insort(self._orders[sort], sort_key(row, sort))
+
+    def _allocate_slot(self):
+        slot = self._next_slot
+        self._next_slot += 1
+        return slot
+
+    def _remove(self, product_id):
+        row = self._rows.pop(product_id, None)
+        if row is None:
+            return
+        slot = self._slots.pop(product_id)
+        mask = ~(1 << slot)
+        self._live &= mask
+        for bitsets in (self._categories, self._types, self._prices):
+            for value in bitsets:
+                bitsets[value] &= mask
+        for sort in SORT_FIELDS:
+            order = self._orders[sort]
+            del order[bisect_left(order, sort_key(row, sort))]
+        self._free_slots.append(slot)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def search(self, categories=(), types=(), price=None, sort=DEFAULT_SORT, after=None, limit=None,
+               product_ids=None):
+        """
+        Resolve a filter combination.
+
+        Args:
+            categories (iterable): Selected ``Product.category`` values (OR-ed).
+            types (iterable): Selected ``Product.product_type`` values (OR-ed).
+            price (str): Optional key of ``PRICE_RANGES``.
+            sort (str): Key of ``SORT_FIELDS``.
+            after (str): Cursor returned with the previous page, if any.
+            limit (int): Maximum number of ids to return; ``None`` for all.
+            product_ids (iterable): Optional set of ids every result (and
+                every count) is restricted to, e.g. from a database filter.
+
+        Returns:
+            FacetResult: The page of matching product ids in display order, the
+            total number of matches, the cursor of the next page (or ``None``),
+            and for every facet value the number of products the listing would
+            show if that value were selected alongside the other groups.
+        """
+        if sort not in SORT_FIELDS:
+            sort = DEFAULT_SORT
+        position_key = decode_cursor(after, sort)
+
+        with self._lock:
+            restrict_mask = self._live if product_ids is None else self._mask_of(product_ids)
+            category_mask = self._union(self._categories, categories) & restrict_mask
+            type_mask = self._union(self._types, types) & restrict_mask
+            price_mask = self._prices.get(price, self._live) if price else self._live
+            mask = category_mask & type_mask & price_mask
+
+            # Seek straight to the cursor position, then walk forward until
+            # the page is full.
+            order = self._orders[sort]
+            start = bisect_right(order, position_key) if position_key else 0
+            ids = []
+            next_cursor = None
+            for index in range(start, len(order)):
+                product_id = order[index][-1]
+                if not mask >> self._slots[product_id] & 1:
+                    continue
+                if limit is not None and len(ids) == limit:
+                    next_cursor = encode_cursor(self._rows[ids[-1]], sort)
+                    break
+                ids.append(product_id)
+
+            return FacetResult(
+                ids=ids,
+                total=mask.bit_count(),
+                next_cursor=next_cursor,
+                category_counts={value: (bits & type_mask & price_mask).bit_count()
+                                 for value, bits in self._categories.items()},
+                type_counts={value: (bits & category_mask & price_mask).bit_count()
+                             for value, bits in self._types.items()},
+                price_counts={bucket: (bits & category_mask & type_mask).bit_count()
+                              for bucket, bits in self._prices.items()},
+            )
+
+    def _mask_of(self, product_ids):
+        # Set the bits in a byte buffer first; OR-ing one bit at a time into a
+        # big int would copy the whole int for every id.
+        buffer = bytearray((self._next_slot + 7) // 8)
+        for product_id in product_ids:
+            slot = self._slots.get(product_id)
+            if slot is not None:
+                buffer[slot >> 3] |= 1 << (slot & 7)
+        return int.from_bytes(buffer, 'little')
+
+    def _union(self, bitsets, selected):
+        selected = [value for value in selected if value in bitsets]
+        if not selected:
+            return self._live
+        mask = 0
+        for value in selected:
+            mask |= bitsets[value]
+        return mask
+
+
+def price_buckets(price):
+    """
+    Return the ``PRICE_RANGES`` keys a price falls into.
+    """
+    return [
+        bucket for bucket, (low, high) in PRICE_RANGES.items()
+        if price >= low and (high is None or price <= high)
+    ]
+
+
+def sort_key(row, sort):
+    """
+    Return the position of a row in the ``sort`` order, as a tuple that
+    compares the way the listing is ordered and ends with the product id.
+    """
+    field, descending = SORT_FIELDS[sort]
+    value = _sort_value(getattr(row, field))
+    if descending:
+        return (-value, -row.id, row.id)
+    return (value, row.id, row.id)
+
+
+def _sort_value(value):
+    # Datetimes are compared by their timestamp so the key can be negated.
+    return value.timestamp() if hasattr(value, 'timestamp') else Decimal(value)
+
+
+def encode_cursor(row, sort):
+    """
+    Encode the keyset position just after ``row`` as an opaque string.
+    """
+    field, _ = SORT_FIELDS[sort]
+    raw = f'{_sort_value(getattr(row, field))}:{row.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """
+    Turn a cursor produced by ``encode_cursor`` back into a sort key.
+
+    Returns ``None`` for a missing or malformed cursor, which callers treat as
+    the first page.
+    """
+    if not cursor:
+        return None
+    field, descending = SORT_FIELDS[sort]
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        value, product_id = raw.rsplit(':', 1)
+        value = float(value) if field == 'created_at' else Decimal(value)
+        product_id = int(product_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, InvalidOperation):
+        return None
+    if not Decimal(value).is_finite():
+        return None
+    if descending:
+        return (-value, -product_id, product_id)
+    return (value, product_id, product_id)
+
+
+_index = FacetIndex()
+
+
+def changes_key(version):
+    return f'shop:facet_index:changes:{version}'
+
+
+def get_facet_index():
+    """
+    Return this process's facet index, first bringing it up to date if another
+    process changed the catalog since it was last updated.
+    """
+    version = cache.get(FACET_VERSION_KEY, 0)
+    if _index.version != version:
+        _catch_up(version)
+    return _index
+
+
+def _catch_up(version):
+    """
+    Apply the changes recorded for the versions this process has not seen
+    yet, or rebuild the index when they are not all available.
+    """
+    current = _index.version
+    if current is None or not 0 < version - current <= MAX_CHANGES:
+        _index.rebuild(version)
+        return
+    keys = [changes_key(missed) for missed in range(current + 1, version + 1)]
+    changes = cache.get_many(keys)
+    if len(changes) < len(keys):
+        _index.rebuild(version)
+        return
+    _index.refresh({product_id for product_ids in changes.values() for product_id in product_ids}, version)
+
+
+def index_product(product):
+    """
+    Re-index a saved product in this process and notify the other processes,
+    once the current transaction commits.
+    """
+    def upsert():
+        _index.upsert(product)
+        _bump_version(product.pk)
+
+    transaction.on_commit(upsert)
+
+
+def unindex_product(product_id):
+    """
+    Drop a deleted product from this process's index and notify the others,
+    once the current transaction commits.
+    """
+    def discard():
+        _index.discard(product_id)
+        _bump_version(product_id)
+
+    transaction.on_commit(discard)
+
+
+def _bump_version(product_id):
+    """
+    Record a change to one product so other processes re-read it.
+
+    The local index has already been updated incrementally, so it adopts the
+    new version instead of catching up.
+    """
+    previous = _index.version
+    try:
+        version = cache.incr(FACET_VERSION_KEY)
+    except ValueError:
+        cache.add(FACET_VERSION_KEY, 0, None)
+        version = cache.incr(FACET_VERSION_KEY)
+    # A process that reads the new version before this is stored rebuilds.
+    cache.set(changes_key(version), [product_id], FACET_CHANGES_TIMEOUT)
+    # Only skip the rebuild if nobody else changed the catalog in between.
+    if previous is not None and version == previous + 1:
+        _index.version = version
@@ -0,0 +1,47 @@
+"""
+Module: build_image_derivatives.py
+
+Management command rendering the responsive renditions of existing product
+images, and of the other images recorded the same way (e.g. the homepage's),
+after deploying the derivative pipeline or changing the rendition widths.
+"""
+from django.core.management.base import BaseCommand
+
+from itertools import chain
+
+from Shop.derivatives import build_derivatives, rendered_models
+from Shop.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Render WebP and JPEG renditions of product and homepage images that do not have current ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-render every image, even those whose renditions are current.',
+        )
+        parser.add_argument(
+            '--product',
+            type=int,
+            action='append',
+            dest='products',
+            help='Only process product images of this product id (may be repeated).',
+        )
+
+    def handle(self, *args, **options):
+        images = ProductImage.objects.order_by('id')
+        others = []
+        if options['products']:
+            images = images.filter(product_id__in=options['products'])
+        else:
+            others = [model._default_manager.order_by('pk') for model in rendered_models() if model is not ProductImage]
+
+        processed, failed = build_derivatives(
+            chain.from_iterable(queryset.iterator() for queryset in [images, *others]), force=options['force'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(f'Rendered derivatives of {processed} image(s).'))
+        if failed:
+            self.stderr.write(self.style.ERROR(f'{failed} image(s) failed; see the log for details.'))
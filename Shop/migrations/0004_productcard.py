@@ -0,0 +1,74 @@
+# Generated by Django 5.1.7 on 2026-10-16 22:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max, Min, Sum
+
+
+def build_product_cards(apps, schema_editor):
+    """
+    Backfill a ProductCard for every existing product.
+    """
+    Product = apps.get_model('Shop', 'Product')
+    ProductCard = apps.get_model('Shop', 'ProductCard')
+    ProductVariant = apps.get_model('Shop', 'ProductVariant')
+    ProductImage = apps.get_model('Shop', 'ProductImage')
+
+    for product in Product.objects.iterator():
+        image = ProductImage.objects.filter(product=product).order_by('order', 'id') \
+            .values_list('image', flat=True).first() or ''
+        variants = ProductVariant.objects.filter(product=product)
+        prices = variants.aggregate(min_price=Min('price'), max_price=Max('price'))
+        in_stock = variants.filter(stock__gt=0)
+        ProductCard.objects.create(
+            product=product,
+            name=product.name,
+            price=product.price,
+            category=product.category,
+            product_type=product.product_type,
+            created_at=product.created_at,
+            primary_image=image,
+            thumbnail=image,
+            min_price=prices['min_price'],
+            max_price=prices['max_price'],
+            total_stock=in_stock.aggregate(total=Sum('stock'))['total'] or 0,
+            sizes=sorted(set(in_stock.values_list('size__code', flat=True))),
+            colors=[
+                {'code': code, 'name': name}
+                for code, name in in_stock.values_list('color__code', 'color__name').distinct().order_by('color__name')
+            ],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Shop', '0003_alter_productvariant_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='Shop.product')),
+                ('name', models.CharField(max_length=255)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('category', models.CharField(choices=[('MEN', "Men's"), ('WOMEN', "Women's"), ('KIDS', "Kids'")], max_length=5)),
+                ('product_type', models.CharField(choices=[('SNEAKERS', 'Sneakers'), ('BOOTS', 'Boots'), ('SANDALS', 'Sandals'), ('FLATSHOES', 'Flat Shoes'), ('CASUALSHOES', 'Casual Shoes'), ('SLIPER AND FLIP FLOPS', 'Slipper and Flip Flops'), ('UNIFORMSHOES', 'Uniform Shoes')], max_length=25)),
+                ('created_at', models.DateTimeField()),
+                ('primary_image', models.CharField(blank=True, help_text='Storage path of the first product image', max_length=255)),
+                ('thumbnail', models.CharField(blank=True, help_text='Storage path of the image used on listing cards', max_length=255)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('total_stock', models.PositiveIntegerField(default=0)),
+                ('sizes', models.JSONField(default=list, help_text='Size codes with stock')),
+                ('colors', models.JSONField(default=list, help_text="[{'code': ..., 'name': ...}] of colors with stock")),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Product Card',
+                'verbose_name_plural': 'Product Cards',
+            },
+        ),
+        migrations.RunPython(build_product_cards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-16 22:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Shop', '0004_productcard'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['size', 'product'], name='variant_size_in_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['color', 'product'], name='variant_color_in_stock_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.7 on 2026-10-16 22:39
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+TYPE_LABELS = [
+    ('SNEAKERS', 'Sneakers'),
+    ('BOOTS', 'Boots'),
+    ('SANDALS', 'Sandals'),
+    ('FLATSHOES', 'Flat Shoes'),
+    ('CASUALSHOES', 'Casual Shoes'),
+    ('SLIPER AND FLIP FLOPS', 'Slipper and Flip Flops'),
+    ('UNIFORMSHOES', 'Uniform Shoes'),
+]
+
+
+def _type_label_sql():
+    cases = ' '.join(f"WHEN '{value}' THEN '{label}'" for value, label in TYPE_LABELS)
+    return f'CASE product_type {cases} ELSE product_type END'
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Create the backend-specific search structure and fill it for existing
+    products: a GIN index over the weighted tsvector on PostgreSQL, an FTS5
+    table on SQLite.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'UPDATE "Shop_product" SET search_vector = '
+            "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+            f"setweight(to_tsvector('english', {_type_label_sql()}), 'B') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'C')"
+        )
+        schema_editor.execute(
+            'CREATE INDEX "product_search_vector_gin" ON "Shop_product" USING gin (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS shop_product_fts '
+            "USING fts5(name, product_type, description, tokenize = 'porter unicode61')"
+        )
+        schema_editor.execute(
+            'INSERT INTO shop_product_fts (rowid, name, product_type, description) '
+            f'SELECT id, name, {_type_label_sql()}, description FROM "Shop_product"'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS "product_search_vector_gin"')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS shop_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Shop', '0005_productvariant_in_stock_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
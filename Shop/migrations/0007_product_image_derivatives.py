@@ -0,0 +1,51 @@
+# Generated by Django 5.1.7 on 2026-10-16 22:44
+
+from django.db import migrations, models
+
+
+def backfill_card_pictures(apps, schema_editor):
+    """
+    Point existing cards at their original image until the renditions are
+    built with ``manage.py build_image_derivatives``.
+    """
+    ProductCard = apps.get_model('Shop', 'ProductCard')
+    cards = list(ProductCard.objects.exclude(primary_image=''))
+    for card in cards:
+        card.picture = {'src': card.primary_image, 'width': None, 'height': None, 'renditions': {}}
+    ProductCard.objects.bulk_update(cards, ['picture'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Shop', '0006_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcard',
+            name='picture',
+            field=models.JSONField(blank=True, default=dict, help_text='picture_data() of the first product image'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text="Rendition name -> {'width', 'height', 'webp', 'jpeg'} storage paths"),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='derivatives_source',
+            field=models.CharField(blank=True, editable=False, help_text='Image path the derivatives were rendered from', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_card_pictures, migrations.RunPython.noop),
+    ]
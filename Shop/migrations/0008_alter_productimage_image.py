@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-16 22:47
+
+import Media.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Shop', '0007_product_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=Media.storage.ContentAddressedStorage(), upload_to='products/'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 from django.core.validators import RegexValidator
+from django.contrib.postgres.search import SearchVectorField
+from Media.storage import content_storage
 
 # Color model: stores available color options.
 class Color(models.Model):
@@ -96,6 +98,10 @@ class Product(models.Model):
     category = models.CharField(max_length=5, choices=CATEGORY_CHOICES)
     product_type = models.CharField(max_length=25, choices=TYPE_CHOICES)                 
     created_at = models.DateTimeField(auto_now_add=True)        
+    # Weighted full-text document (name > type > description) maintained by
+    # Shop.search on PostgreSQL, where it has a GIN index created in the
+    # migration. Unused on SQLite, which searches an FTS5 table instead.
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return self.name
@@ -115,11 +121,25 @@ class ProductImage(models.Model):
         on_delete=models.CASCADE, 
         related_name='images'
     )
-    image = models.ImageField(upload_to='products/')
+    image = models.ImageField(upload_to='products/', storage=content_storage)
     order = models.PositiveIntegerField(
         default=0,
         help_text="Numerical order for image display"
     )
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Rendition name -> {'width', 'height', 'webp', 'jpeg'} storage paths"
+    )
+    derivatives_source = models.CharField(
+        max_length=255,
+        blank=True,
+        editable=False,
+        help_text="Image path the derivatives were rendered from"
+    )
 
     class Meta:
         ordering = ['order']
@@ -129,6 +149,11 @@ class ProductImage(models.Model):
     def __str__(self):
         return f"Image {self.order} for {self.product.name}"
 
+    @property
+    def picture(self):
+        """Storage paths and dimensions used by the ``responsive_image`` tag."""
+        return picture_data(self.image.name, self.width, self.height, self.derivatives)
+
 # ProductVariant model: stores variations of products based on size and color.
 class ProductVariant(models.Model):
     """
@@ -147,6 +172,96 @@ class ProductVariant(models.Model):
 
     class Meta:
         unique_together = ['product', 'color', 'size']  # Ensures unique combinations
+        indexes = [
+            # Partial indexes over in-stock variants only, used by the size and
+            # color availability filters on the shopping listing.
+            models.Index(
+                fields=['size', 'product'],
+                condition=models.Q(stock__gt=0),
+                name='variant_size_in_stock_idx'
+            ),
+            models.Index(
+                fields=['color', 'product'],
+                condition=models.Q(stock__gt=0),
+                name='variant_color_in_stock_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.color.name} - Size {self.size} (Stock: {self.stock})"
+
+# ProductCard model: denormalized listing data for each product.
+class ProductCard(models.Model):
+    """
+    Read model holding everything a listing card needs for one product.
+    Rows are maintained by the signals in Shop.signals so that listing pages
+    render from this single table instead of joining images and variants.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='card'
+    )
+    name = models.CharField(max_length=255)
+    price = models.DecimalField(max_digits=8, decimal_places=2)
+    category = models.CharField(max_length=5, choices=Product.CATEGORY_CHOICES)
+    product_type = models.CharField(max_length=25, choices=Product.TYPE_CHOICES)
+    created_at = models.DateTimeField()
+    primary_image = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Storage path of the first product image"
+    )
+    thumbnail = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Storage path of the image used on listing cards"
+    )
+    picture = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="picture_data() of the first product image"
+    )
+    min_price = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    total_stock = models.PositiveIntegerField(default=0)
+    sizes = models.JSONField(default=list, help_text="Size codes with stock")
+    colors = models.JSONField(default=list, help_text="[{'code': ..., 'name': ...}] of colors with stock")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Product Card'
+        verbose_name_plural = 'Product Cards'
+
+    def __str__(self):
+        return f"Card for {self.name}"
+
+    @property
+    def in_stock(self):
+        return self.total_stock > 0
+
+    @property
+    def primary_image_url(self):
+        return _image_url(self.primary_image)
+
+    @property
+    def thumbnail_url(self):
+        return _image_url(self.thumbnail)
+
+
+def _image_url(path):
+    """Resolve a stored ProductImage path to a URL with the field's storage."""
+    if not path:
+        return ''
+    return ProductImage._meta.get_field('image').storage.url(path)
+
+
+def picture_data(src, width=None, height=None, derivatives=None):
+    """
+    Bundle an image path with its dimensions and rendition paths in the plain
+    dict the ``responsive_image`` template tag renders.
+    """
+    if not src:
+        return {}
+    return {'src': src, 'width': width, 'height': height, 'renditions': derivatives or {}}
@@ -0,0 +1,69 @@
+"""
+Module: renditions.py
+
+Pillow code that turns one uploaded product photo into the resized WebP and
+JPEG renditions served to browsers.
+
+This module runs inside the worker processes of the derivative pool (see
+Shop.derivatives), which are started with the ``spawn`` method, so it must not
+import Django or any model.
+"""
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# Rendition name -> target width in pixels. Chosen for the places the images
+# are shown at 2x density: cart/order thumbnails and the detail thumbnail strip
+# (80px), listing cards (~240px), the detail gallery (~480px) and full-screen
+# zoom.
+RENDITION_WIDTHS = {
+    'thumb': 160,
+    'card': 480,
+    'detail': 960,
+    'zoom': 1600,
+}
+
+# Output format -> (Pillow format name, save options).
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def render_renditions(data, widths=RENDITION_WIDTHS):
+    """
+    Resize an image to every rendition width in every output format.
+
+    The EXIF orientation of phone photos is applied first so the renditions
+    (and the recorded dimensions) are upright. Images are never upscaled: a
+    rendition wider than the source is rendered at the source width.
+
+    Args:
+        data (bytes): The original image file.
+        widths (dict): Rendition name -> target width.
+
+    Returns:
+        dict: ``width`` and ``height`` of the upright source, and
+        ``renditions``: name -> ``{'width', 'height', 'webp', 'jpeg'}`` where
+        the format keys hold the encoded file bytes.
+    """
+    with Image.open(BytesIO(data)) as original:
+        source = ImageOps.exif_transpose(original)
+        if source.mode != 'RGB':
+            source = source.convert('RGB')
+        source_width, source_height = source.size
+
+        renditions = {}
+        for name, target_width in widths.items():
+            width = min(target_width, source_width)
+            height = max(1, round(source_height * width / source_width))
+            resized = source if width == source_width else source.resize((width, height), Image.LANCZOS)
+
+            rendition = {'width': width, 'height': height}
+            for extension, (image_format, options) in FORMATS.items():
+                buffer = BytesIO()
+                resized.save(buffer, image_format, **options)
+                rendition[extension] = buffer.getvalue()
+            renditions[name] = rendition
+
+    return {'width': source_width, 'height': source_height, 'renditions': renditions}
@@ -0,0 +1,202 @@
+"""
+Module: search.py
+
+Full-text product search.
+
+On PostgreSQL every product keeps a weighted ``tsvector`` in
+``Product.search_vector`` (name A, product type B, description C) behind a GIN
+index. On SQLite, which the bundled ``db.sqlite3`` uses, the same three
+columns live in the ``shop_product_fts`` FTS5 table and are ranked with bm25
+using matching weights. Both are kept current by the Product signals in
+Shop.signals, and both return ranked product ids with highlighted snippets.
+"""
+from collections import namedtuple
+
+from django.contrib.postgres.search import (
+    SearchHeadline,
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import connection
+from django.db.models import F, Value
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Product
+
+FTS_TABLE = 'shop_product_fts'
+SEARCH_CONFIG = 'english'
+DEFAULT_LIMIT = 48
+
+# Control characters used as highlight markers inside the database so the
+# surrounding text can be HTML-escaped before the markers become <mark> tags.
+_START, _STOP = '\x02', '\x03'
+
+SearchHit = namedtuple('SearchHit', 'product_id rank name_html snippet_html')
+
+
+def _uses_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def _type_label(product_type):
+    return dict(Product.TYPE_CHOICES).get(product_type, product_type or '')
+
+
+def _highlight(text):
+    """Escape database text and turn the highlight markers into <mark> tags."""
+    html = escape(text or '').replace(_START, '<mark>').replace(_STOP, '</mark>')
+    return mark_safe(html)
+
+
+# ----------------------------------------------------------------------
+# Index maintenance
+# ----------------------------------------------------------------------
+
+def _search_vector(product_type):
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Value(_type_label(product_type)), weight='B', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def index_product_text(product):
+    """
+    Store the searchable text of a saved product.
+    """
+    if _uses_postgres():
+        Product.objects.filter(pk=product.pk).update(search_vector=_search_vector(product.product_type))
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, product_type, description) VALUES (%s, %s, %s, %s)',
+            [product.pk, product.name, _type_label(product.product_type), product.description],
+        )
+
+
+def remove_product_text(product_id):
+    """
+    Drop a deleted product from the SQLite search table. On PostgreSQL the
+    vector is deleted together with the row.
+    """
+    if _uses_postgres():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product_id])
+
+
+def rebuild_search_index():
+    """
+    Re-index every product, e.g. after bulk changes that bypass signals.
+    """
+    if _uses_postgres():
+        for value, _ in Product.TYPE_CHOICES:
+            Product.objects.filter(product_type=value).update(search_vector=_search_vector(value))
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, product_type, description) VALUES (%s, %s, %s, %s)',
+            [
+                (pk, name, _type_label(product_type), description)
+                for pk, name, product_type, description
+                in Product.objects.values_list('pk', 'name', 'product_type', 'description').iterator()
+            ],
+        )
+
+
+# ----------------------------------------------------------------------
+# Queries
+# ----------------------------------------------------------------------
+
+def search_products(query, limit=DEFAULT_LIMIT):
+    """
+    Run a ranked full-text search.
+
+    Args:
+        query (str): Free text as typed by the user.
+        limit (int): Maximum number of hits; ``None`` for all.
+
+    Returns:
+        list[SearchHit]: Best matches first, with the product name and a
+        description snippet as safe HTML where matches are wrapped in <mark>.
+    """
+    query = (query or '').strip()
+    if not query:
+        return []
+    if _uses_postgres():
+        return _search_postgres(query, limit)
+    return _search_sqlite(query, limit)
+
+
+def filter_products(queryset, query):
+    """
+    Narrow a Product queryset to the products matching ``query``, in SQL:
+    the match is a condition or subquery of the same statement, so no id
+    list goes through Python however many products match. The queryset
+    keeps its own ordering.
+    """
+    query = (query or '').strip()
+    if not query:
+        return queryset.none()
+    if _uses_postgres():
+        return queryset.filter(search_vector=SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG))
+    return queryset.filter(id__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [_fts5_query(query)],
+    ))
+
+
+def _search_postgres(query, limit):
+    search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+    rows = Product.objects.filter(search_vector=search_query) \
+        .annotate(
+            rank=SearchRank(F('search_vector'), search_query),
+            name_headline=SearchHeadline(
+                'name', search_query, config=SEARCH_CONFIG,
+                start_sel=_START, stop_sel=_STOP, highlight_all=True,
+            ),
+            snippet=SearchHeadline(
+                'description', search_query, config=SEARCH_CONFIG,
+                start_sel=_START, stop_sel=_STOP, max_words=25, min_words=10,
+            ),
+        ) \
+        .order_by('-rank', 'id') \
+        .values_list('id', 'rank', 'name_headline', 'snippet')
+    if limit is not None:
+        rows = rows[:limit]
+    return [SearchHit(pk, rank, _highlight(name), _highlight(snippet)) for pk, rank, name, snippet in rows]
+
+
+def _fts5_query(query):
+    """
+    Quote every word so user input cannot use FTS5 query syntax, and match
+    the last word as a prefix for search-as-you-type.
+    """
+    terms = ['"{}"'.format(term.replace('"', '""')) for term in query.split()]
+    if terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _search_sqlite(query, limit):
+    sql = (
+        f'SELECT rowid, bm25({FTS_TABLE}, 10.0, 4.0, 1.0) AS score, '
+        f"highlight({FTS_TABLE}, 0, '{_START}', '{_STOP}'), "
+        f"snippet({FTS_TABLE}, 2, '{_START}', '{_STOP}', '...', 25) "
+        f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY score, rowid'
+    )
+    params = [_fts5_query(query)]
+    if limit is not None:
+        sql += ' LIMIT %s'
+        params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    # bm25() is lower-is-better; flip it so rank means the same on both backends.
+    return [SearchHit(pk, -score, _highlight(name), _highlight(snippet)) for pk, score, name, snippet in rows]
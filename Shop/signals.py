@@ -0,0 +1,131 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Product, ProductImage, ProductVariant, Color, Size
+from .facets import index_product, unindex_product
+from .cards import schedule_card_refresh
+from .variant_matrix import invalidate_variant_matrix
+from .catalog import bump_catalog_generation
+from .availability import STOCK_TAG
+from Mazlofootwear.cache_tags import invalidate_tags
+from .search import index_product_text, remove_product_text
+from .derivatives import derivatives_stored, schedule_derivatives, delete_derivative_files
+from django.db import transaction
+
+"""
+Module: signals.py
+
+This module keeps the in-process catalog structures, the ProductCard read
+model, the cached variant matrices and the product image renditions in sync with the database when products,
+their images or their variants are created, updated, or deleted, and bumps the
+catalog generation so cached listing pages go stale.
+"""
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, **kwargs):
+    """
+    Signal handler to re-index a product in the facet and full-text indexes
+    after it is saved and refresh its card and detail page data.
+    """
+    index_product(instance)
+    index_product_text(instance)
+    schedule_card_refresh(instance.pk)
+    invalidate_variant_matrix(instance.pk)
+    bump_catalog_generation()
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_on_delete(sender, instance, **kwargs):
+    """
+    Signal handler to drop a deleted product from the facet and full-text
+    indexes and the detail page cache.
+    """
+    unindex_product(instance.pk)
+    remove_product_text(instance.pk)
+    invalidate_variant_matrix(instance.pk)
+    bump_catalog_generation()
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=ProductVariant)
+def refresh_card_on_child_change(sender, instance, **kwargs):
+    """
+    Signal handler to rebuild a product's card and drop its variant matrix
+    when one of its images or variants changes.
+    """
+    schedule_card_refresh(instance.product_id)
+    invalidate_variant_matrix(instance.product_id)
+    bump_catalog_generation()
+
+
+@receiver(post_save, sender=ProductImage)
+def render_image_derivatives(sender, instance, **kwargs):
+    """
+    Signal handler to render the responsive renditions of a newly uploaded
+    or replaced product image.
+    """
+    schedule_derivatives(instance)
+
+
+@receiver(post_delete, sender=ProductImage)
+def delete_image_derivatives(sender, instance, **kwargs):
+    """
+    Signal handler to remove the rendition files of a deleted product image.
+    """
+    derivatives, source = instance.derivatives, instance.derivatives_source
+    transaction.on_commit(lambda: delete_derivative_files(derivatives, source=source))
+
+
+@receiver(derivatives_stored, sender=ProductImage)
+def refresh_cards_on_derivatives(sender, pks, **kwargs):
+    """
+    Signal handler to rebuild the cards and drop the variant matrices of the
+    products whose images got new renditions.
+    """
+    for product_id in set(ProductImage.objects.filter(pk__in=pks).values_list('product_id', flat=True)):
+        schedule_card_refresh(product_id)
+        invalidate_variant_matrix(product_id)
+    bump_catalog_generation()
+
+
+@receiver(post_save, sender=Color)
+@receiver(post_save, sender=Size)
+def refresh_cards_on_option_change(sender, instance, **kwargs):
+    """
+    Signal handler to rebuild the cards and variant matrices that display a
+    renamed color or size.
+    """
+    lookup = 'color' if sender is Color else 'size'
+    product_ids = ProductVariant.objects.filter(**{lookup: instance}).values_list('product_id', flat=True).distinct()
+    for product_id in product_ids:
+        schedule_card_refresh(product_id)
+        invalidate_variant_matrix(product_id)
+    bump_catalog_generation()
+
+
+@receiver(post_delete, sender=Color)
+@receiver(post_delete, sender=Size)
+def bump_generation_on_option_delete(sender, instance, **kwargs):
+    """
+    Signal handler to expire cached catalog pages when a color or size is
+    deleted. The variants using it are deleted by cascade and handled above.
+    """
+    bump_catalog_generation()
+
+
+def products_changed(product_ids):
+    """
+    Refresh what shows the stock of products whose variants' stock was
+    changed with ``update()`` or ``bulk_update()``, which send no signals:
+    rebuild their cards and variant matrices and expire the cached in-stock
+    filter results.
+
+    Stock changes with every order, so unlike catalog edits they do not
+    start a new catalog generation: cached listings, search results and the
+    suggest index stay warm. Callers that also change prices or attributes
+    must call ``bump_catalog_generation`` themselves.
+    """
+    for product_id in set(product_ids):
+        schedule_card_refresh(product_id)
+        invalidate_variant_matrix(product_id)
+    invalidate_tags([STOCK_TAG])
@@ -0,0 +1,134 @@
+"""
+Module: suggest.py
+
+In-process prefix index for the navbar search typeahead.
+
+Product names, category labels and product type labels are normalized and
+stored in one sorted list of ``(key, entry number)`` pairs, with one key per
+word start so "run" finds "Trail Runner". A lookup is a ``bisect`` to the
+first key with the typed prefix followed by a bounded scan, ranked by a
+popularity weight (units sold for products, product count for categories and
+types). The index is rebuilt when the catalog generation changes, and at least
+every ``MAX_AGE`` seconds so popularity stays current.
+"""
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.db.models import Count, Sum
+from django.urls import reverse
+
+from .catalog import get_catalog_generation
+from .models import Product
+
+MAX_AGE = 60 * 60  # Rebuild at least hourly to pick up new sales
+MAX_SCAN = 1000    # Upper bound on keys inspected per lookup
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+
+Suggestion = namedtuple('Suggestion', 'kind label url weight')
+
+_WORD = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Lower-case text and collapse everything but word characters to single spaces."""
+    return ' '.join(_WORD.findall((text or '').lower()))
+
+
+def _word_starts(label):
+    """Yield the normalized label from each of its word boundaries onward."""
+    words = normalize(label).split()
+    for position in range(len(words)):
+        yield ' '.join(words[position:])
+
+
+class SuggestIndex:
+    """
+    Sorted-array prefix index. Built in one pass and then read-only, so
+    lookups need no lock; a rebuild swaps in a new instance.
+    """
+
+    def __init__(self, suggestions, generation=None):
+        self.generation = generation
+        self.built_at = time.monotonic()
+        self._suggestions = suggestions
+        self._keys = sorted(
+            (key, number)
+            for number, suggestion in enumerate(suggestions)
+            for key in _word_starts(suggestion.label)
+        )
+
+    @classmethod
+    def build(cls, generation=None):
+        """
+        Load products, categories and product types with their popularity.
+        """
+        suggestions = []
+
+        products = Product.objects.annotate(sold=Sum('variants__orderitem__quantity')) \
+            .values_list('id', 'name', 'sold')
+        for product_id, name, sold in products:
+            suggestions.append(Suggestion(
+                'product', name, reverse('productdetails', args=[product_id]), sold or 0
+            ))
+
+        category_counts = dict(Product.objects.values_list('category').annotate(n=Count('id')))
+        for value, label in Product.CATEGORY_CHOICES:
+            suggestions.append(Suggestion(
+                'category', label, f"{reverse('shopping')}?category={value}", category_counts.get(value, 0)
+            ))
+
+        type_counts = dict(Product.objects.values_list('product_type').annotate(n=Count('id')))
+        for value, label in Product.TYPE_CHOICES:
+            suggestions.append(Suggestion(
+                'type', label, f"{reverse('shopping')}?type={value}", type_counts.get(value, 0)
+            ))
+
+        return cls(suggestions, generation)
+
+    def lookup(self, prefix, limit=DEFAULT_LIMIT):
+        """
+        Return up to ``limit`` suggestions whose label has a word starting
+        with ``prefix``, most popular first.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        start = bisect_left(self._keys, (prefix,))
+        matches = set()
+        for key, number in self._keys[start:start + MAX_SCAN]:
+            if not key.startswith(prefix):
+                break
+            matches.add(number)
+
+        best = heapq.nlargest(
+            limit, matches,
+            key=lambda number: (self._suggestions[number].weight, -len(self._suggestions[number].label)),
+        )
+        return [self._suggestions[number] for number in best]
+
+
+_index = None
+_build_lock = threading.Lock()
+
+
+def get_suggest_index():
+    """
+    Return this process's suggest index, rebuilding it if the catalog changed
+    or it is older than ``MAX_AGE``.
+    """
+    global _index
+    generation = get_catalog_generation()
+    index = _index
+    if index is None or index.generation != generation or time.monotonic() - index.built_at > MAX_AGE:
+        with _build_lock:
+            # Another thread may have rebuilt it while we waited.
+            index = _index
+            if index is None or index.generation != generation or time.monotonic() - index.built_at > MAX_AGE:
+                index = _index = SuggestIndex.build(generation)
+    return index
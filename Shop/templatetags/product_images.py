@@ -0,0 +1,84 @@
+"""
+Module: product_images.py
+
+Template tag rendering product images with their responsive renditions.
+
+Usage::
+
+    {% load product_images %}
+    {% responsive_image product.picture sizes="(min-width: 1024px) 25vw, 50vw" alt=product.name class="w-full h-64 object-cover" %}
+
+``picture`` is a ``picture_data()`` dict (``ProductCard.picture``,
+``ProductImage.picture`` or the ``picture`` of a variant matrix image) or a
+ProductImage itself. The tag emits a ``<picture>`` with a WebP ``<source>`` and
+a JPEG ``<img>``, both with ``srcset``/``sizes``, and ``width``/``height`` so
+the browser reserves the right space before the image loads. Images whose
+renditions have not been rendered yet fall back to the original file.
+"""
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from Shop.models import ProductImage
+from Shop.renditions import RENDITION_WIDTHS
+
+register = template.Library()
+
+
+def _url(path):
+    return ProductImage._meta.get_field('image').storage.url(path)
+
+
+def _rendition_url(path):
+    return default_storage.url(path)
+
+
+def _srcset(renditions, extension):
+    """Return a ``srcset`` value listing each distinct rendition width once."""
+    entries = {}
+    for name in RENDITION_WIDTHS:
+        rendition = renditions.get(name)
+        if rendition and rendition.get(extension):
+            entries.setdefault(rendition['width'], _rendition_url(rendition[extension]))
+    return ', '.join(f'{url} {width}w' for width, url in sorted(entries.items()))
+
+
+@register.simple_tag
+def responsive_image(picture, sizes='100vw', rendition='card', alt='', loading='lazy', **attrs):
+    """
+    Render an image with WebP and JPEG ``srcset`` candidates.
+
+    Args:
+        picture: ``picture_data()`` dict or ProductImage.
+        sizes (str): The ``sizes`` attribute, i.e. how wide the image is shown.
+        rendition (str): Rendition used for ``src`` (and ``width``/``height``)
+            in browsers that ignore ``srcset``.
+        alt (str): Alternative text.
+        loading (str): ``lazy`` or ``eager``; use eager above the fold.
+        **attrs: Extra attributes for the ``<img>``, e.g. ``class`` or ``id``.
+    """
+    if isinstance(picture, ProductImage):
+        picture = picture.picture
+    if not picture:
+        return ''
+
+    extra = format_html(''.join(f' {name}="{{}}"' for name in attrs), *attrs.values()) if attrs else ''
+    renditions = picture.get('renditions') or {}
+    fallback = renditions.get(rendition)
+    if not fallback:
+        width, height = picture.get('width'), picture.get('height')
+        dimensions = format_html(' width="{}" height="{}"', width, height) if width and height else ''
+        return format_html(
+            '<img src="{}" alt="{}" loading="{}" decoding="async"{}{}>',
+            _url(picture['src']), alt, loading, dimensions, extra,
+        )
+
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="{}" decoding="async"{}>'
+        '</picture>',
+        _srcset(renditions, 'webp'), sizes,
+        _rendition_url(fallback['jpeg']), _srcset(renditions, 'jpeg'), sizes,
+        fallback['width'], fallback['height'], alt, loading, extra,
+    )
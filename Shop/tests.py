@@ -1,3 +1,230 @@
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connection, transaction
 from django.test import TestCase
+from django.urls import reverse
+
+from .availability import available_product_ids
+from .cards import schedule_card_refresh
+from .catalog import get_catalog_generation
+from .facets import FACET_VERSION_KEY, changes_key, decode_cursor, encode_cursor, get_facet_index
+from .models import Color, Product, ProductCard, ProductVariant, Size
+from .search import filter_products, search_products
+from .signals import products_changed
+from .suggest import SuggestIndex, Suggestion, get_suggest_index
+
+
+class StockChangeTests(TestCase):
+    """Stock changes made with update() refresh cards and availability only."""
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(name='Runner', price=80, category='MEN', product_type='SNEAKERS')
+            self.size = Size.objects.create(code=9)
+            self.variant = ProductVariant.objects.create(
+                product=self.product, color=Color.objects.create(code='#000000', name='Black'),
+                size=self.size, stock=3, price=79,
+            )
+
+    def sell_out(self):
+        ProductVariant.objects.filter(pk=self.variant.pk).update(stock=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            products_changed([self.product.pk])
+
+    def test_keeps_the_catalog_generation(self):
+        generation = get_catalog_generation()
+        self.sell_out()
+        self.assertEqual(get_catalog_generation(), generation)
+
+    def test_refreshes_card_and_availability(self):
+        self.assertEqual(available_product_ids(sizes=[str(self.size.code)]), {self.product.pk})
+        self.sell_out()
+        self.assertEqual(ProductCard.objects.get(pk=self.product.pk).total_stock, 0)
+        self.assertEqual(available_product_ids(sizes=[str(self.size.code)]), set())
+
+    def test_expires_cached_listings(self):
+        url = reverse('shopping_more') + f'?size={self.size.code}'
+        self.assertEqual(self.client.get(url).json()['count'], 1)
+        self.sell_out()
+        self.assertEqual(self.client.get(url).json()['count'], 0)
+
+
+class FacetIndexTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sneakers = Product.objects.create(name='Runner', price=80, category='MEN', product_type='SNEAKERS')
+            self.boots = Product.objects.create(name='Hiker', price=120, category='MEN', product_type='BOOTS')
+            self.sandals = Product.objects.create(name='Beach', price=30, category='WOMEN', product_type='SANDALS')
+
+    def test_filters_and_counts(self):
+        result = get_facet_index().search(categories=['MEN'], sort='price-asc')
+        self.assertEqual(result.ids, [self.sneakers.pk, self.boots.pk])
+        self.assertEqual(result.total, 2)
+        # Each group's counts ignore the group's own selection.
+        self.assertEqual(result.category_counts['WOMEN'], 1)
+        self.assertEqual(result.type_counts['BOOTS'], 1)
+        self.assertEqual(result.price_counts['100+'], 1)
+        result = get_facet_index().search(price='0-50', product_ids={self.sneakers.pk, self.sandals.pk})
+        self.assertEqual(result.ids, [self.sandals.pk])
+
+    def test_edits_are_indexed_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.boots.category = 'KIDS'
+            self.boots.save()
+            self.sandals.delete()
+        result = get_facet_index().search(categories=['KIDS'])
+        self.assertEqual(result.ids, [self.boots.pk])
+        self.assertEqual(get_facet_index().search().total, 2)
+
+    def changed_elsewhere(self, product, changes=True):
+        """Record a change to ``product`` the way another process would."""
+        version = cache.incr(FACET_VERSION_KEY)
+        if changes:
+            cache.set(changes_key(version), [product.pk])
+
+    def test_applies_changes_from_other_processes(self):
+        index = get_facet_index()
+        Product.objects.filter(pk=self.boots.pk).update(category='KIDS')
+        self.changed_elsewhere(self.boots)
+        with mock.patch.object(index, 'rebuild') as rebuild:
+            self.assertEqual(get_facet_index().search(categories=['KIDS']).ids, [self.boots.pk])
+        rebuild.assert_not_called()
+
+    def test_rebuilds_after_missing_changes(self):
+        index = get_facet_index()
+        Product.objects.filter(pk=self.boots.pk).update(category='KIDS')
+        self.changed_elsewhere(self.boots, changes=False)
+        with mock.patch.object(index, 'rebuild', wraps=index.rebuild) as rebuild:
+            self.assertEqual(get_facet_index().search(categories=['KIDS']).ids, [self.boots.pk])
+        rebuild.assert_called_once()
+
+
+class CursorTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products = [
+                Product.objects.create(name=f'Runner {price}', price=price, category='MEN', product_type='SNEAKERS')
+                for price in (50, 60, 60, 70, 80)
+            ]
+
+    def walk(self, sort):
+        ids, after = [], None
+        while True:
+            result = get_facet_index().search(sort=sort, after=after, limit=2)
+            ids.extend(result.ids)
+            if result.next_cursor is None:
+                return ids
+            after = result.next_cursor
+
+    def test_pages_cover_every_product_once(self):
+        for sort in ('newest', 'price-asc', 'price-desc'):
+            with self.subTest(sort=sort):
+                self.assertEqual(self.walk(sort), get_facet_index().search(sort=sort).ids)
+        # Equal prices are ordered by id.
+        self.assertEqual(self.walk('price-asc'), [product.pk for product in self.products])
+
+    def test_round_trip(self):
+        row = get_facet_index()._rows[self.products[1].pk]
+        cursor = encode_cursor(row, 'price-desc')
+        self.assertEqual(decode_cursor(cursor, 'price-desc'), (-60, -row.id, row.id))
+
+    def test_malformed_cursor_is_the_first_page(self):
+        # Empty, not base64, "nocolon" and "inf:1".
+        for cursor in ('', 'not base64!', 'bm9jb2xvbg', 'aW5mOjE'):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor, 'price-asc'))
+
+
+class CardRefreshTests(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name='Runner', price=80, category='MEN', product_type='SNEAKERS')
+
+    def test_collapsed_per_transaction(self):
+        with mock.patch('Shop.cards.refresh_product_card') as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                for _ in range(3):
+                    schedule_card_refresh(self.product.pk)
+        refresh.assert_called_once_with(self.product.pk)
+
+    def test_not_lost_to_a_rollback(self):
+        try:
+            with transaction.atomic():
+                schedule_card_refresh(self.product.pk)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        ProductCard.objects.filter(pk=self.product.pk).delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_card_refresh(self.product.pk)
+        self.assertTrue(ProductCard.objects.filter(pk=self.product.pk).exists())
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        self.trail = Product.objects.create(
+            name='Trail Runner', price=90, category='MEN', product_type='SNEAKERS',
+            description='Grippy sole for muddy & wet paths.',
+        )
+        self.boot = Product.objects.create(
+            name='Hiker', price=120, category='MEN', product_type='BOOTS',
+            description='A boot for the trail.',
+        )
+        Product.objects.create(name='Beach', price=30, category='WOMEN', product_type='SANDALS', description='Sand.')
+
+    def test_name_matches_rank_first(self):
+        hits = search_products('trail')
+        self.assertEqual([hit.product_id for hit in hits], [self.trail.pk, self.boot.pk])
+        self.assertEqual(hits[0].name_html, '<mark>Trail</mark> Runner')
+
+    @skipUnless(connection.vendor == 'sqlite', 'Prefix matching is SQLite search-as-you-type')
+    def test_last_word_is_a_prefix(self):
+        self.assertEqual([hit.product_id for hit in search_products('hik')], [self.boot.pk])
+
+    def test_text_is_escaped(self):
+        hit, = search_products('muddy')
+        self.assertIn('<mark>muddy</mark> &amp; wet', hit.snippet_html)
+
+    def test_query_syntax_is_plain_text(self):
+        self.assertEqual(search_products('trail AND "OR ('), [])
+        self.assertEqual(search_products('   '), [])
+
+    def test_filter_products(self):
+        queryset = filter_products(Product.objects.order_by('-price'), 'trail')
+        self.assertEqual(list(queryset), [self.boot, self.trail])
+        self.assertFalse(filter_products(Product.objects.all(), '').exists())
+        # Edits are re-indexed.
+        self.boot.description = 'A boot.'
+        self.boot.save()
+        self.assertEqual(list(filter_products(Product.objects.all(), 'trail')), [self.trail])
+
+
+class SuggestTests(TestCase):
+
+    def index(self, *labels_and_weights):
+        return SuggestIndex([Suggestion('product', label, '/', weight) for label, weight in labels_and_weights])
+
+    def labels(self, suggestions):
+        return [suggestion.label for suggestion in suggestions]
+
+    def test_matches_word_starts_most_popular_first(self):
+        index = self.index(('Trail Runner', 5), ('Runway Heel', 9), ('Brunch Loafer', 50))
+        self.assertEqual(self.labels(index.lookup('run')), ['Runway Heel', 'Trail Runner'])
+        self.assertEqual(self.labels(index.lookup('  TRAIL-r ')), ['Trail Runner'])
+        self.assertEqual(self.labels(index.lookup('run', limit=1)), ['Runway Heel'])
+        self.assertEqual(index.lookup('!!'), [])
 
-# Create your tests here.
+    def test_rebuilt_when_the_catalog_changes(self):
+        cache.clear()
+        self.assertEqual(get_suggest_index().lookup('zephyr'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(name='Zephyr', price=80, category='MEN', product_type='SNEAKERS')
+        suggestion, = get_suggest_index().lookup('zephyr')
+        self.assertEqual(suggestion.url, reverse('productdetails', args=[product.pk]))
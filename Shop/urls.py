@@ -3,6 +3,8 @@ URL configuration for the shop app.
 
 Includes:
 - Shopping page with product listing and filters.
+- Infinite-scroll endpoint returning the next page of product cards.
+- Full-text product search and typeahead suggestions.
 - Product detail page with variant selection.
 """
 
@@ -11,5 +13,8 @@ from django.urls import path
 
 urlpatterns = [       
     path('shopping/', views.shopping, name='shopping'),
+    path('shopping/more/', views.shopping_more, name='shopping_more'),
+    path('search/', views.search, name='search'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
     path('product/<int:product_id>/', views.productdetails, name='productdetails'),                     
 ]
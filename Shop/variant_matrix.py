@@ -0,0 +1,117 @@
+"""
+Module: variant_matrix.py
+
+Precompiled per-product data for the product detail page.
+
+Everything ``productdetails`` needs (product fields, ordered images, the
+color -> size -> variant matrix and its JSON serialization) is built once with
+three queries and kept in the cache until a Product, ProductImage, ProductVariant,
+Color or Size row it depends on changes, so warm detail pages are served
+without touching the database.
+"""
+import json
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Product, ProductImage, ProductVariant
+
+MATRIX_TIMEOUT = 60 * 60 * 24 * 7  # 7 days; entries are invalidated on change anyway
+
+
+def matrix_cache_key(product_id):
+    return f'shop:variant_matrix:v2:{product_id}'
+
+
+def get_variant_matrix(product_id):
+    """
+    Return the compiled variant matrix for a product, building and caching it
+    on a miss. Returns ``None`` if the product does not exist.
+    """
+    key = matrix_cache_key(product_id)
+    matrix = cache.get(key)
+    if matrix is None:
+        matrix = build_variant_matrix(product_id)
+        if matrix is None:
+            return None
+        cache.set(key, matrix, MATRIX_TIMEOUT)
+    return matrix
+
+
+def build_variant_matrix(product_id):
+    """
+    Compile the detail page data for one product.
+
+    Returns:
+        dict: ``product`` (plain field values), ``images`` (ordered list of
+        ``{'url', 'picture'}`` for the ``responsive_image`` tag), ``color_data`` (color code -> name and
+        size code -> variant id/stock/label), ``variants`` (variant id -> color
+        and size labels, price and stock), ``colors`` and ``sizes`` (codes in
+        display order), ``first_size_by_color`` and the pre-serialized
+        ``color_data_json``; or ``None`` if the product does not exist.
+    """
+    product = Product.objects.filter(pk=product_id).first()
+    if product is None:
+        return None
+
+    variants = ProductVariant.objects.filter(product_id=product_id) \
+        .select_related('color', 'size') \
+        .order_by('color__name', 'size__code')
+
+    color_data = {}
+    variant_data = {}
+    sizes = []
+    for variant in variants:
+        color = variant.color
+        size = variant.size
+        if color.code not in color_data:
+            color_data[color.code] = {
+                'name': color.name,
+                'sizes': {}
+            }
+        color_data[color.code]['sizes'][size.code] = {
+            'variant_id': variant.id,
+            'stock': variant.stock,
+            'size_name': str(size)
+        }
+        variant_data[variant.id] = {
+            'color_name': color.name,
+            'size_name': str(size),
+            'price': variant.price,
+            'stock': variant.stock,
+        }
+        if size.code not in sizes:
+            sizes.append(size.code)
+
+    images = [
+        {'url': image.image.url, 'picture': image.picture}
+        for image in product.images.order_by('order', 'id')
+    ]
+
+    return {
+        'product': {
+            'id': product.id,
+            'name': product.name,
+            'description': product.description,
+            'price': product.price,
+            'category': product.category,
+            'product_type': product.product_type,
+        },
+        'images': images,
+        'color_data': color_data,
+        'variants': variant_data,
+        'colors': list(color_data),
+        'sizes': sizes,
+        'first_size_by_color': {
+            code: next(iter(data['sizes'])) for code, data in color_data.items()
+        },
+        'color_data_json': json.dumps(color_data),
+    }
+
+
+def invalidate_variant_matrix(product_id):
+    """
+    Drop a product's cached matrix once the current transaction commits, so a
+    concurrent request cannot re-cache the pre-commit state.
+    """
+    transaction.on_commit(lambda: cache.delete(matrix_cache_key(product_id)))
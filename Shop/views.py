@@ -1,97 +1,194 @@
 """
-Views for the shopping and product detail pages.
-Handles product listing, filtering, sorting, and detailed product display with variants.
+Views for the shopping, search and product detail pages.
+Handles product listing, filtering, sorting, full-text search, and detailed product display with variants.
 """
 
-import json
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render
+from django.http import JsonResponse, Http404
+from django.template.loader import render_to_string
 from constants import *
-from .models import Product
-from django.core.cache import cache
-from django.views.decorators.cache import cache_page
+from .models import Product, ProductCard
+from .facets import get_facet_index, DEFAULT_SORT
+from .variant_matrix import get_variant_matrix
+from .catalog import STOCK_TAG, catalog_cache_key, catalog_cache_page
+from .availability import available_product_ids, get_variant_options
+from .search import search_products
+from .suggest import get_suggest_index, DEFAULT_LIMIT as SUGGEST_LIMIT, MAX_LIMIT as SUGGEST_MAX_LIMIT
+from Mazlofootwear.cache_tags import tagged_key
+from Mazlofootwear.stampede import get_or_compute
+
+
+PAGE_SIZE = 24  # Products per listing page / infinite-scroll batch
 
 
 def generate_cache_key(request):
-    """Generate unique cache key based on request parameters"""
-    params = [
-        ','.join(sorted(request.GET.getlist('category'))),
-        ','.join(sorted(request.GET.getlist('type'))),
-        request.GET.get('price', ''),
-        request.GET.get('sort', 'newest')
-    ]
-    version = cache.get('shopping_cache_version', 1)
-    return f'shopping_{hash(tuple(params))}_v{version}'
-
-@cache_page(60 * 15)  # Cache page for 15 minutes
-def shopping(request):
-    # Get or create static choices cache
-    category_choices = cache.get_or_set(
-        'category_choices',
-        lambda: Product.CATEGORY_CHOICES,
-        3600  # 1 hour cache
-    )
-    type_choices = cache.get_or_set(
-        'type_choices',
-        lambda: Product.TYPE_CHOICES,
-        3600
+    """Generate a stable cache key for a listing page, scoped to the catalog generation and stock version"""
+    params = {
+        'category': request.GET.getlist('category'),
+        'type': request.GET.getlist('type'),
+        'price': request.GET.get('price', ''),
+        'sort': request.GET.get('sort', DEFAULT_SORT),
+        'size': request.GET.getlist('size'),
+        'color': request.GET.getlist('color'),
+        'after': request.GET.get('after', ''),
+    }
+    return tagged_key(catalog_cache_key('shopping', params), [STOCK_TAG])
+
+
+def get_listing_page(request):
+    """
+    Resolve the filters, sort and cursor in the request to one page of products.
+
+    Category, type and price filtering, sorting and the per-option counts in
+    the sidebar are answered by the in-process facet index; size and color
+    availability is resolved by a cached ``EXISTS`` query over in-stock
+    variants. The database is only asked for the products on the requested
+    page, and that page is cached on its own.
+
+    Returns:
+        tuple: (ProductCard rows on the page, FacetResult)
+    """
+    result = get_facet_index().search(
+        product_ids=available_product_ids(
+            sizes=request.GET.getlist('size'),
+            colors=request.GET.getlist('color'),
+        ),
+        categories=request.GET.getlist('category'),
+        types=request.GET.getlist('type'),
+        price=request.GET.get('price', ''),
+        sort=request.GET.get('sort', DEFAULT_SORT),
+        after=request.GET.get('after'),
+        limit=PAGE_SIZE,
     )
 
-    # Get filtered products from cache or DB
-    cache_key = generate_cache_key(request)
-    products = cache.get(cache_key)
-    
-    if not products:
-        products = Product.objects.all().prefetch_related('images')
-        
-        # Filtering
-        selected_categories = request.GET.getlist('category')
-        if selected_categories:
-            products = products.filter(category__in=selected_categories)
-        
-        selected_types = request.GET.getlist('type')
-        if selected_types:
-            products = products.filter(product_type__in=selected_types)
-        
-        selected_price = request.GET.get('price')
-        if selected_price:
-            price_ranges = {
-                '0-50': (0, 50),
-                '50-100': (50, 100),
-                '100+': (100, float('inf'))
-            }
-            if selected_price in price_ranges:
-                products = products.filter(
-                    price__range=price_ranges[selected_price]
-                )
-
-        # Sorting
-        sort_options = {
-            'price-asc': 'price',
-            'price-desc': '-price',
-            'newest': '-created_at'
-        }
-        products = products.order_by(sort_options.get(
-            request.GET.get('sort', 'newest'), 
-            '-created_at'
-        ))
-
-        # Cache evaluated queryset
-        cache.set(cache_key, list(products), 900)  # 15 minutes
+    # Get the page of product cards from cache or DB (a single query on the
+    # ProductCard read model, whatever the page size). After the catalog
+    # generation or the stock version is bumped every page misses at once, so only one request
+    # per page recomputes it.
+    def get_cards():
+        cards_by_id = ProductCard.objects.in_bulk(result.ids)
+        return [cards_by_id[product_id] for product_id in result.ids if product_id in cards_by_id]
+
+    products = get_or_compute(generate_cache_key(request), get_cards, 900)  # 15 minutes
+
+    return products, result
+
+
+def listing_query(request):
+    """
+    Return the request's query string without the pagination cursor, used to
+    build "next page" links for the same filters.
+    """
+    params = request.GET.copy()
+    params.pop('after', None)
+    return params.urlencode()
+
+
+@catalog_cache_page(60 * 15)  # Cache page for 15 minutes or until the catalog changes
+def shopping(request):
+    """
+    Display the first page (or the page after ``?after=<cursor>``) of the
+    product listing with category, type, price, size and color filters.
+    """
+    products, result = get_listing_page(request)
+    variant_options = get_variant_options()
 
     context = {
         'products': products,
-        'category_choices': category_choices,
-        'type_choices': type_choices,
+        'product_count': result.total,
+        'next_cursor': result.next_cursor,
+        'listing_query': listing_query(request),
+        'category_facets': [
+            (value, name, result.category_counts[value]) for value, name in Product.CATEGORY_CHOICES
+        ],
+        'type_facets': [
+            (value, name, result.type_counts[value]) for value, name in Product.TYPE_CHOICES
+        ],
+        'price_counts': result.price_counts,
+        'size_choices': variant_options['sizes'],
+        'color_choices': variant_options['colors'],
+        'selected_sizes': request.GET.getlist('size'),
+        'selected_colors': request.GET.getlist('color'),
         'selected_categories': request.GET.getlist('category'),
         'selected_types': request.GET.getlist('type'),
         'selected_price': request.GET.get('price', ''),
-        'selected_sort': request.GET.get('sort', 'newest'),
+        'selected_sort': request.GET.get('sort', DEFAULT_SORT),
     }
     return render(request, 'shop.html', context)
 
 
+@catalog_cache_page(60 * 15)  # Cache page for 15 minutes or until the catalog changes
+def shopping_more(request):
+    """
+    Infinite-scroll endpoint for the shopping listing.
+
+    Takes the same query parameters as ``shopping`` plus the ``after`` cursor
+    and returns the rendered product cards of the next page as JSON:
+    ``{"html": ..., "next_cursor": ..., "count": ...}``.
+    """
+    products, result = get_listing_page(request)
+    html = render_to_string('product_cards.html', {'products': products}, request=request)
+    return JsonResponse({
+        'html': html,
+        'next_cursor': result.next_cursor,
+        'count': len(products),
+    })
+
+
+
+@catalog_cache_page(60 * 15)  # Cache page for 15 minutes or until the catalog changes
+def search(request):
+    """
+    Full-text product search.
+
+    Ranks products by the weighted name / type / description index in
+    Shop.search and renders the matching cards with highlighted names and
+    description snippets.
+
+    Context:
+        query (str): The search text.
+        results (list): ``(ProductCard, SearchHit)`` pairs, best match first.
+    """
+    query = request.GET.get('q', '').strip()
+    hits = search_products(query)
+
+    cards_by_id = ProductCard.objects.in_bulk([hit.product_id for hit in hits])
+    results = [(cards_by_id[hit.product_id], hit) for hit in hits if hit.product_id in cards_by_id]
+
+    context = {
+        'query': query,
+        'results': results,
+    }
+    return render(request, 'search.html', context)
+
+
+def search_suggest(request):
+    """
+    Typeahead endpoint for the navbar search box.
+
+    Answers from the in-process prefix index in Shop.suggest without touching
+    the database. Query parameters: ``q`` (the typed text) and optional
+    ``limit`` (default 8, at most 20).
+
+    Returns:
+        JsonResponse: ``{"query": ..., "suggestions": [{"kind", "label", "url"}]}``
+        where ``kind`` is ``product``, ``category`` or ``type``.
+    """
+    query = request.GET.get('q', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', SUGGEST_LIMIT)), 1), SUGGEST_MAX_LIMIT)
+    except ValueError:
+        limit = SUGGEST_LIMIT
+
+    suggestions = get_suggest_index().lookup(query, limit)
+    return JsonResponse({
+        'query': query,
+        'suggestions': [
+            {'kind': s.kind, 'label': s.label, 'url': s.url} for s in suggestions
+        ],
+    })
+
 
-# @cache_page(60 * 60 * 24) 
 def productdetails(request, product_id):
     """
     Display detailed view of a single product with variant selection.
@@ -100,42 +197,28 @@ def productdetails(request, product_id):
     - Displaying product images.
     - Handling color and size selection for product variants.
 
+    All data comes from the product's compiled variant matrix, so a warm cache
+    serves the page without database queries.
+
     Args:
         product_id (int): The ID of the product to display.
 
     Context:
-        product (Product): The product object.
+        product (dict): The product's field values.
         color_data (dict): Color and size variant mapping.
         selected_color (str): Selected color code.
         selected_size (str): Selected size code.
         available_colors (list): List of available color codes.
         available_sizes (list): List of available size codes.
-        product_images (QuerySet): Ordered product images.
+        product_images (list): Ordered product image URLs.
         color_data_json (str): JSON-encoded color data for JavaScript usage.
     """
-    product = get_object_or_404(Product, id=product_id)
-    
-    variants = product.variants.select_related('color', 'size') \
-                    .order_by('color__name', 'size__code')
-    product_images = product.images.all().order_by('order')
-
-    color_data = {}
-    for variant in variants:
-        color = variant.color
-        size = variant.size
-        if color.code not in color_data:
-            color_data[color.code] = {
-                'name': color.name,
-                'sizes': {}
-            }
-        color_data[color.code]['sizes'][size.code] = {
-            'variant_id': variant.id,
-            'stock': variant.stock,
-            'size_name': str(size)
-        }
-
-    available_colors = list(variants.values_list('color__code', flat=True).distinct())
-    available_sizes = list(variants.values_list('size__code', flat=True).distinct())
+    matrix = get_variant_matrix(product_id)
+    if matrix is None:
+        raise Http404("No Product matches the given query.")
+
+    available_colors = matrix['colors']
+    available_sizes = matrix['sizes']
 
     selected_color = request.GET.get('color',
                         available_colors[0] if available_colors else None)
@@ -143,20 +226,16 @@ def productdetails(request, product_id):
                         available_sizes[0] if available_sizes else None)
 
     if selected_color and not selected_size:
-        sizes_for_color = variants \
-            .filter(color__code=selected_color) \
-            .values_list('size__code', flat=True)
-        if sizes_for_color:
-            selected_size = sizes_for_color[0]
+        selected_size = matrix['first_size_by_color'].get(selected_color)
 
     context = {
-        'product': product,
-        'color_data': color_data,
+        'product': matrix['product'],
+        'color_data': matrix['color_data'],
         'selected_color': selected_color,
         'selected_size': selected_size,
         'available_colors': available_colors,
         'available_sizes': available_sizes,
-        'product_images': product_images,
-        'color_data_json': json.dumps(color_data),
+        'product_images': matrix['images'],
+        'color_data_json': matrix['color_data_json'],
     }
     return render(request, 'productdetails.html', context)